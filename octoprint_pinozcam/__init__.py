@@ -1,39 +1,57 @@
 import base64
+import functools
 import json
 import math
 import multiprocessing
 import os
 import threading
 import time
-from collections import deque
 from io import BytesIO
 import requests
 from PIL import Image, ImageDraw, ImageFont
-from flask import Response
+from flask import Response, request, send_file
 import octoprint.plugin
 from octoprint.events import Events
-import onnxruntime
 import telebot
 import re
 
-from .inference import image_inference
+from .broker import SnapshotBroker
+from .cameras import DEFAULT_CAMERA, CameraMonitor
+from .capture import CaptureThread, Frame
+from .decode import SnapshotSource, decode_snapshot
+from .framecache import FrameCache
+from .gating import GATE_BLURRY, GATE_DARK, GATE_INFER, GATE_UNCHANGED, FrameGate
+from .httpclient import BREAKER_HALF_OPEN, BREAKER_OPEN, HttpClients
+from .inference import _model_input_is_dynamic
+from .mask import CompiledMask, decode_mask
+from .metrics import MetricsRegistry
+from .mjpeg import MjpegStream
+from .nms import NMS_METHODS
+from .profiling import FrameProfiler, FrameTimer
+from .roi import fit_roi, unmasked_region
+from .scheduler import DEFAULT_THERMAL_STEPS, FrameScheduler, parse_thermal_steps
+from .session import GRAPH_OPTIMIZATION_LEVELS, MODEL_VARIANTS, SessionManager, quantized_model_filename
+from .worker import InferenceWorker, WorkerError, run_inference
+
+# The custom event registered by register_custom_events, fired when a failure is detected
+FAILURE_DETECTED_EVENT = "plugin_pinozcam_failure_detected"
 
 class PinozcamPlugin(octoprint.plugin.StartupPlugin,
                      octoprint.plugin.TemplatePlugin,
                      octoprint.plugin.SettingsPlugin,
                      octoprint.plugin.AssetPlugin,
                      octoprint.plugin.BlueprintPlugin,
-                     octoprint.plugin.EventHandlerPlugin):
+                     octoprint.plugin.EventHandlerPlugin,
+                     octoprint.plugin.ShutdownPlugin):
     """
     An OctoPrint plugin that enhances 3D printing with AI-based monitoring for potential print failures.
     
     Attributes:
         lock (threading.Lock): A lock to ensure thread-safe operations.
         stop_event (threading.Event): An event to signal stopping of threads.
-        count (int): A counter to track detected failures.
+        monitors (list): The CameraMonitor of every monitored webcam, with its failure count and results.
         action (int): Determines the action to take upon detection (0: notify, 1: pause, 2: stop).
         ai_input_image (PIL.Image.Image): The current image being analyzed by AI.
-        ai_results (collections.deque): Stores recent AI analysis results.
         telegram_bot_token (str): Token for Telegram bot integration.
         telegram_chat_id (str): Chat ID for Telegram notifications.
         ai_running (bool): Indicates if AI processing is active.
@@ -60,10 +78,54 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
         self.telegram_chat_id = ""
         self.custom_snapshot_url = ""
         self.discord_webhook_url= ""
+        self.nms_method = "greedy"
+        self.graph_optimization_level = "all"
+        self.cache_optimized_model = True
+        self.io_binding = True
+        self.cpu_mem_arena = True
+        self.mem_pattern = True
+        self.model_variant = "float"
+        self.roi_inference = False
+        self.cascade_mode = False
+        self.cascade_width = 384
+        self.cascade_height = 256
+        self.cascade_score_gate = 0.5
+        self.cascade_area_gate = 0.0
+        self.frame_gating = False
+        self.inference_worker = False
+        self.worker_memory_limit = 512
+        self.worker_timeout = 30
+        self.async_capture = False
+        self.capture_max_age = 2.0
+        self.reduced_decode = False
+        self.snapshot_timeout = 10
+        self.notification_timeout = 30
+        self.mjpeg_stream = False
+        self.mjpeg_stream_url = ""
+        self.frame_cache = FrameCache(ttl=1.0)
+        self.no_camera_jpeg = None
+        self.snapshot_max_age = 1.0
+        self.frame_sequence = 0
+        self.status_push_event = threading.Event()
+        self.snapshot_broker = SnapshotBroker(self._snapshot_source)
+        self.cascade_screened = 0
+        self.cascade_confirmed = 0
+        #frame gate settings, copied to the gate of every camera
+        self.frame_gate = FrameGate()
+        self.scheduler = FrameScheduler(0, 1.0, burst_frames=5, temperature=self.get_cpu_temperature)
+        self.profiler = FrameProfiler()
+        self.last_frame_timings = {}
+        self.worker = None
+        self.http = HttpClients()
+        self.mjpeg = None
+        self.mjpeg_sequence = 0
 
         #internal parameters
         self.mask_image_data = '0' * 4096 # 64*64 mask matrix
-        self.count = 0
+        self.mask = CompiledMask(self.mask_image_data)
+        self.multi_camera = False
+        self.camera_settings = {}
+        self.monitors = []
         self.welcome_text = "Welcome to PiNozCam!"
         self.no_camera_text = "No Camera"
         self.proc_img_width=640
@@ -72,7 +134,6 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
         self.ai_running = False
         self.num_threads = 1
         self.ai_input_image = None
-        self.ai_results = deque(maxlen=100)
         self.notification_reach_to_max=False
         self.setting_change_while_printing=False
         self.current_telegram_message_set = set()
@@ -90,6 +151,83 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
         self.cameras = []
         self.snap_new_method = False
 
+        #metrics
+        self.metrics = MetricsRegistry()
+        self._register_metrics()
+
+    def _register_metrics(self):
+        """
+        Creates the metrics served by the /metrics endpoint.
+        Gauges and the frame gate counts are read when the metrics are scraped.
+        """
+        metrics = self.metrics
+        self.frame_seconds = metrics.histogram("pinozcam_frame_seconds", "Wall time of one AI frame, from snapshot to stored result.")
+        self.snapshot_seconds = metrics.histogram("pinozcam_snapshot_seconds", "Time to fetch a snapshot for the AI.")
+        self.frame_age_seconds = metrics.histogram("pinozcam_frame_age_seconds", "Time from capture to the start of inference.")
+        self.inference_seconds = metrics.histogram("pinozcam_inference_seconds", "Time to run one frame through the model, pre- and post-processing included.")
+        self.frames_processed = metrics.counter("pinozcam_frames_processed_total", "AI frames processed to the end.")
+        for decision in ("inferred", GATE_UNCHANGED, GATE_DARK, GATE_BLURRY):
+            metrics.counter("pinozcam_frames_gated_total", "Frames seen by the frame gates of all cameras, by decision.", {"decision": decision},
+                            func=lambda decision=decision: self._gate_counters()[decision])
+        self.snapshot_failures = metrics.counter("pinozcam_snapshot_failures_total", "Failed snapshot fetches for the AI.")
+        metrics.counter("pinozcam_frames_dropped_total", "Captured frames replaced by a newer one before the AI took them.",
+                        func=lambda: sum(monitor.capture.latest.dropped for monitor in self.monitors if monitor.capture))
+        self.inference_errors = metrics.counter("pinozcam_inference_errors_total", "AI frames that failed in the model.")
+        self.notifications = {
+            (channel, result): metrics.counter("pinozcam_notifications_total", "Failure notifications by channel and result.",
+                                               {"channel": channel, "result": result})
+            for channel in ("telegram", "discord") for result in ("sent", "failed")
+        }
+        metrics.gauge("pinozcam_failure_count", "Failures detected within the counting window, highest of all cameras.",
+                      func=self._failure_count)
+        metrics.gauge("pinozcam_ai_results", "AI results currently stored.", func=lambda: sum(len(monitor.ai_results) for monitor in self.monitors))
+        metrics.gauge("pinozcam_cameras", "Webcams monitored by the AI.", func=lambda: len(self.monitors))
+        metrics.gauge("pinozcam_ai_running", "1 when the AI loop is running.", func=lambda: int(self.enable_AI and self.ai_running))
+        metrics.gauge("pinozcam_threads", "Threads alive in the OctoPrint process.", func=threading.active_count)
+        metrics.gauge("pinozcam_inference_threads", "Threads used for AI inference.", func=lambda: self.num_threads)
+        metrics.counter("pinozcam_worker_restarts_total", "Restarts of the inference worker process.",
+                        func=lambda: self.worker.restarts if self.worker else 0)
+        breaker_states = {BREAKER_HALF_OPEN: 1, BREAKER_OPEN: 2}
+        for endpoint in ("camera", "stream", "telegram", "discord"):
+            #an endpoint not used yet has no session and counts as closed
+            metrics.gauge("pinozcam_circuit_state", "Circuit breaker state by endpoint: 0 closed, 1 half open, 2 open.",
+                          {"endpoint": endpoint},
+                          func=lambda endpoint=endpoint: breaker_states.get(self.http.status().get(endpoint, {}).get("state"), 0))
+        metrics.counter("pinozcam_mjpeg_frames_total", "Frames received from the MJPEG stream.",
+                        func=lambda: self.mjpeg.frames if self.mjpeg else 0)
+        metrics.counter("pinozcam_mjpeg_reconnects_total", "Reconnects of the MJPEG stream.",
+                        func=lambda: self.mjpeg.reconnects if self.mjpeg else 0)
+        for result in ("hit", "miss"):
+            metrics.counter("pinozcam_preview_requests_total", "Preview requests by whether the cached frame was served.",
+                            {"result": result},
+                            func=lambda result=result: self.frame_cache.hits if result == "hit" else self.frame_cache.misses)
+        for result, attribute in (("hit", "hits"), ("coalesced", "coalesced"), ("miss", "misses")):
+            metrics.counter("pinozcam_snapshot_requests_total", "Snapshot requests by whether a recent snapshot, a fetch in flight or a new fetch served them.",
+                            {"result": result},
+                            func=lambda attribute=attribute: getattr(self.snapshot_broker, attribute))
+        metrics.gauge("pinozcam_cpu_temperature_celsius", "CPU temperature, 0 when unknown.", func=self.get_cpu_temperature)
+        metrics.gauge("pinozcam_ai_duty_cycle", "Fraction of the time the AI loop was busy over the last frame.",
+                      func=lambda: self.scheduler.duty_cycle)
+        metrics.gauge("pinozcam_ai_thermal_slowdown", "Factor the AI loop is slowed down by because of the CPU temperature.",
+                      func=lambda: self.scheduler.slowdown)
+
+    def _count_notification(self, channel, sent):
+        self.notifications[(channel, "sent" if sent else "failed")].inc()
+
+    def _failure_count(self):
+        with self.lock:
+            return max((monitor.count for monitor in self.monitors), default=0)
+
+    def _gate_counters(self):
+        """
+        Returns the frame gate counters summed over all cameras.
+        """
+        totals = {}
+        for monitor in self.monitors:
+            for decision, count in monitor.frame_gate.get_counters().items():
+                totals[decision] = totals.get(decision, 0) + count
+        return totals or self.frame_gate.get_counters()
+
     def initialize_cameras(self):
         self._logger.info("Initialize the camera")
         if hasattr(octoprint.plugin.types, "WebcamProviderPlugin"):
@@ -118,20 +256,19 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
             self.font = ImageFont.load_default()
             self._logger.info(f"Failed to load custom font, using default font. Error: {e}")
 
-    def _encode_no_camera_image(self):
+    def _no_camera_jpeg(self):
         """
-        Encodes a 'no camera' placeholder image to a base64 string.
-        
-        Returns:
-            A base64 encoded string of the 'no camera' image.
+        Returns the JPEG bytes of the 'no camera' placeholder image, read from disk once.
         """
-        no_camera_path = os.path.join(os.path.dirname(__file__), 'static', 'no_camera.jpg')
-        try:
-            with open(no_camera_path, "rb") as image_file:
-                return f"data:image/jpeg;base64,{base64.b64encode(image_file.read()).decode('utf-8')}"
-        except FileNotFoundError:
-            self._logger.error(f"No camera image not found at {no_camera_path}")
-            return self.create_image_with_text(self.no_camera_text)
+        if self.no_camera_jpeg is None:
+            no_camera_path = os.path.join(os.path.dirname(__file__), 'static', 'no_camera.jpg')
+            try:
+                with open(no_camera_path, "rb") as image_file:
+                    self.no_camera_jpeg = image_file.read()
+            except FileNotFoundError:
+                self._logger.error(f"No camera image not found at {no_camera_path}")
+                self.no_camera_jpeg = self.encode_image_to_jpeg(self.create_image_with_text(self.no_camera_text))
+        return self.no_camera_jpeg
     
     def cpu_is_raspberry_pi(self):
         """
@@ -176,6 +313,44 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
             telegramBotToken="",
             telegramChatID="",
             discordWebhookURL="",
+            nmsMethod="greedy",
+            graphOptimizationLevel="all",
+            cacheOptimizedModel=True,
+            ioBinding=True,
+            cpuMemArena=True,
+            memPattern=True,
+            modelVariant="float",
+            roiInference=False,
+            cascadeMode=False,
+            cascadeWidth=384,
+            cascadeHeight=256,
+            cascadeScoreGate=0.5,
+            cascadeAreaGate=0.0,
+            frameGating=False,
+            gateChangeThreshold=1.0,
+            gateHashDistance=0,
+            gateDarkThreshold=8.0,
+            gateBlurThreshold=0.0,
+            gateRefreshInterval=30,
+            inferenceWorker=False,
+            workerMemoryLimit=512,
+            workerTimeout=30,
+            asyncCapture=False,
+            captureMaxAge=2.0,
+            reducedDecode=False,
+            snapshotTimeout=10,
+            notificationTimeout=30,
+            mjpegStream=False,
+            mjpegStreamUrl="",
+            targetFramesPerMinute=0,
+            maxDutyCycle=1.0,
+            thermalSteps=[list(step) for step in DEFAULT_THERMAL_STEPS],
+            burstFrames=5,
+            burstFramesPerMinute=0,
+            multiCamera=False,
+            cameraSettings={},
+            previewCacheTtl=1.0,
+            snapshotMaxAge=1.0,
         )
     
     def apply_mask_to_image(self, input_image):
@@ -188,22 +363,19 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
         Returns:
             PIL.Image: The input image with the black mask applied.
         """
-        # Decompress the mask_image_data into a 2D boolean array
-        mask_matrix = [[char == '1' for char in self.mask_image_data[i:i+64]] for i in range(0, len(self.mask_image_data), 64)]
+        return self.mask.apply(input_image)
 
-        # Create a drawing context for the input image
-        draw = ImageDraw.Draw(input_image)
-        
-        # Draw black rectangles on the input image based on the mask_matrix
-        block_width = math.ceil(input_image.size[0] / 64)
-        block_height = math.ceil(input_image.size[1] / 64)
-        for i in range(64):
-            for j in range(64):
-                if mask_matrix[i][j]:
-                    x, y = j * block_width, i * block_height
-                    draw.rectangle((x, y, x + block_width, y + block_height), fill=(0, 0, 0))
-
-        return input_image
+    def _compile_mask(self):
+        """
+        Parses mask_image_data once into the CompiledMask used for every frame.
+        Invalid mask data is logged and replaced by an empty mask.
+        """
+        try:
+            self.mask = CompiledMask(self.mask_image_data)
+        except ValueError as e:
+            self._logger.error(f"Invalid maskImageData, masking nothing: {e}")
+            self.mask_image_data = '0' * 4096
+            self.mask = CompiledMask(self.mask_image_data)
 
     def perform_action(self):
         """
@@ -228,7 +400,12 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
         Initializes plugin settings after startup by loading values from the configuration.
         It also logs the initialized settings for verification.
         """
+        self.status_push_thread = threading.Thread(target=self._status_push_loop, name="PiNozCam status push")
+        self.status_push_thread.daemon = True
+        self.status_push_thread.start()
+
         self.mask_image_data = self._settings.get(["maskImageData"])
+        self._compile_mask()
         self.enable_AI = self._settings.get_int(["enableAI"])
         self.action = self._settings.get_int(["action"])
         self.ai_start_delay = self._settings.get_int(["aiStartDelay"])
@@ -244,16 +421,61 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
         self.telegram_bot_token = self._settings.get(["telegramBotToken"])
         self.telegram_chat_id = self._settings.get(["telegramChatID"])
         self.discord_webhook_url = self._settings.get(["discordWebhookURL"])
+        self.nms_method = self._settings.get(["nmsMethod"])
+        self.graph_optimization_level = self._settings.get(["graphOptimizationLevel"])
+        self.cache_optimized_model = self._settings.get_boolean(["cacheOptimizedModel"])
+        self.io_binding = self._settings.get_boolean(["ioBinding"])
+        self.cpu_mem_arena = self._settings.get_boolean(["cpuMemArena"])
+        self.mem_pattern = self._settings.get_boolean(["memPattern"])
+        self.model_variant = self._settings.get(["modelVariant"])
+        self.roi_inference = self._settings.get_boolean(["roiInference"])
+        self.cascade_mode = self._settings.get_boolean(["cascadeMode"])
+        self.cascade_width = self._settings.get_int(["cascadeWidth"])
+        self.cascade_height = self._settings.get_int(["cascadeHeight"])
+        self.cascade_score_gate = self._settings.get_float(["cascadeScoreGate"])
+        self.cascade_area_gate = self._settings.get_float(["cascadeAreaGate"])
+        self.frame_gating = self._settings.get_boolean(["frameGating"])
+        self.frame_gate.change_threshold = self._settings.get_float(["gateChangeThreshold"])
+        self.frame_gate.hash_distance = self._settings.get_int(["gateHashDistance"])
+        self.frame_gate.dark_threshold = self._settings.get_float(["gateDarkThreshold"])
+        self.frame_gate.blur_threshold = self._settings.get_float(["gateBlurThreshold"])
+        self.frame_gate.refresh_interval = self._settings.get_float(["gateRefreshInterval"])
+        self.inference_worker = self._settings.get_boolean(["inferenceWorker"])
+        self.worker_memory_limit = self._settings.get_int(["workerMemoryLimit"])
+        self.worker_timeout = self._settings.get_float(["workerTimeout"])
+        self.async_capture = self._settings.get_boolean(["asyncCapture"])
+        self.capture_max_age = self._settings.get_float(["captureMaxAge"])
+        self.reduced_decode = self._settings.get_boolean(["reducedDecode"])
+        self.snapshot_timeout = self._settings.get_float(["snapshotTimeout"])
+        self.notification_timeout = self._settings.get_float(["notificationTimeout"])
+        self.mjpeg_stream = self._settings.get_boolean(["mjpegStream"])
+        self.mjpeg_stream_url = self._settings.get(["mjpegStreamUrl"])
+        self.scheduler.frames_per_minute = self._settings.get_float(["targetFramesPerMinute"])
+        self.scheduler.max_duty_cycle = self._settings.get_float(["maxDutyCycle"])
+        self._set_thermal_steps(self._settings.get(["thermalSteps"]))
+        self.scheduler.burst_frames = self._settings.get_int(["burstFrames"])
+        self.scheduler.burst_frames_per_minute = self._settings.get_float(["burstFramesPerMinute"])
+        self.multi_camera = self._settings.get_boolean(["multiCamera"])
+        self.camera_settings = self._settings.get(["cameraSettings"]) or {}
+        self.frame_cache.ttl = self._settings.get_float(["previewCacheTtl"])
+        self.snapshot_max_age = self._settings.get_float(["snapshotMaxAge"])
 
         if "/?action=stream" in self.custom_snapshot_url:
             self.custom_snapshot_url = self.custom_snapshot_url.replace("/?action=stream", "/?action=snapshot")
             self._logger.info(f"self.custom_snapshot_url has been changed to {self.custom_snapshot_url}")
 
+        self._check_advanced_settings()
+        self._apply_http_timeouts()
+
+        self.profiler = FrameProfiler(os.path.join(self.get_plugin_data_folder(), "profiles"), logger=self._logger)
+
         # Calculate the number of threads to use for AI inference       
         self._thread_calculation()
         #
 
         self.initialize_cameras()
+        self._start_mjpeg_stream()
+        self._build_monitors()
 
         self.initialize_font()
         
@@ -328,7 +550,7 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
 
         try:
             # Attempt to retrieve chat information
-            response = requests.get(telegram_api_url, params=data)
+            response = self.http.endpoint("telegram").get(telegram_api_url, params=data)
             if response.status_code == 200:
                 self._logger.info("Successfully retrieved chat information. Telegram settings are correct.")
                 return True
@@ -370,15 +592,18 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
             else:
                 data['text'] = caption
 
-            response = requests.post(telegram_api_url, files=files, data=data)
+            response = self.http.endpoint("telegram").post(telegram_api_url, files=files, data=data)
             if response.status_code == 200:
                 self._logger.info("Telegram message sent successfully.")
+                self._count_notification("telegram", True)
                 return True
             else:
                 self._logger.error(f"Failed to send message to Telegram. Status Code: {response.status_code}, Response: {response.text}")
+                self._count_notification("telegram", False)
                 return False
         except requests.exceptions.RequestException as e:
             self._logger.error(f"Error occurred while sending message to Telegram: {str(e)}")
+            self._count_notification("telegram", False)
             return False
 
 
@@ -407,22 +632,38 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
             image_stream.seek(0)
             files = {'file': ('image.jpeg', image_stream, 'image/jpeg')}
             data = {"content": caption}
-            response = requests.post(self.discord_webhook_url, files=files, data=data)
+            response = self.http.endpoint("discord").post(self.discord_webhook_url, files=files, data=data)
             
             if response.status_code in [200, 204]:
                 self._logger.info("Message sent to Discord successfully.")
+                self._count_notification("discord", True)
                 return True
             else:
+                self._count_notification("discord", False)
                 self._logger.error(f"Failed to send message to Discord. Status Code: {response.status_code}, Response: {response.json()}")
                 return False
         except requests.exceptions.RequestException as e:
             self._logger.error(f"Error occurred while sending message to Discord: {str(e)}")
+            self._count_notification("discord", False)
             return False
         except Exception as e:
             self._logger.error(f"An unexpected error occurred while sending message to Discord: {str(e)}")
+            self._count_notification("discord", False)
             return False
 
 
+    def on_shutdown(self):
+        """
+        Stops the status push thread when OctoPrint shuts down.
+        """
+        self._stop_status_push()
+
+    def on_plugin_disabled(self):
+        """
+        Stops the status push thread when the plugin is disabled.
+        """
+        self._stop_status_push()
+
     def on_event(self, event, payload):
         """
         Handles OctoPrint events to start or stop AI image processing based on the printer's status.
@@ -435,8 +676,9 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
             if event == Events.PRINT_STARTED:
                 self._logger.info("Count and results are cleared.")
                 #initial the parameters
-                self.count = 0
-                self.ai_results.clear()
+                with self.lock:
+                    for monitor in self.monitors:
+                        monitor.clear()
                 self.notification_reach_to_max=False
                 self.current_telegram_message_paused = False
                 self.current_telegram_message_set.clear()
@@ -445,19 +687,27 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
                 self.ai_thread = threading.Thread(target=self.process_ai_image)
                 self.ai_thread.daemon = True
                 self.ai_thread.start()
+            self._push_status()
         elif event in [Events.PRINT_DONE, Events.PRINT_FAILED, Events.PRINT_CANCELLED, Events.PRINT_PAUSED]:
             self._logger.info(f"{event}: {payload}")
             self._logger.info("Print ended, stopping AI image processing.")
             self.ai_running = False
             self.current_telegram_message_set.clear()
+            self._push_status()
 
-    def encode_image_to_base64(self, image):
+    def encode_image_to_jpeg(self, image):
         """
-        Encodes a PIL Image object to a base64 string for easy embedding or storage.
+        Encodes a PIL Image object to JPEG bytes.
         """
         buffered = BytesIO()
         image.save(buffered, format="JPEG")
-        return "data:image/jpeg;base64," + base64.b64encode(buffered.getvalue()).decode('utf-8')
+        return buffered.getvalue()
+
+    def encode_image_to_base64(self, image):
+        """
+        Encodes a PIL Image object to a base64 string for easy embedding or storage.
+        """
+        return "data:image/jpeg;base64," + base64.b64encode(self.encode_image_to_jpeg(image)).decode('utf-8')
 
     def process_ai_image(self):
         """
@@ -472,18 +722,29 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
             if not self.ai_running:
                 break
             
-            # Load model_data into memory
+            # Load the model and initialize the InferenceSession
             self._logger.info("begin loading AI Model into memory.")
             try:
-                with open(self.bin_file_path, 'rb') as model_file:
-                    model_data = model_file.read()
-                self._logger.info("Successfully loaded AI Model into memory.")
-
-                # Initialize SessionOptions and InferenceSession here
-                sess_opt = onnxruntime.SessionOptions()
-                sess_opt.intra_op_num_threads = self.num_threads
-                ort_session = onnxruntime.InferenceSession(model_data, sess_opt, providers=['CPUExecutionProvider'])
-                self._logger.info("InferenceSession initialized.")
+                model_path = self._model_path()
+                if self.worker is not None:
+                    self.worker.stop()
+                    self.worker = None
+                if self.inference_worker:
+                    ort_session, screen_session = None, None
+                    self.worker = self._create_worker(model_path)
+                    dynamic_input = self.worker.dynamic_input
+                else:
+                    ort_session = self._create_session(model_path)
+                    self._logger.info(f"InferenceSession initialized from {model_path}.")
+                    dynamic_input = _model_input_is_dynamic(ort_session)
+                    screen_session = self._create_screen_session(ort_session, dynamic_input) if self.cascade_mode else None
+                if self.roi_inference and not dynamic_input:
+                    self._logger.info("roiInference has no effect, the model has a fixed input size.")
+                self.cascade_screened = 0
+                self.cascade_confirmed = 0
+                for monitor in self.monitors:
+                    monitor.frame_gate.reset()
+                    monitor.last_result = None
             except Exception as e:
                 self._logger.error(f"Failed to load model from {self.bin_file_path}. Error: {e}")
                 self.ai_running = False
@@ -491,78 +752,160 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
             self._logger.info(f"Waiting for {self.ai_start_delay}s before starting AI processing")
             time.sleep(self.ai_start_delay)
 
+            self.scheduler.reset()
             while self.enable_AI and self.ai_running:
+
+                #take turns between the cameras, each at its own rate
+                monitors = {monitor.name: monitor for monitor in self.monitors}
+                if not monitors:
+                    time.sleep(1)
+                    continue
+                monitor = monitors[self.scheduler.pick(list(monitors))]
+
+                #fetch and decode the frames of every camera in parallel, in the background
+                if (self.async_capture or self.multi_camera) and monitor.capture is None and monitor in self.monitors:
+                    monitor.capture = CaptureThread(functools.partial(self._fetch_snapshot, monitor),
+                                                    max_age=self.capture_max_age,
+                                                    prepare=functools.partial(self._prepare_frame, monitor),
+                                                    logger=self._logger)
+                    monitor.capture.start()
+
+                #wait until the next frame is due at the target rate, duty cycle and temperature,
+                #without the capture thread refreshing the waiting frame in the meantime
+                if monitor.capture is not None:
+                    monitor.capture.defer(self.scheduler.next_delay(monitor.name))
+                self.scheduler.wait(lambda: self.enable_AI and self.ai_running, monitor.name)
+                if not (self.enable_AI and self.ai_running):
+                    break
+                #the frame after this one is due no earlier than the target rate allows
+                if monitor.capture is not None:
+                    monitor.capture.defer(self.scheduler.next_delay(monitor.name))
                 
                 #get rid of results longer than count_time
                 with self.lock:
-                    while self.ai_results and time.time() - self.ai_results[0]['time'] > self.count_time:
-                        result = self.ai_results.popleft()
-                        if result['severity'] > 0.66:
-                            self.count -= 1
-                            #self._logger.info(f"Reduced failure count: {self.count}")
+                    monitor.prune(self.count_time)
                 
                 #self._logger.info("Begin to process one image.")
+                self.profiler.tick()
+                timer = FrameTimer()
                 
-                ai_unmasked_input_image = self.get_snapshot()
-                if ai_unmasked_input_image is None:
-                    self._logger.error(f"Failed to fetch image for AI processing: {e}")
+                #take the newest captured frame, or fetch one when capture is synchronous
+                with timer.stage("snapshot"):
+                    if monitor.capture is not None:
+                        frame = monitor.capture.latest.take(timeout=5)
+                    else:
+                        fetched = self._fetch_snapshot(monitor)
+                        frame = Frame(fetched[0], 0, time.time(), fetched[1]) if fetched is not None else None
+                if frame is None:
+                    self._logger.error(f"Failed to fetch image of camera {monitor.name} for AI processing")
                     continue
+                frame_age = time.time() - frame.timestamp
+                timer.add("frame_age", frame_age * 1000.0)
+                self.frame_age_seconds.observe(frame_age)
 
-                #apply mask to the ai_input_image
-                ai_input_image = self.apply_mask_to_image(ai_unmasked_input_image)
-
-                try:
-                    scores, boxes, labels, severity, percentage_area, elapsed_time = image_inference(
-                        input_image=ai_input_image, 
-                        scores_threshold=self.scores_threshold, 
-                        img_sensitivity=self.img_sensitivity, 
-                        ort_session=ort_session, 
-                        _proc_img_width=self.proc_img_width, 
-                        _proc_img_height=self.proc_img_height
-                    )
-                except Exception as e:
-                    self._logger.error(f"AI inference error: {e}")
-                    continue
-                self._logger.info(f"scores={scores} boxes={boxes} labels={labels} severity={severity} percentage_area={percentage_area} elapsed_time={elapsed_time}")
+                #apply mask to the ai_input_image, captured frames were masked by the capture thread
+                if monitor.capture is not None:
+                    ai_input_image = frame.image
+                else:
+                    with timer.stage("mask"):
+                        ai_input_image = monitor.mask.apply(frame.image)
+
+                #skip unusable frames and reuse the last result for unchanged ones
+                gate_decision = GATE_INFER
+                if self.frame_gating:
+                    with timer.stage("gate"):
+                        gate_mask = None if monitor.mask.is_empty else monitor.mask.pixel_mask(ai_input_image.size)
+                        gate_decision, gate_stats = monitor.frame_gate.check(ai_input_image, mask=gate_mask)
+                    if gate_decision not in (GATE_INFER, GATE_UNCHANGED):
+                        self._logger.info(f"Skipped {gate_decision} frame of camera {monitor.name}: {gate_stats}")
+                        continue
+
+                #a reused result was stored, counted and notified when its frame was inferred
+                stored = False
+                inferred = not (gate_decision == GATE_UNCHANGED and monitor.last_result is not None)
+                if not inferred:
+                    scores, boxes, labels, severity, percentage_area, _ = monitor.last_result
+                    elapsed_time = 0.0
+                else:
+                    try:
+                        with timer.stage("inference"):
+                            scores, boxes, labels, severity, percentage_area, elapsed_time = self._infer_frame(
+                                monitor, ai_input_image, ort_session, screen_session, dynamic_input, timings=timer.stages,
+                                staged=frame.staged)
+                    except WorkerError as e:
+                        self._logger.error(f"Inference worker error: {e}")
+                        self.inference_errors.inc()
+                        monitor.frame_gate.reset()
+                        time.sleep(1)
+                        continue
+                    except Exception as e:
+                        self._logger.error(f"AI inference error: {e}")
+                        self.inference_errors.inc()
+                        monitor.frame_gate.reset()
+                        continue
+                    self.inference_seconds.observe(timer.stages["inference"] / 1000.0)
+                    monitor.last_result = (scores, boxes, labels, severity, percentage_area, elapsed_time)
+                monitor.last_severity = severity
+                self.scheduler.report(severity, monitor.name)
+                self._logger.debug(f"scores={scores} boxes={boxes} labels={labels} severity={severity} percentage_area={percentage_area} elapsed_time={elapsed_time}")
                 #draw the result image
-                ai_result_image = self.draw_response_data(scores, boxes, labels, severity, ai_input_image)
+                with timer.stage("draw"):
+                    ai_result_image = self.draw_response_data(scores, boxes, labels, severity, ai_input_image, monitor.scores_threshold)
 
                 if self.setting_change_while_printing:
                     self.setting_change_while_printing=False
                     continue
                 
                 # Store the result
-                if severity > 0.33:
+                if severity > 0.33 and inferred:
+                    with timer.stage("encode"):
+                        encoded_input_image = self.encode_image_to_base64(ai_input_image)
+                        encoded_result_image = self.encode_image_to_base64(ai_result_image)
                     result = {
                         'time': time.time(),
+                        'camera': monitor.name,
                         'scores': scores,
                         'boxes': boxes,
                         'labels': labels,
                         'severity': severity,
                         'percentage_area': percentage_area,
                         'elapsed_time': elapsed_time,
-                        'ai_input_image': self.encode_image_to_base64(ai_input_image),
-                        'ai_result_image': self.encode_image_to_base64(ai_result_image)
+                        'ai_input_image': encoded_input_image,
+                        'ai_result_image': encoded_result_image,
+                        'timings': timer.record()
                     }
                     with self.lock:
-                        self.ai_results.append(result)
+                        monitor.ai_results.append(result)
+                    stored = True
                     #self._logger.info("Stored new AI inference result.")
                     if severity > 0.66:
                         with self.lock:
-                            self.count += 1
-                        #self._logger.info(f"self.count increased by 1 self.count={self.count}")
+                            monitor.count += 1
+                            failure_count = monitor.count
+                        self._event_bus.fire(FAILURE_DETECTED_EVENT, {
+                            "camera": monitor.name,
+                            "severity": severity,
+                            "percentageArea": percentage_area,
+                            "failureCount": failure_count,
+                            "maxCount": self.max_count,
+                        })
                         
                         #       
-                        if not self.notification_reach_to_max and self.max_notification != 0 and self.count > self.max_notification:
+                        if not self.notification_reach_to_max and self.max_notification != 0 and failure_count > self.max_notification:
                             self.notification_reach_to_max = True 
 
-                        with self.lock:
-                            failure_count = self.count
+                        # Notifications get the full resolution frame, the AI only needed a reduced one
+                        notification_image = ai_result_image
+                        if not self.notification_reach_to_max and ((self.telegram_bot_token and self.telegram_chat_id) or self.discord_webhook_url.startswith("http")):
+                            notification_image = self._notification_image(monitor, frame, ai_input_image, ai_result_image,
+                                                                          scores, boxes, labels, severity)
 
                         title, state, progress, nozzle_temp, bed_temp, file_metadata = self.get_printer_status()
                         status_message = f"Printer: {title}\nStatus: {state}\nProgress: {progress}\nNozzle Temp: {nozzle_temp}°C\nBed Temp: {bed_temp}°C"
                         if file_metadata:
                             status_message += f"\nFile: {file_metadata.get('name', 'Unknown')}"
+                        if monitor.name != DEFAULT_CAMERA:
+                            status_message += f"\nCamera: {monitor.name}"
 
                         severity_percentage = severity * 100
                         caption = (
@@ -583,29 +926,340 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
                             if not self.enable_max_failure_count_notification or (failure_count >= self.max_count):
                                 if not self.telegram_pending_action and not self.current_telegram_message_mute:
                                     #self.telegram_send(ai_result_image,severity,percentage_area)
-                                    self.telegram_send_with_reply(image=ai_result_image, caption=caption, reply_buttons=4, disable_notification=False)
+                                    self.telegram_send_with_reply(image=notification_image, caption=caption, reply_buttons=4, disable_notification=False)
                         
                         if not self.notification_reach_to_max and self.discord_webhook_url.startswith("http"):
                             if not self.enable_max_failure_count_notification or (failure_count >= self.max_count):
-                                self.discord_send(image=ai_result_image, caption=caption)
+                                self.discord_send(image=notification_image, caption=caption)
                         
                         if failure_count >= self.max_count:
                             self.perform_action()
+
+                frame_timings = timer.record()
+                with self.lock:
+                    self.last_frame_timings = frame_timings
+                self.frame_seconds.observe(frame_timings["total"] / 1000.0)
+                self.frames_processed.inc()
+                monitor.frames += 1
+                self._logger.debug(f"Frame timings (ms): {frame_timings}")
+                #the preview only shows a new image when a failure image was stored
+                self._push_status(new_frame=stored)
+
+            for monitor in self.monitors:
+                if monitor.capture is not None:
+                    monitor.capture.stop()
+                    monitor.capture = None
                             
-        sess_opt = None
+        self.profiler.stop()
+        if self.worker is not None:
+            self.worker.stop()
+            self.worker = None
+        ort_session = None
+        screen_session = None
     
+    def _fetch_snapshot(self, monitor):
+        """
+        Fetches a snapshot of a camera for the AI and records the fetch time and failures in the metrics.
+
+        With reducedDecode, JPEG snapshots are decoded at reduced scale near the processing size.
+
+        Returns:
+            tuple: The decoded snapshot and its SnapshotSource, kept for a full resolution
+            decode of the notification image, or None if it could not be fetched.
+        """
+        start_time = time.perf_counter()
+        source = monitor.fetch()
+
+        image = None
+        if source is not None:
+            target_size = None
+            if self.reduced_decode:
+                target_size = (self.proc_img_width, self.proc_img_height)
+            try:
+                image = decode_snapshot(source, target_size)
+            except IOError as e:
+                self._logger.error(f"Failed to decode snapshot: {e}")
+        self.snapshot_seconds.observe(time.perf_counter() - start_time)
+        if image is None:
+            self.snapshot_failures.inc()
+            return None
+        return image, source
+
+    def _prepare_frame(self, monitor, image):
+        """
+        Masks a captured frame in the capture thread and, with inferenceWorker, writes it into
+        the frame ring of the worker, so the AI thread hands it over without copying it.
+
+        Returns:
+            tuple: The masked image and its StagedFrame, or None without a worker.
+        """
+        image = monitor.mask.apply(image)
+        worker = self.worker
+        return image, worker.stage(image) if worker is not None else None
+
+    def _ai_snapshot_source(self):
+        """
+        Fetches the snapshot of the single monitored camera. With an MJPEG stream, waits
+        for a frame the AI has not seen yet instead of taking the same one again.
+        """
+        if self.mjpeg is not None:
+            frame = self.mjpeg.wait_for_frame(self.mjpeg_sequence, timeout=self.snapshot_timeout)
+            if frame is not None:
+                jpeg, _, self.mjpeg_sequence = frame
+                return self._mjpeg_source(jpeg)
+        # A fetch the preview or Telegram started is shared, but an older snapshot is not
+        return self.snapshot_broker.source(max_age=0.0)
+
+    def _webcam_config_source(self, camera, config):
+        """
+        Fetches the snapshot of one webcam of a WebcamProviderPlugin.
+
+        Returns:
+            SnapshotSource: The snapshot bytes and the webcam transformations, or None if it could not be fetched.
+        """
+        try:
+            snapshot = b''.join(camera.take_webcam_snapshot(config))
+        except Exception as e:
+            self._logger.error(f"Error processing snapshot of camera {config.name}: {e}")
+            return None
+        return SnapshotSource(snapshot, config.flipH, config.flipV, config.rotate90)
+
+    def _build_monitors(self):
+        """
+        Creates the CameraMonitor of every webcam the AI checks, keeping the failure count
+        and results of cameras that were already monitored.
+
+        Without multiCamera, the single camera of get_snapshot is monitored. With it, every
+        webcam of every WebcamProviderPlugin is, with the mask, scoresThreshold, imgSensitivity
+        and targetFramesPerMinute of its cameraSettings entry, or the plugin settings.
+        """
+        sources = {}
+        if self.multi_camera:
+            for camera in self.cameras:
+                for config in camera.get_webcam_configurations():
+                    sources[config.name] = functools.partial(self._webcam_config_source, camera, config)
+            if not sources:
+                self._logger.error("multiCamera needs webcams of a webcam provider plugin, monitoring the default camera.")
+        if not sources:
+            sources[DEFAULT_CAMERA] = self._ai_snapshot_source
+
+        gate_settings = {name: getattr(self.frame_gate, name) for name in
+                         ("change_threshold", "hash_distance", "dark_threshold", "blur_threshold", "refresh_interval")}
+        existing = {monitor.name: monitor for monitor in self.monitors}
+        monitors = []
+        for name, fetch in sources.items():
+            overrides = self.camera_settings.get(name, {}) if self.multi_camera else {}
+            mask_image_data = overrides.get("maskImageData", self.mask_image_data)
+            if mask_image_data != self.mask_image_data:
+                try:
+                    decode_mask(mask_image_data)
+                except ValueError as e:
+                    self._logger.error(f"Invalid maskImageData of camera {name}, using the plugin mask: {e}")
+                    mask_image_data = self.mask_image_data
+            scores_threshold = float(overrides.get("scoresThreshold", self.scores_threshold))
+            img_sensitivity = float(overrides.get("imgSensitivity", self.img_sensitivity))
+            monitor = existing.pop(name, None)
+            if monitor is None:
+                monitor = CameraMonitor(name, fetch, mask_image_data, scores_threshold, img_sensitivity,
+                                        FrameGate(**gate_settings))
+            else:
+                monitor.configure(fetch, mask_image_data, scores_threshold, img_sensitivity, gate_settings)
+            frames_per_minute = overrides.get("targetFramesPerMinute")
+            self.scheduler.set_rate(name, float(frames_per_minute) if frames_per_minute is not None else None)
+            monitors.append(monitor)
+
+        for monitor in existing.values():
+            if monitor.capture is not None:
+                monitor.capture.stop()
+                monitor.capture = None
+        self.monitors = monitors
+        self._logger.info(f"Monitoring cameras: {list(sources)}")
+
+    def _notification_image(self, monitor, frame, ai_input_image, ai_result_image, scores, boxes, labels, severity):
+        """
+        Returns the result image at the full camera resolution for notifications.
+
+        A frame decoded at reduced scale is decoded again in full, masked, and the
+        boxes are scaled up before they are drawn. The reduced result image is
+        returned when the frame already is full size or cannot be decoded again.
+        """
+        if frame.source is None:
+            return ai_result_image
+        try:
+            full_image = decode_snapshot(frame.source)
+        except IOError as e:
+            self._logger.error(f"Failed to decode full resolution notification image: {e}")
+            return ai_result_image
+        if full_image.size == ai_input_image.size:
+            return ai_result_image
+
+        scale_x = full_image.size[0] / ai_input_image.size[0]
+        scale_y = full_image.size[1] / ai_input_image.size[1]
+        full_boxes = [[x1 * scale_x, y1 * scale_y, x2 * scale_x, y2 * scale_y] for x1, y1, x2, y2 in boxes]
+        full_image = monitor.mask.apply(full_image)
+        return self.draw_response_data(scores, full_boxes, labels, severity, full_image, monitor.scores_threshold)
+
     @staticmethod
     def _largest_power_of_two(n):
         exponent = math.floor(math.log2(n))
         return 2 ** exponent
     
+    def _check_advanced_settings(self):
+        if self.nms_method not in NMS_METHODS:
+            self._logger.error(f"Unknown nmsMethod '{self.nms_method}', falling back to greedy. Valid values: {NMS_METHODS}")
+            self.nms_method = "greedy"
+        if self.graph_optimization_level not in GRAPH_OPTIMIZATION_LEVELS:
+            self._logger.error(f"Unknown graphOptimizationLevel '{self.graph_optimization_level}', falling back to all. Valid values: {list(GRAPH_OPTIMIZATION_LEVELS)}")
+            self.graph_optimization_level = "all"
+        if self.model_variant not in MODEL_VARIANTS:
+            self._logger.error(f"Unknown modelVariant '{self.model_variant}', falling back to float. Valid values: {MODEL_VARIANTS}")
+            self.model_variant = "float"
+        if not 0.0 < self.scheduler.max_duty_cycle <= 1.0:
+            self._logger.error(f"maxDutyCycle must be above 0 and at most 1, got {self.scheduler.max_duty_cycle}. Using 1.")
+            self.scheduler.max_duty_cycle = 1.0
+        # Every FPN level must divide the screening size, so round it to the largest stride
+        self.cascade_width = max(128, round(self.cascade_width / 128) * 128)
+        self.cascade_height = max(128, round(self.cascade_height / 128) * 128)
+
+    def _set_thermal_steps(self, value):
+        try:
+            self.scheduler.thermal_steps = parse_thermal_steps(value)
+        except (TypeError, ValueError) as e:
+            self._logger.error(f"Invalid thermalSteps {value}, using {DEFAULT_THERMAL_STEPS}: {e}")
+            self.scheduler.thermal_steps = DEFAULT_THERMAL_STEPS
+
+    def _apply_http_timeouts(self):
+        """
+        Applies the snapshot and notification read deadlines to the pooled HTTP endpoints.
+        """
+        self.http.set_timeouts("camera", 3.05, self.snapshot_timeout)
+        # For the MJPEG stream the read deadline is the longest gap between frames
+        self.http.set_timeouts("stream", 3.05, self.snapshot_timeout)
+        for name in ("telegram", "discord"):
+            self.http.set_timeouts(name, 3.05, self.notification_timeout)
+
+    def _infer_frame(self, monitor, ai_input_image, ort_session, screen_session, dynamic_input, timings=None,
+                     staged=None):
+        """
+        Runs one masked frame of a camera through the model, with its mask and thresholds, and with
+        ROI cropping and the screening cascade when they are enabled. The time of every inference
+        stage is added to timings.
+
+        With inferenceWorker the frame is run in the worker process instead of ort_session, handed
+        over through the slot it was staged in by the capture thread if it is still there.
+
+        Returns:
+            tuple: scores, boxes, labels, severity, percentage_area and elapsed_time, as image_inference.
+        """
+        #only run the unmasked part of the image through the model
+        roi, roi_size = None, None
+        if self.roi_inference:
+            roi, roi_size = fit_roi(unmasked_region(monitor.mask_image_data, ai_input_image.size),
+                                    ai_input_image.size, (self.proc_img_width, self.proc_img_height),
+                                    dynamic_input)
+
+        options = dict(
+            scores_threshold=monitor.scores_threshold,
+            img_sensitivity=monitor.img_sensitivity,
+            _proc_img_width=self.proc_img_width,
+            _proc_img_height=self.proc_img_height,
+            nms_method=self.nms_method,
+            roi=roi,
+            roi_size=roi_size
+        )
+        #the worker holds its own screening session
+        if self.worker is not None:
+            use_cascade = self.worker.cascade
+        else:
+            use_cascade = screen_session is not None
+        cascade = None
+        if use_cascade:
+            cascade = dict(
+                screen_size=(self.cascade_width, self.cascade_height),
+                score_gate=self.cascade_score_gate,
+                area_gate=self.cascade_area_gate
+            )
+
+        if self.worker is not None:
+            result, confirmed = self.worker.infer(ai_input_image, options, cascade, timings=timings, staged=staged)
+        else:
+            result, confirmed = run_inference(ai_input_image, ort_session, screen_session, options, cascade, timings=timings)
+
+        if confirmed is not None:
+            self.cascade_screened += 1
+            self.cascade_confirmed += confirmed
+            if self.cascade_screened % 100 == 0:
+                self._logger.info(f"Cascade hit rate: {self.cascade_confirmed}/{self.cascade_screened} frames confirmed at full resolution ({self.cascade_confirmed / self.cascade_screened:.1%})")
+        return result
+
+    def _session_config(self, model_path):
+        """
+        Returns the SessionManager arguments for a model, as passed to the inference worker.
+        """
+        return dict(
+            model_path=model_path,
+            cache_dir=os.path.join(self.get_plugin_data_folder(), "model_cache") if self.cache_optimized_model else None,
+            num_threads=self.num_threads,
+            graph_optimization_level=self.graph_optimization_level,
+            io_binding=self.io_binding,
+            cpu_mem_arena=self.cpu_mem_arena,
+            mem_pattern=self.mem_pattern
+        )
+
+    def _create_session(self, model_path):
+        return SessionManager(**self._session_config(model_path), logger=self._logger).load()
+
+    def _create_worker(self, model_path):
+        """
+        Starts the inference worker process for the model and, in cascade mode, nozcam_screen.onnx.
+        """
+        screen_model_path = os.path.join(self.get_plugin_data_folder(), "nozcam_screen.onnx")
+        config = {
+            "session": self._session_config(model_path),
+            "screen_session": self._session_config(screen_model_path) if os.path.exists(screen_model_path) else None,
+            "cascade": self.cascade_mode,
+        }
+        worker = InferenceWorker(config, memory_limit_mb=self.worker_memory_limit, timeout=self.worker_timeout,
+                                 logger=self._logger)
+        worker.start()
+        if self.cascade_mode and not worker.cascade:
+            self._logger.error(f"Cascade mode needs a model with a dynamic input size or {screen_model_path}. Cascade disabled.")
+        return worker
+
+    def _create_screen_session(self, ort_session, dynamic_input):
+        """
+        Returns the session used for cascade screening: the main session when the model accepts
+        other input sizes, else nozcam_screen.onnx from the plugin data folder, else None.
+        """
+        if dynamic_input:
+            return ort_session
+        screen_model_path = os.path.join(self.get_plugin_data_folder(), "nozcam_screen.onnx")
+        if os.path.exists(screen_model_path):
+            return self._create_session(screen_model_path)
+        self._logger.error(f"Cascade mode needs a model with a dynamic input size or {screen_model_path}. Cascade disabled.")
+        return None
+
+    def _model_path(self):
+        """
+        Returns the path of the model selected by modelVariant, falling back to the float model
+        when the quantized file has not been produced yet.
+        """
+        if self.model_variant == "float":
+            return self.bin_file_path
+        model_path = os.path.join(self.get_plugin_data_folder(), quantized_model_filename(self.model_variant))
+        if not os.path.exists(model_path):
+            self._logger.error(f"Quantized model {model_path} does not exist, using the float model. "
+                               "Create it with: python -m octoprint_pinozcam.quantize quantize")
+            return self.bin_file_path
+        return model_path
+
     def _thread_calculation(self):
         total_cpu_cores = multiprocessing.cpu_count()
         num_threads_candidate = max(1, math.ceil(total_cpu_cores * self.cpu_speed_control))
         self.num_threads = self._largest_power_of_two(num_threads_candidate)
         self._logger.info(f"num_threads:{self.num_threads}")
     
-    def draw_response_data(self, scores, boxes, labels, severity, image):
+    def draw_response_data(self, scores, boxes, labels, severity, image, scores_threshold=None):
         """
         Draws bounding boxes and labels on the image based on inference results.
 
@@ -615,10 +1269,13 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
         - labels: Class labels for the detected objects.
         - severity: The severity level of the detection.
         - image: The original image on which detections are to be drawn.
+        - scores_threshold: The minimum score of a drawn box. Defaults to the scoresThreshold setting.
 
         Returns:
         - The image with bounding boxes and labels drawn on it.
         """
+        if scores_threshold is None:
+            scores_threshold = self.scores_threshold
         draw = ImageDraw.Draw(image)
         color = "green"  # Default color for bounding boxes
 
@@ -630,7 +1287,7 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
 
         # Assuming you've already created an ImageDraw.Draw object named 'draw'
         for box, score in zip(boxes, scores):
-            if score < self.scores_threshold:
+            if score < scores_threshold:
                 break
             x1, y1, x2, y2 = box
             draw.rectangle([(x1, y1), (x2, y2)], outline=color, width=2)
@@ -709,6 +1366,7 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
                     self.telegram_bot_thread.daemon = True
                     self.telegram_bot_thread.start()
                 self.telegram_server_running = True
+                self._push_status()
             except Exception as e:
                 self._logger.error(f"An error occurred while setting up the Telegram bot: {str(e)}")
                 self.stop_telegram_bot()
@@ -725,6 +1383,7 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
                     self._logger.error(f"Error occurred while stopping Telegram bot polling: {str(e)}")
             self._logger.info("Telegram bot has been stopped.")
         self.telegram_server_running = False
+        self._push_status()
 
     def on_settings_save(self, data):
         """
@@ -738,6 +1397,7 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
 
         # Update the plugin settings based on the data provided
         self.mask_image_data = data.get("maskImageData", self.mask_image_data)
+        self._compile_mask()
         self.enable_AI = bool(data.get("enableAI", self.enable_AI))
         self.action = int(data.get("action", self.action))
         self.ai_start_delay = int(data.get("aiStartDelay", self.ai_start_delay))
@@ -753,18 +1413,64 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
         self.telegram_bot_token = data.get("telegramBotToken", self.telegram_bot_token)
         self.telegram_chat_id = data.get("telegramChatID", self.telegram_chat_id)
         self.discord_webhook_url = data.get("discordWebhookURL", self.discord_webhook_url)
+        self.nms_method = data.get("nmsMethod", self.nms_method)
+        self.graph_optimization_level = data.get("graphOptimizationLevel", self.graph_optimization_level)
+        self.cache_optimized_model = bool(data.get("cacheOptimizedModel", self.cache_optimized_model))
+        self.io_binding = bool(data.get("ioBinding", self.io_binding))
+        self.cpu_mem_arena = bool(data.get("cpuMemArena", self.cpu_mem_arena))
+        self.mem_pattern = bool(data.get("memPattern", self.mem_pattern))
+        self.model_variant = data.get("modelVariant", self.model_variant)
+        self.roi_inference = bool(data.get("roiInference", self.roi_inference))
+        self.cascade_mode = bool(data.get("cascadeMode", self.cascade_mode))
+        self.cascade_width = int(data.get("cascadeWidth", self.cascade_width))
+        self.cascade_height = int(data.get("cascadeHeight", self.cascade_height))
+        self.cascade_score_gate = float(data.get("cascadeScoreGate", self.cascade_score_gate))
+        self.cascade_area_gate = float(data.get("cascadeAreaGate", self.cascade_area_gate))
+        self.frame_gating = bool(data.get("frameGating", self.frame_gating))
+        self.frame_gate.change_threshold = float(data.get("gateChangeThreshold", self.frame_gate.change_threshold))
+        self.frame_gate.hash_distance = int(data.get("gateHashDistance", self.frame_gate.hash_distance))
+        self.frame_gate.dark_threshold = float(data.get("gateDarkThreshold", self.frame_gate.dark_threshold))
+        self.frame_gate.blur_threshold = float(data.get("gateBlurThreshold", self.frame_gate.blur_threshold))
+        self.frame_gate.refresh_interval = float(data.get("gateRefreshInterval", self.frame_gate.refresh_interval))
+        self.inference_worker = bool(data.get("inferenceWorker", self.inference_worker))
+        self.worker_memory_limit = int(data.get("workerMemoryLimit", self.worker_memory_limit))
+        self.worker_timeout = float(data.get("workerTimeout", self.worker_timeout))
+        self.async_capture = bool(data.get("asyncCapture", self.async_capture))
+        self.capture_max_age = float(data.get("captureMaxAge", self.capture_max_age))
+        self.reduced_decode = bool(data.get("reducedDecode", self.reduced_decode))
+        self.snapshot_timeout = float(data.get("snapshotTimeout", self.snapshot_timeout))
+        self.notification_timeout = float(data.get("notificationTimeout", self.notification_timeout))
+        self.mjpeg_stream = bool(data.get("mjpegStream", self.mjpeg_stream))
+        self.mjpeg_stream_url = data.get("mjpegStreamUrl", self.mjpeg_stream_url)
+        self.scheduler.frames_per_minute = float(data.get("targetFramesPerMinute", self.scheduler.frames_per_minute))
+        self.scheduler.max_duty_cycle = float(data.get("maxDutyCycle", self.scheduler.max_duty_cycle))
+        if "thermalSteps" in data:
+            self._set_thermal_steps(data["thermalSteps"])
+        self.scheduler.burst_frames = int(data.get("burstFrames", self.scheduler.burst_frames))
+        self.scheduler.burst_frames_per_minute = float(data.get("burstFramesPerMinute", self.scheduler.burst_frames_per_minute))
+        self.multi_camera = bool(data.get("multiCamera", self.multi_camera))
+        self.camera_settings = data.get("cameraSettings", self.camera_settings) or {}
+        self.frame_cache.ttl = float(data.get("previewCacheTtl", self.frame_cache.ttl))
+        self.snapshot_max_age = float(data.get("snapshotMaxAge", self.snapshot_max_age))
 
         if "/?action=stream" in self.custom_snapshot_url:
             self.custom_snapshot_url = self.custom_snapshot_url.replace("/?action=stream", "/?action=snapshot")
             self._logger.info(f"self.custom_snapshot_url has been changed to {self.custom_snapshot_url}")
+        self._check_advanced_settings()
+        self._apply_http_timeouts()
         self._logger.info("Plugin settings saved.")
 
         #re-initialize the parameters
         self._thread_calculation()
         self.initialize_cameras()
+        self._start_mjpeg_stream()
+        self._build_monitors()
+        self.frame_cache.invalidate()
         self.initialize_font()
         self.notification_reach_to_max=False
         self.setting_change_while_printing=True
+        # The mask or the camera may have changed
+        self._push_status(new_frame=True)
 
         #send a welcome test message to the telegram chat
         welcome_image = self.create_image_with_text(self.welcome_text)
@@ -856,10 +1562,12 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
                 message = self.telegram_bot.send_message(self.telegram_chat_id, text=caption, reply_markup=keyboard, disable_notification=disable_notification)
             
             self._logger.info(f"Message sent to Telegram successfully. Message ID: {message.message_id}")
+            self._count_notification("telegram", True)
             if self.ai_running:
                 self.current_telegram_message_set.add(message.message_id)
         except Exception as e:
             self._logger.error(f"Failed to send message to Telegram: {str(e)}")
+            self._count_notification("telegram", False)
 
         @self.telegram_bot.callback_query_handler(func=lambda call: True)
         def callback_query(call):
@@ -949,21 +1657,87 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
                     self.telegram_send_with_reply(caption="There is no active print job.", reply_buttons=0, disable_notification=True)
             self.telegram_bot.answer_callback_query(call.id)
 
-    def transform_image(self, img, must_flip_h, must_flip_v, must_rotate):
-        # Only call Pillow if we need to transpose anything
-        if must_flip_h or must_flip_v or must_rotate:
-            self._logger.info(
-                "Transformations : FlipH={}, FlipV={} Rotate={}".format(must_flip_h, must_flip_v, must_rotate))
-
-            if must_flip_h:
-                img = img.transpose(Image.FLIP_LEFT_RIGHT)
-            if must_flip_v:
-                img = img.transpose(Image.FLIP_TOP_BOTTOM)
-            if must_rotate:
-                img = img.rotate(90, expand=True)
-        return img
-
-    def get_snapshot(self):
+    def _mjpeg_url(self):
+        """
+        Returns the MJPEG stream URL: mjpegStreamUrl, else the stream matching the custom snapshot URL,
+        else OctoPrint's webcam stream URL, made absolute for a local streamer.
+        """
+        if self.mjpeg_stream_url:
+            return self.mjpeg_stream_url
+        if self.custom_snapshot_url.startswith("http"):
+            return self.custom_snapshot_url.replace("action=snapshot", "action=stream")
+        stream_url = self._settings.global_get(["webcam", "stream"])
+        if stream_url and stream_url.startswith("/"):
+            stream_url = "http://127.0.0.1" + stream_url
+        return stream_url or None
+
+    def _start_mjpeg_stream(self):
+        """
+        Opens the MJPEG stream when mjpegStream is enabled, replacing a stream already open.
+        """
+        if self.mjpeg is not None:
+            self.mjpeg.stop()
+            self.mjpeg = None
+        # A new stream counts its frames from 0 again
+        self.mjpeg_sequence = 0
+        if not self.mjpeg_stream:
+            return
+        stream_url = self._mjpeg_url()
+        if not stream_url or not stream_url.startswith("http"):
+            self._logger.error(f"MJPEG stream mode needs an http stream URL, got {stream_url}. Using snapshots.")
+            return
+        self.mjpeg = MjpegStream(stream_url, self.http.endpoint("stream"), logger=self._logger)
+        self.mjpeg.start()
+
+    def _webcam_source(self, data):
+        """
+        Wraps snapshot bytes of OctoPrint's webcam with its flipH, flipV and rotate90 settings.
+        """
+        return SnapshotSource(data,
+                              self._settings.global_get_boolean(["webcam", "flipH"]),
+                              self._settings.global_get_boolean(["webcam", "flipV"]),
+                              self._settings.global_get_boolean(["webcam", "rotate90"]))
+
+    def _mjpeg_source(self, jpeg):
+        """
+        Wraps a JPEG from the MJPEG stream, with the webcam transformations when the stream is OctoPrint's.
+        """
+        if self.custom_snapshot_url or self.mjpeg_stream_url:
+            return SnapshotSource(jpeg, False, False, False)
+        return self._webcam_source(jpeg)
+
+    def get_snapshot(self, target_size=None, max_age=None):
+        """
+        Fetches and decodes a snapshot through the snapshot broker, so concurrent callers share one fetch.
+
+        Args:
+            target_size (tuple, optional): Decode a JPEG at reduced scale, no smaller than this (width, height).
+            max_age (float, optional): The oldest snapshot accepted in seconds, snapshotMaxAge by default.
+
+        Returns:
+            PIL.Image.Image: The snapshot, or None if it could not be fetched or decoded.
+        """
+        if max_age is None:
+            max_age = self.snapshot_max_age
+        try:
+            return self.snapshot_broker.image(max_age, target_size)
+        except IOError as e:
+            self._logger.error(f"Failed to decode snapshot: {e}")
+            return None
+
+    def _snapshot_source(self):
+        """
+        Fetches the encoded snapshot, without decoding it.
+
+        Returns:
+            SnapshotSource: The snapshot bytes and their transformations, or None if it could not be fetched.
+        """
+        if self.mjpeg is not None:
+            latest = self.mjpeg.latest()
+            if latest is not None:
+                return self._mjpeg_source(latest[0])
+            self._logger.info("No recent frame from the MJPEG stream, falling back to a snapshot")
+
         if self.custom_snapshot_url:
             self._logger.info("Using custom URL")
             try:
@@ -971,18 +1745,16 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
                     # Handle local file paths
                     file_path = self.custom_snapshot_url.partition('file://')[2]
                     with open(file_path, "rb") as file:
-                        img = Image.open(file)
-                        return img.copy()
+                        return SnapshotSource(file.read(), False, False, False)
                     
                 else:
                     # Handle HTTP URLs
                     if "/?action=stream" in self.custom_snapshot_url:
                         self.custom_snapshot_url = self.custom_snapshot_url.replace("/?action=stream", "/?action=snapshot")
                         self._logger.info(f"self.custom_snapshot_url has been changed to {self.custom_snapshot_url}")
-                    response = requests.get(self.custom_snapshot_url)
+                    response = self.http.endpoint("camera").get(self.custom_snapshot_url)
                     response.raise_for_status()  # This will throw an error for bad responses
-                    img = Image.open(BytesIO(response.content))
-                    return img
+                    return SnapshotSource(response.content, False, False, False)
             except requests.RequestException as e:
                 self._logger.error(f"Failed to fetch custom snapshot URL: {e}")
                 return None
@@ -994,27 +1766,11 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
             for camera in self.cameras:
                 configs = camera.get_webcam_configurations()
                 for config in configs:
-                    try:
-                        snapshot_iter = camera.take_webcam_snapshot(config)
-                        snapshot = b''
-                        for b in snapshot_iter:
-                            snapshot += b
-
-                        must_flip_h = config.flipH
-                        must_flip_v = config.flipV
-                        must_rotate = config.rotate90
-
-                        # Create an Image object from the snapshot bytes
-                        img = Image.open(BytesIO(snapshot))
-                        img = self.transform_image(img, must_flip_h, must_flip_v, must_rotate)
-                        #self._logger.info(config)
-                        return img
-                    except Exception as e:
-                        self._logger.error(f"Error processing camera snapshot: {e}")
-                        pass
+                    source = self._webcam_config_source(camera, config)
+                    if source is not None:
+                        return source
         
         self._logger.info("Falling back to default snapshot method")
-        snapshot = None
         snapshot_url = self._settings.global_get(["webcam", "snapshot"])
         if not snapshot_url:
             self._logger.error("No snapshot URL configured")
@@ -1025,78 +1781,209 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
                 # Handling local file paths
                 file_path = snapshot_url.partition('file://')[2]
                 with open(file_path, "rb") as file:
-                    img = Image.open(file)
+                    snapshot = file.read()
             else:
                 # Handling URLs
-                response = requests.get(snapshot_url)
+                response = self.http.endpoint("camera").get(snapshot_url)
                 response.raise_for_status()
-                img = Image.open(BytesIO(response.content))
-            
-            # Apply transformations if needed
-            must_flip_h = self._settings.global_get_boolean(["webcam", "flipH"])
-            must_flip_v = self._settings.global_get_boolean(["webcam", "flipV"])
-            must_rotate = self._settings.global_get_boolean(["webcam", "rotate90"])
-            img = self.transform_image(img, must_flip_h, must_flip_v, must_rotate)  # Note: This line might need adjustment
-            return img
+                snapshot = response.content
+            return self._webcam_source(snapshot)
         except requests.RequestException as e:
             self._logger.error(f"Failed to fetch default snapshot: {e}")
             return None
         except IOError as e:
             self._logger.error(f"Failed to open local snapshot file: {e}")
             return None
-    
-    def check_response(self, base64EncodedImage):
+
+    def _status_data(self):
+        """
+        Returns the status shown in the PiNozCam tab, pushed to the browser and returned by /check.
+        """
+        return {
+            "failureCount": self._failure_count(),
+            "aiStatus": "ON" if self.enable_AI and self.ai_running else "OFF",
+            "telegramStatus": "ON" if self.telegram_server_running else "OFF",
+            "cpuTemperature": int(self.get_cpu_temperature()),
+            "frameSequence": self.frame_sequence,
+        }
+
+    def _push_status(self, new_frame=False):
+        """
+        Schedules a status push to every open PiNozCam tab and returns at once, so the AI
+        loop never waits for the sockets. Pushes scheduled in a row are sent as one.
+
+        Parameters:
+        - new_frame: True when the preview changed, the tab then loads the image again.
+        """
+        if new_frame:
+            self.frame_sequence += 1
+            self.frame_cache.invalidate()
+        self.status_push_event.set()
+
+    def _stop_status_push(self):
+        """
+        Stops the status push thread, waiting at most 1 second for it.
+        """
+        self.stop_event.set()
+        self.status_push_event.set()
+        thread = getattr(self, "status_push_thread", None)
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(1.0)
+
+    def _status_push_loop(self):
+        """
+        Sends the latest status over the OctoPrint socket whenever a push was scheduled,
+        until stop_event is set.
+        """
+        while not self.stop_event.is_set():
+            self.status_push_event.wait()
+            self.status_push_event.clear()
+            if self.stop_event.is_set():
+                break
+            try:
+                self._plugin_manager.send_plugin_message(self._identifier, self._status_data())
+            except Exception as e:
+                self._logger.error(f"Failed to push the status: {e}")
+
+    def check_response(self, base64EncodedImage, frame=None):
         """
         Helper method to construct a JSON response for checking the AI processing status.
 
         Parameters:
-        - base64EncodedImage: The base64 encoded image to be included in the response.
+        - base64EncodedImage: The base64 encoded image to be included in the response, or None to leave it out.
+        - frame: The cached preview frame, whose ETag and sequence are included in the response.
 
         Returns:
         - Flask.Response: JSON response containing the image and additional status information.
         """
-        failure_count = 0
+        gate_counters = self._gate_counters()
         with self.lock:
-            failure_count = self.count
-        response_data  = {
+            cameras = [monitor.status() for monitor in self.monitors]
+        response_data  = self._status_data()
+        response_data.update({
                 "image": base64EncodedImage,  
-                "failureCount": failure_count,  
-                "aiStatus": "ON" if self.enable_AI and self.ai_running else "OFF",
-                "telegramStatus": "ON" if self.telegram_server_running else "OFF",
-                "cpuTemperature": int(self.get_cpu_temperature())
-            }
+                "framesInferred": gate_counters["inferred"],
+                "framesSkipped": gate_counters["skipped"],
+                "connections": self.http.status(),
+                "scheduler": self.scheduler.status(),
+                "cameras": cameras,
+                "imageEtag": frame.etag if frame else None,
+                "imageSequence": frame.sequence if frame else None,
+                "previewCache": self.frame_cache.status(),
+                "snapshotBroker": self.snapshot_broker.status()
+            })
         return Response(json.dumps(response_data), mimetype="application/json")
     
+    def _preview_jpeg(self):
+        """
+        Produces the JPEG bytes of the preview: the newest failure image of any camera within
+        5 seconds, otherwise the masked camera snapshot, otherwise the 'no camera' image.
+        """
+        with self.lock:
+            latest = max((monitor.ai_results[-1] for monitor in self.monitors if monitor.ai_results),
+                         key=lambda result: result['time'], default=None)
+            if latest and (time.time() - latest['time']) <= 5:
+                ai_result_image = latest['ai_result_image']
+            else:
+                ai_result_image = None
+
+        if ai_result_image:
+            return base64.b64decode(ai_result_image.partition(",")[2])
+
+        input_unmasked_image = self.get_snapshot()
+        if input_unmasked_image is None:
+            return self._no_camera_jpeg()
+        return self.encode_image_to_jpeg(self.apply_mask_to_image(input_unmasked_image))
+
     @octoprint.plugin.BlueprintPlugin.route("/check", methods=["GET"])
     def check(self):
         """
         Endpoint to check the current status of the AI processing and
         return the latest processed image or camera snapshot.
 
+        The preview is produced at most once per previewCacheTtl seconds and shared by all clients.
+        With ?image=0 the image is left out and clients load it from /image when imageEtag changes.
+
         Returns:
         - Flask.Response: JSON response containing the image data and additional information.
         """
-        
-        with self.lock:
-            #within 5 seconds, show the failure image.
-            if self.ai_results and (time.time() - self.ai_results[-1]['time']) <= 5:
-                ai_result_image = self.ai_results[-1]['ai_result_image']  
-            else:
-                ai_result_image = None 
+        frame = self.frame_cache.get(self._preview_jpeg)
+        if request.args.get("image") == "0":
+            return self.check_response(None, frame)
+        return self.check_response(self.frame_cache.data_url(frame), frame)
 
-        if ai_result_image:
-            return self.check_response(ai_result_image)
+    @octoprint.plugin.BlueprintPlugin.route("/image", methods=["GET"])
+    def check_image(self):
+        """
+        Endpoint serving the preview shown by /check as a JPEG.
 
-        # Use the get_snapshot method to get the processed image
-        input_unmasked_image = self.get_snapshot()
-        if input_unmasked_image is None:
-            return self.check_response(self._encode_no_camera_image())
+        Returns:
+        - Flask.Response: The JPEG with its ETag, or 304 Not Modified when it matches If-None-Match.
+        """
+        frame = self.frame_cache.get(self._preview_jpeg)
+        response = Response(frame.jpeg, mimetype="image/jpeg")
+        response.set_etag(frame.etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response.make_conditional(request)
+
+    @octoprint.plugin.BlueprintPlugin.route("/metrics", methods=["GET"])
+    def metrics_endpoint(self):
+        """
+        Endpoint serving the plugin metrics in the Prometheus text format.
 
-        input_image = self.apply_mask_to_image(input_unmasked_image)
-        # Since get_snapshot returns the image data as bytes, we can directly use it
-        encoded_image = self.encode_image_to_base64(input_image)
-        return self.check_response(encoded_image)
+        Returns:
+        - Flask.Response: Plain text response with frame latency histograms, counters and gauges.
+        """
+        return Response(self.metrics.render(), mimetype=self.metrics.content_type)
 
+    @octoprint.plugin.BlueprintPlugin.route("/profile", methods=["GET"])
+    def profile_status(self):
+        """
+        Endpoint returning the stage timings of the last frame and the state of the profiler.
+
+        Returns:
+        - Flask.Response: JSON response with "frameTimings" in milliseconds and the profiler status.
+        """
+        with self.lock:
+            frame_timings = dict(self.last_frame_timings)
+        response_data = dict(self.profiler.status(), frameTimings=frame_timings)
+        return Response(json.dumps(response_data), mimetype="application/json")
+
+    @octoprint.plugin.BlueprintPlugin.route("/profile", methods=["POST"])
+    def start_profile(self):
+        """
+        Endpoint starting a cProfile run of the AI loop for the next frames.
+
+        The JSON body may set "frames", the number of profiled frames (1-1000, default 20).
+
+        Returns:
+        - Flask.Response: JSON response with the profiler status, 409 if a profile is already running.
+        """
+        data = request.get_json(silent=True) or {}
+        try:
+            frames = int(data.get("frames", 20))
+        except (TypeError, ValueError):
+            frames = 0
+        if not 1 <= frames <= 1000:
+            return Response(json.dumps({"error": "frames must be between 1 and 1000"}), status=400, mimetype="application/json")
+
+        accepted = self.profiler.start(frames)
+        self._logger.info(f"Profiling of the next {frames} AI frames {'requested' if accepted else 'refused, a profile is running'}")
+        return Response(json.dumps(self.profiler.status()), status=200 if accepted else 409, mimetype="application/json")
+
+    @octoprint.plugin.BlueprintPlugin.route("/profile/download", methods=["GET"])
+    def download_profile(self):
+        """
+        Endpoint downloading the last profile: the pstats dump, or its text summary with ?format=txt.
+        """
+        profile_path = self.profiler.last_profile
+        if not profile_path:
+            return Response(json.dumps({"error": "No profile recorded yet"}), status=404, mimetype="application/json")
+        if request.args.get("format") == "txt":
+            profile_path = profile_path[:-len(".prof")] + ".txt"
+        if not os.path.exists(profile_path):
+            return Response(json.dumps({"error": "The profile has been removed"}), status=404, mimetype="application/json")
+        return send_file(profile_path, as_attachment=True)
 
     def get_template_configs(self):
         return [
@@ -1108,6 +1995,9 @@ class PinozcamPlugin(octoprint.plugin.StartupPlugin,
                     css=["css/pinozcam.css"],
                 )
         
+    def register_custom_events(self, *args, **kwargs):
+        return ["failure_detected"]
+
     def get_update_information(self, *args, **kwargs):
         return dict(
             pinozcam=dict(
@@ -1137,4 +2027,5 @@ def __plugin_load__():
 	global __plugin_hooks__
 	__plugin_hooks__ = {
 		"octoprint.plugin.softwareupdate.check_config": plugin.get_update_information,
+		"octoprint.events.register_custom_events": plugin.register_custom_events,
 	}
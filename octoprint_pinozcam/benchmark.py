@@ -0,0 +1,250 @@
+"""
+Micro-benchmarks for the PiNozCam inference pipeline.
+
+Run with ``python -m octoprint_pinozcam.benchmark``, or
+``python -m octoprint_pinozcam.benchmark --output bench.json`` to keep the report.
+
+The pipeline benchmark times every stage of image_inference on a seeded
+frame. It uses the real model when it is installed and otherwise a generated
+stand-in with the same 10 output heads, which needs the onnx package.
+"""
+import argparse
+import json
+import os
+import platform
+import time
+
+import numpy as np
+import onnxruntime
+from PIL import Image
+
+from .coverage import failure_area, coverage_map
+from .inference import (_get_decoder, _get_input_buffer, _preprocess_into, _scale_boxes, _severity,
+                        image_inference)
+from .nms import NMS_METHODS, nms
+
+STRIDES = (8, 16, 32, 64, 128)
+
+def _time_call(func, repeat):
+    """
+    Time a callable and return the median and minimum run time in milliseconds.
+
+    Args:
+        func (callable): The function to time, called without arguments.
+        repeat (int): The number of timed runs.
+
+    Returns:
+        dict: The median and min run time in milliseconds.
+    """
+    func()  # warm up
+    samples = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start_time) * 1000.0)
+    return {"median_ms": float(np.median(samples)), "min_ms": float(np.min(samples))}
+
+def _random_boxes(rng, count, width, height):
+    """
+    Generate seeded random boxes within the processed image.
+    """
+    xy1 = rng.uniform(0, 1, (count, 2)) * [width, height]
+    wh = rng.uniform(0.02, 0.3, (count, 2)) * [width, height]
+    return np.concatenate([xy1, xy1 + wh], axis=1).astype(np.float32)
+
+def bench_coverage(box_counts=(1, 6, 25, 100), repeat=50, seed=0, width=640, height=384):
+    """
+    Benchmark the failure area and coverage map for a growing number of boxes.
+
+    Returns:
+        list of dict: One entry per box count.
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    for count in box_counts:
+        boxes = _random_boxes(rng, count, width, height)
+        results.append({
+            "boxes": count,
+            "failure_area": _time_call(lambda: failure_area(boxes, width, height), repeat),
+            "coverage_map": _time_call(lambda: coverage_map(boxes, width, height), repeat),
+        })
+    return results
+
+def bench_nms(candidate_counts=(10, 100, 1000), repeat=50, seed=0, width=640, height=384):
+    """
+    Benchmark every NMS method for a growing number of candidates.
+
+    Returns:
+        list of dict: One entry per candidate count.
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    for count in candidate_counts:
+        boxes = _random_boxes(rng, count, width, height).astype(np.float64)
+        scores = rng.uniform(0.05, 1.0, count).astype(np.float32)
+        classes = np.ones(count, dtype=np.int64)
+        entry = {"candidates": count}
+        for method in NMS_METHODS:
+            entry[method] = _time_call(lambda: nms(scores, boxes, classes, 0.5, 6, method=method), repeat)
+        results.append(entry)
+    return results
+
+def _default_model():
+    return os.path.join(os.path.dirname(__file__), 'static', 'nozcam.bin')
+
+def synthetic_model(seed=0, num_anchors=9, num_classes=1):
+    """
+    Build a tiny stand-in for the PiNozCam model.
+
+    The model has the same dynamic (batch, 3, height, width) input and the same
+    10 outputs: 5 sigmoid class heads with num_anchors * num_classes channels,
+    then 5 box heads with num_anchors * 4 channels, at strides 8 to 128. Every
+    head is a 1x1 convolution of the average-pooled input with seeded weights.
+
+    Returns:
+        bytes: The serialized ONNX model, accepted by onnxruntime.InferenceSession.
+    """
+    # onnx is only needed to generate the stand-in, not by the plugin
+    from onnx import TensorProto, helper, numpy_helper
+
+    rng = np.random.default_rng(seed)
+    nodes, initializers, outputs = [], [], []
+    for level, stride in enumerate(STRIDES):
+        nodes.append(helper.make_node('AveragePool', ['input'], [f'pool{level}'],
+                                      kernel_shape=[stride, stride], strides=[stride, stride], ceil_mode=1))
+    for kind, channels in (('cls', num_anchors * num_classes), ('box', num_anchors * 4)):
+        for level in range(len(STRIDES)):
+            weight = rng.normal(0, 1 if kind == 'cls' else 0.1, (channels, 3, 1, 1)).astype(np.float32)
+            initializers.append(numpy_helper.from_array(weight, f'{kind}_weight{level}'))
+            output = f'{kind}_head{level}'
+            if kind == 'cls':
+                nodes.append(helper.make_node('Conv', [f'pool{level}', f'{kind}_weight{level}'], [f'{output}_logits']))
+                nodes.append(helper.make_node('Sigmoid', [f'{output}_logits'], [output]))
+            else:
+                nodes.append(helper.make_node('Conv', [f'pool{level}', f'{kind}_weight{level}'], [output]))
+            outputs.append(helper.make_tensor_value_info(output, TensorProto.FLOAT, None))
+
+    graph = helper.make_graph(
+        nodes, 'nozcam_synthetic',
+        [helper.make_tensor_value_info('input', TensorProto.FLOAT, ['batch', 3, 'height', 'width'])],
+        outputs, initializers)
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 8
+    return model.SerializeToString()
+
+def _synthetic_frame(rng, width, height):
+    """
+    Generate a seeded frame with smooth structure, so the heads see more than uniform noise.
+    """
+    coarse = rng.integers(0, 256, (height // 40 + 1, width // 40 + 1, 3), dtype=np.uint8)
+    return Image.fromarray(coarse).resize((width, height), Image.BILINEAR)
+
+def bench_pipeline(model_path=None, synthetic=False, repeat=20, seed=0, image_size=(1280, 720), proc_size=(640, 384),
+                   scores_threshold=0.75, img_sensitivity=0.04, nms_method="greedy", num_threads=1):
+    """
+    Benchmark every stage of image_inference on one seeded frame.
+
+    The stages are timed separately with the exact inputs image_inference
+    passes between them: resize, preprocess, the ONNX run, decode of all FPN
+    levels, NMS, severity (the failure area) and box scaling. The whole call is
+    timed as "total".
+
+    Args:
+        model_path (str, optional): The model to run. Defaults to the installed model,
+            or the synthetic stand-in when it is missing.
+        synthetic (bool): Always use the synthetic stand-in. Default is False.
+
+    Returns:
+        dict: The model used, the candidate and detection counts and the time of every stage.
+    """
+    if synthetic:
+        model_path = None
+    elif model_path is None and os.path.exists(_default_model()):
+        model_path = _default_model()
+    model = model_path if model_path else synthetic_model(seed)
+
+    sess_opt = onnxruntime.SessionOptions()
+    sess_opt.intra_op_num_threads = num_threads
+    ort_session = onnxruntime.InferenceSession(model, sess_opt, providers=['CPUExecutionProvider'])
+    input_name = ort_session.get_inputs()[0].name
+
+    rng = np.random.default_rng(seed)
+    proc_width, proc_height = proc_size
+    image = _synthetic_frame(rng, *image_size)
+
+    # Run the pipeline once to produce the input of every stage
+    resized_image = image.resize(proc_size)
+    input_batch = _get_input_buffer(1, proc_height, proc_width)
+    _preprocess_into(np.asarray(resized_image, dtype=np.uint8), input_batch[0])
+    ort_outs = ort_session.run(None, {input_name: input_batch})
+    frame_outs = [out[0] for out in ort_outs]
+    cls_heads, box_heads = frame_outs[:5], frame_outs[5:]
+    strides = [proc_width // cls_head.shape[-1] for cls_head in cls_heads]
+    decoder = _get_decoder(proc_width, proc_height, strides)
+    threshold = max(0.05, scores_threshold)
+
+    def decode():
+        return decoder.decode(cls_heads, box_heads, strides, threshold, 1000)
+
+    all_scores, all_boxes, all_classes = decode()
+    if all_scores.size:
+        scores, boxes, _ = nms(all_scores, all_boxes, all_classes, 0.5, 6, method=nms_method, presorted=True)
+    else:
+        scores, boxes = all_scores, all_boxes
+
+    stages = {
+        "resize": _time_call(lambda: image.resize(proc_size), repeat),
+        "preprocess": _time_call(lambda: _preprocess_into(np.asarray(resized_image, dtype=np.uint8), input_batch[0]), repeat),
+        "run": _time_call(lambda: ort_session.run(None, {input_name: input_batch}), repeat),
+        "decode": _time_call(decode, repeat),
+        "nms": _time_call(lambda: nms(all_scores, all_boxes, all_classes, 0.5, 6, method=nms_method,
+                                      presorted=True), repeat)
+               if all_scores.size else None,
+        "severity": _time_call(lambda: _severity(scores, boxes, scores_threshold, img_sensitivity,
+                                                 proc_width, proc_height), repeat),
+        "scale_boxes": _time_call(lambda: _scale_boxes(boxes, image.size, proc_width, proc_height), repeat),
+        "total": _time_call(lambda: image_inference(image, scores_threshold, img_sensitivity, ort_session,
+                                                    _proc_img_width=proc_width, _proc_img_height=proc_height,
+                                                    nms_method=nms_method), repeat),
+    }
+    return {
+        "model": model_path or "synthetic",
+        "image_size": list(image_size),
+        "proc_size": list(proc_size),
+        "candidates": int(all_scores.size),
+        "detections": int(len(scores)),
+        "stages": stages,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="PiNozCam inference micro-benchmarks")
+    parser.add_argument("--repeat", type=int, default=50, help="number of timed runs per case")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic inputs")
+    parser.add_argument("--model", help="model to run, defaults to the installed model or the synthetic stand-in")
+    parser.add_argument("--synthetic", action="store_true", help="always use the synthetic stand-in model")
+    parser.add_argument("--nms-method", choices=NMS_METHODS, default="greedy", help="NMS method of the pipeline")
+    parser.add_argument("--threads", type=int, default=1, help="intra-op threads of the ONNX session")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "onnxruntime": onnxruntime.__version__,
+            "machine": platform.machine(),
+        },
+        "coverage": bench_coverage(repeat=args.repeat, seed=args.seed),
+        "nms": bench_nms(repeat=args.repeat, seed=args.seed),
+        "pipeline": bench_pipeline(model_path=args.model, synthetic=args.synthetic,
+                                   repeat=args.repeat, seed=args.seed,
+                                   nms_method=args.nms_method, num_threads=args.threads),
+    }
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
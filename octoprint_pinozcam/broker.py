@@ -0,0 +1,105 @@
+import threading
+import time
+
+from .decode import decode_snapshot
+
+class SnapshotBroker:
+    """
+    Shares snapshot fetches between the AI, the preview and Telegram.
+
+    Every caller states how old a snapshot it accepts. A snapshot fetched
+    within that time is returned as it is. Otherwise a new one is fetched,
+    and callers arriving while it is in flight wait for it instead of
+    fetching their own, so a slow webcam is never asked for two snapshots
+    at once. The decoded image is shared as well: every size is decoded
+    once per snapshot and callers get a copy they may draw on.
+
+    Attributes:
+        fetch (callable): Returns a SnapshotSource, or None when the snapshot could not be fetched.
+        hits (int): Requests served by a snapshot fresh enough.
+        coalesced (int): Requests that waited for a fetch already in flight.
+        misses (int): Requests that fetched a new snapshot.
+    """
+
+    def __init__(self, fetch):
+        self.fetch = fetch
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self._condition = threading.Condition()
+        self._source = None
+        self._timestamp = 0.0
+        self._fetching = False
+        self._flights = 0
+        self._flight_result = None
+        self._decode_lock = threading.Lock()
+        self._decoded_source = None
+        self._images = {}
+
+    def source(self, max_age=0.0):
+        """
+        Returns a snapshot no older than max_age seconds, or the one of a fetch in flight.
+
+        Args:
+            max_age (float): The oldest snapshot accepted, 0 for a new one.
+
+        Returns:
+            SnapshotSource: The snapshot, or None if it could not be fetched.
+        """
+        with self._condition:
+            if self._source is not None and time.monotonic() - self._timestamp <= max_age:
+                self.hits += 1
+                return self._source
+            if self._fetching:
+                self.coalesced += 1
+                flight = self._flights
+                self._condition.wait_for(lambda: self._flights != flight)
+                return self._flight_result
+            self.misses += 1
+            self._fetching = True
+
+        started = time.monotonic()
+        source = None
+        try:
+            source = self.fetch()
+        finally:
+            with self._condition:
+                if source is not None:
+                    self._source = source
+                    self._timestamp = started
+                self._flight_result = source
+                self._fetching = False
+                self._flights += 1
+                self._condition.notify_all()
+        return source
+
+    def image(self, max_age=0.0, target_size=None):
+        """
+        Returns a copy of the decoded snapshot, as source and decode_snapshot.
+
+        Returns:
+            PIL.Image.Image: The snapshot, or None if it could not be fetched.
+
+        Raises:
+            IOError: If the snapshot could not be decoded.
+        """
+        source = self.source(max_age)
+        if source is None:
+            return None
+        with self._decode_lock:
+            if self._decoded_source is not source:
+                self._decoded_source = source
+                self._images = {}
+            image = self._images.get(target_size)
+            if image is None:
+                image = decode_snapshot(source, target_size)
+                self._images[target_size] = image
+        return image.copy()
+
+    def status(self):
+        return {
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "age": round(time.monotonic() - self._timestamp, 3) if self._source is not None else None,
+        }
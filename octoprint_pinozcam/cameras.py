@@ -0,0 +1,89 @@
+import time
+from collections import deque
+
+from .gating import FrameGate
+from .mask import CompiledMask
+
+DEFAULT_CAMERA = "default"
+
+class CameraMonitor:
+    """
+    The AI state of one webcam: its snapshot source, mask, thresholds, failure count and results.
+
+    Attributes:
+        name (str): The webcam name, DEFAULT_CAMERA when a single camera is monitored.
+        fetch (callable): Returns a SnapshotSource of the webcam, or None when it could not be fetched.
+        mask_image_data (str): The mask of the camera, in any encoding accepted by decode_mask.
+        mask (CompiledMask): The compiled mask_image_data.
+        scores_threshold (float): The minimum score of a detection.
+        img_sensitivity (float): The failure area sensitivity.
+        frame_gate (FrameGate): The frame gate of the camera.
+        count (int): Failures detected within the counting window.
+        ai_results (collections.deque): The recent results of the camera.
+        last_result (tuple): The last inference result, reused for unchanged frames.
+        capture (CaptureThread): The capture thread of the camera while the AI runs asynchronously.
+        frames (int): The frames of the camera processed to the end.
+    """
+
+    def __init__(self, name, fetch, mask_image_data, scores_threshold, img_sensitivity, frame_gate=None):
+        self.name = name
+        self.fetch = fetch
+        self.mask_image_data = mask_image_data
+        self.mask = CompiledMask(mask_image_data)
+        self.scores_threshold = scores_threshold
+        self.img_sensitivity = img_sensitivity
+        self.frame_gate = frame_gate or FrameGate()
+        self.count = 0
+        self.ai_results = deque(maxlen=100)
+        self.last_result = None
+        self.last_severity = 0.0
+        self.capture = None
+        self.frames = 0
+
+    def configure(self, fetch, mask_image_data, scores_threshold, img_sensitivity, gate_settings):
+        """
+        Applies new settings, keeping the failure count and results.
+
+        Raises:
+            ValueError: If mask_image_data is not a valid mask.
+        """
+        if mask_image_data != self.mask_image_data:
+            self.mask = CompiledMask(mask_image_data)
+            self.mask_image_data = mask_image_data
+        self.fetch = fetch
+        self.scores_threshold = scores_threshold
+        self.img_sensitivity = img_sensitivity
+        for name, value in gate_settings.items():
+            setattr(self.frame_gate, name, value)
+        self.frame_gate.reset()
+
+    def clear(self):
+        """
+        Forgets the failure count and results, when a new print starts.
+        """
+        self.count = 0
+        self.ai_results.clear()
+        self.last_result = None
+
+    def prune(self, count_time, now=None):
+        """
+        Removes the results older than count_time seconds and their failures from the count.
+        The caller holds the plugin lock.
+        """
+        now = time.time() if now is None else now
+        while self.ai_results and now - self.ai_results[0]['time'] > count_time:
+            result = self.ai_results.popleft()
+            if result['severity'] > 0.66:
+                self.count -= 1
+
+    def status(self):
+        counters = self.frame_gate.get_counters()
+        return {
+            "name": self.name,
+            "failureCount": self.count,
+            "lastSeverity": round(self.last_severity, 3),
+            "framesProcessed": self.frames,
+            "framesInferred": counters["inferred"],
+            "framesSkipped": counters["skipped"],
+            "capturing": self.capture is not None,
+        }
@@ -0,0 +1,160 @@
+import collections
+import logging
+import threading
+import time
+
+Frame = collections.namedtuple("Frame", ["image", "sequence", "timestamp", "source", "staged"])
+Frame.__new__.__defaults__ = (None, None)
+
+class LatestFrame:
+    """
+    A one-slot frame buffer: a new frame replaces the one waiting, which is dropped.
+
+    Attributes:
+        dropped (int): The number of frames replaced before they were taken.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._frame = None
+        self._sequence = 0
+        self.dropped = 0
+
+    def put(self, image, timestamp=None, source=None, staged=None):
+        with self._condition:
+            if self._frame is not None:
+                self.dropped += 1
+            self._sequence += 1
+            self._frame = Frame(image, self._sequence, time.time() if timestamp is None else timestamp, source, staged)
+            self._condition.notify_all()
+
+    def take(self, timeout=None):
+        """
+        Removes and returns the waiting frame, waiting up to timeout seconds for one.
+
+        Returns:
+            Frame: The newest frame, or None if none arrived in time.
+        """
+        with self._condition:
+            if self._frame is None:
+                self._condition.wait_for(lambda: self._frame is not None, timeout)
+            frame, self._frame = self._frame, None
+            self._condition.notify_all()
+            return frame
+
+    def wait_for_space(self, max_age, timeout):
+        """
+        Waits until the waiting frame was taken or is older than max_age seconds.
+
+        Returns:
+            bool: True if there is space for a new frame, False if timeout expired first.
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._frame is not None:
+                age = time.time() - self._frame.timestamp
+                if age >= max_age:
+                    return True
+                remaining = min(max_age - age, deadline - time.monotonic())
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def clear(self):
+        with self._condition:
+            self._frame = None
+            self._condition.notify_all()
+
+class CaptureThread:
+    """
+    Fetches frames in the background into a LatestFrame buffer, so the AI loop
+    takes the newest frame without waiting for the camera.
+
+    The next frame is fetched as soon as the waiting one is taken, so fetching
+    overlaps inference without polling the camera faster than frames are used.
+    A frame that waits longer than max_age seconds is replaced by a fresh one.
+    When the caller knows the next frame is not needed for a while, it calls
+    defer: no fetch starts until the frame is due, less the time of the last
+    fetch, so the frame is fresh when it is taken.
+
+    Attributes:
+        fetch (callable): Returns a PIL image and the source it was decoded from, kept
+            with the frame, or None when no frame could be fetched.
+        prepare (callable, optional): Called with every decoded image in the capture thread,
+            returns the image to put and where it was staged for the worker, kept with the frame.
+        max_age (float): Seconds after which a waiting frame is refreshed.
+        retry_delay (float): Seconds to wait after a failed fetch.
+        latest (LatestFrame): The buffer the frames are put into.
+        failures (int): The number of failed fetches.
+        fetches (int): The number of fetches started.
+        fetch_seconds (float): The duration of the last fetch.
+    """
+
+    def __init__(self, fetch, max_age=2.0, retry_delay=1.0, prepare=None, logger=None):
+        self.fetch = fetch
+        self.prepare = prepare
+        self.max_age = max_age
+        self.retry_delay = retry_delay
+        self.latest = LatestFrame()
+        self.failures = 0
+        self.fetches = 0
+        self.fetch_seconds = 0.0
+        self._resume_time = 0.0
+        self._logger = logger or logging.getLogger(__name__)
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="PiNozCam capture", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """
+        Stops the thread. A fetch in progress is not interrupted; the thread exits after it.
+        """
+        self._stop_event.set()
+        self.latest.clear()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def defer(self, seconds):
+        """
+        Holds off fetching until the next frame is due in the given seconds.
+        """
+        self._resume_time = time.monotonic() + seconds
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            if not self.latest.wait_for_space(self.max_age, timeout=0.5) or self._stop_event.is_set():
+                continue
+            hold = self._resume_time - self.fetch_seconds - time.monotonic()
+            if hold > 0:
+                self._stop_event.wait(min(hold, 0.5))
+                continue
+
+            staged = None
+            self.fetches += 1
+            start_time = time.monotonic()
+            try:
+                fetched = self.fetch()
+                capture_time = time.time()
+                if fetched is not None:
+                    # Decode here instead of in the AI thread
+                    fetched[0].load()
+                    if self.prepare is not None:
+                        image, staged = self.prepare(fetched[0])
+                        fetched = (image, fetched[1])
+            except Exception as e:
+                self._logger.error(f"Frame capture failed: {e}")
+                fetched = None
+            self.fetch_seconds = time.monotonic() - start_time
+
+            if fetched is None:
+                self.failures += 1
+                self._stop_event.wait(self.retry_delay)
+                continue
+            image, source = fetched
+            self.latest.put(image, capture_time, source, staged)
@@ -0,0 +1,114 @@
+import numpy as np
+
+def _box_edges(boxes, width, height):
+    """
+    Convert boxes to the integer pixel edges used for the failure area.
+
+    Coordinates are truncated with int() and clipped to [0, size - 1], and the
+    lower-right corner is exclusive, exactly like the former per-pixel bitmap.
+
+    Args:
+        boxes (np.ndarray): Boxes with shape (N, 4) as x1, y1, x2, y2.
+        width (int): The width of the processed image.
+        height (int): The height of the processed image.
+
+    Returns:
+        tuple: x1, y1, x2, y2 as int64 arrays of shape (N,), with empty boxes removed.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    edges = np.trunc(boxes).astype(np.int64)
+    x1, x2 = np.clip(edges[:, 0], 0, width - 1), np.clip(edges[:, 2], 0, width - 1)
+    y1, y2 = np.clip(edges[:, 1], 0, height - 1), np.clip(edges[:, 3], 0, height - 1)
+
+    valid = (x2 > x1) & (y2 > y1)
+    return x1[valid], y1[valid], x2[valid], y2[valid]
+
+def _compress(x1, y1, x2, y2, extra_xs=None, extra_ys=None):
+    """
+    Build the coordinate-compressed grid spanned by the box edges.
+
+    Every cell of the compressed grid is either fully inside or fully outside
+    each box, so the union of the boxes is the set of covered cells.
+
+    Returns:
+        tuple: xs, ys (the sorted breakpoints) and covered (np.ndarray of bool
+        with shape (len(ys) - 1, len(xs) - 1)).
+    """
+    xs = np.concatenate([x1, x2] if extra_xs is None else [x1, x2, extra_xs])
+    ys = np.concatenate([y1, y2] if extra_ys is None else [y1, y2, extra_ys])
+    xs = np.unique(xs)
+    ys = np.unique(ys)
+
+    # A cell is covered when its lower-left corner lies inside any box
+    cx = xs[:-1]
+    cy = ys[:-1]
+    inside_x = (cx[None, :] >= x1[:, None]) & (cx[None, :] < x2[:, None])
+    inside_y = (cy[None, :] >= y1[:, None]) & (cy[None, :] < y2[:, None])
+    covered = (inside_y[:, :, None] & inside_x[:, None, :]).any(axis=0)
+
+    return xs, ys, covered
+
+def failure_area(boxes, width, height):
+    """
+    Compute the number of pixels covered by the union of the boxes.
+
+    Args:
+        boxes (np.ndarray): Boxes with shape (N, 4) in processed image coordinates.
+        width (int): The width of the processed image.
+        height (int): The height of the processed image.
+
+    Returns:
+        int: The covered area in pixels.
+    """
+    x1, y1, x2, y2 = _box_edges(boxes, width, height)
+    if x1.size == 0:
+        return 0
+    if x1.size == 1:
+        return int((x2[0] - x1[0]) * (y2[0] - y1[0]))
+
+    xs, ys, covered = _compress(x1, y1, x2, y2)
+    cell_areas = np.diff(ys)[:, None] * np.diff(xs)[None, :]
+    return int(cell_areas[covered].sum())
+
+def coverage_map(boxes, width, height, grid_size=64):
+    """
+    Compute the covered fraction of every cell of the mask grid.
+
+    The grid uses the same cell layout as the mask (ceil(size / grid_size)
+    pixels per cell), so the result lines up with mask_image_data.
+
+    Args:
+        boxes (np.ndarray): Boxes with shape (N, 4) in processed image coordinates.
+        width (int): The width of the processed image.
+        height (int): The height of the processed image.
+        grid_size (int): The number of cells per side. Default is 64.
+
+    Returns:
+        np.ndarray: A float32 array of shape (grid_size, grid_size) with values in [0, 1].
+    """
+    result = np.zeros((grid_size, grid_size), dtype=np.float32)
+    x1, y1, x2, y2 = _box_edges(boxes, width, height)
+    if x1.size == 0:
+        return result
+
+    block_width = -(-width // grid_size)
+    block_height = -(-height // grid_size)
+    grid_xs = np.arange(1, grid_size) * block_width
+    grid_ys = np.arange(1, grid_size) * block_height
+    grid_xs = grid_xs[grid_xs < width]
+    grid_ys = grid_ys[grid_ys < height]
+
+    # Adding the cell borders as breakpoints keeps every compressed cell inside one grid cell
+    xs, ys, covered = _compress(x1, y1, x2, y2, grid_xs, grid_ys)
+    cell_areas = np.diff(ys)[:, None] * np.diff(xs)[None, :]
+
+    rows, cols = np.nonzero(covered)
+    np.add.at(result, (ys[rows] // block_height, xs[cols] // block_width), cell_areas[rows, cols])
+
+    # Normalize by the in-image area of each cell; cells outside the image stay at zero
+    cell_w = np.clip(width - np.arange(grid_size) * block_width, 0, block_width)
+    cell_h = np.clip(height - np.arange(grid_size) * block_height, 0, block_height)
+    cell_total = cell_h[:, None] * cell_w[None, :]
+    np.divide(result, cell_total, out=result, where=cell_total > 0)
+
+    return result
@@ -0,0 +1,55 @@
+import collections
+from io import BytesIO
+
+from PIL import Image
+
+# The encoded snapshot and the webcam transformations to apply once it is decoded
+SnapshotSource = collections.namedtuple("SnapshotSource", ["data", "flip_h", "flip_v", "rotate90"])
+
+# flipH, then flipV, then a 90 degree counterclockwise rotation, as a single transpose
+_TRANSPOSE_METHODS = {
+    (False, False, False): None,
+    (True, False, False): Image.FLIP_LEFT_RIGHT,
+    (False, True, False): Image.FLIP_TOP_BOTTOM,
+    (True, True, False): Image.ROTATE_180,
+    (False, False, True): Image.ROTATE_90,
+    (True, False, True): Image.TRANSPOSE,
+    (False, True, True): Image.TRANSVERSE,
+    (True, True, True): Image.ROTATE_270,
+}
+
+def transpose_method(flip_h, flip_v, rotate90):
+    """
+    Returns the one PIL transpose method equal to the webcam transformations, or None if there are none.
+    """
+    return _TRANSPOSE_METHODS[(bool(flip_h), bool(flip_v), bool(rotate90))]
+
+def decode_snapshot(source, target_size=None):
+    """
+    Decodes a snapshot and applies its webcam transformations.
+
+    With target_size, a JPEG is decoded at the smallest DCT scale (1/2, 1/4 or 1/8)
+    that is still at least target_size after the transformations, which is several
+    times faster than a full decode followed by a resize. Other formats are decoded
+    at full resolution. The transformations are applied after the decode, as one
+    transpose of the smaller image.
+
+    Args:
+        source (SnapshotSource): The encoded snapshot.
+        target_size (tuple, optional): The (width, height) the image will be resized to.
+
+    Returns:
+        PIL.Image.Image: The decoded image.
+    """
+    img = Image.open(BytesIO(source.data))
+    if target_size is not None:
+        width, height = target_size
+        if source.rotate90:
+            width, height = height, width
+        img.draft("RGB", (width, height))
+    img.load()
+
+    method = transpose_method(source.flip_h, source.flip_v, source.rotate90)
+    if method is not None:
+        img = img.transpose(method)
+    return img
@@ -0,0 +1,117 @@
+import base64
+import collections
+import hashlib
+import threading
+import time
+
+# An encoded preview frame, shared by every client until it expires
+CachedFrame = collections.namedtuple("CachedFrame", ["jpeg", "etag", "sequence", "timestamp"])
+
+def jpeg_etag(jpeg):
+    """
+    Returns a short content hash of the JPEG bytes, the same for identical frames.
+    """
+    return hashlib.blake2b(jpeg, digest_size=8).hexdigest()
+
+class FrameCache:
+    """
+    Holds the latest encoded preview frame for ttl seconds.
+
+    Every browser tab polls the preview. Within the ttl all of them get the
+    same JPEG bytes, and once it has expired the first caller produces the
+    next frame while the others wait for it, so the camera is read and the
+    frame masked and encoded at most once per ttl however many tabs are open.
+
+    Attributes:
+        ttl (float): Seconds a frame is served before a new one is produced.
+        hits (int): Requests served from the cache.
+        misses (int): Requests that produced a new frame.
+    """
+
+    def __init__(self, ttl=1.0):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._condition = threading.Condition()
+        self._frame = None
+        self._sequence = 0
+        self._producing = False
+        self._generation = 0
+        self._data_urls = {}
+
+    def _is_fresh(self, frame):
+        return frame is not None and time.monotonic() - frame.timestamp < self.ttl
+
+    def get(self, produce):
+        """
+        Returns the cached frame, or the one produce returns once it has expired.
+
+        produce runs without the lock held, so invalidate never waits for it.
+
+        Args:
+            produce (callable): Returns the JPEG bytes of a new frame.
+
+        Returns:
+            CachedFrame: The latest frame.
+        """
+        with self._condition:
+            while not self._is_fresh(self._frame) and self._producing:
+                self._condition.wait()
+            if self._is_fresh(self._frame):
+                self.hits += 1
+                return self._frame
+            self.misses += 1
+            self._producing = True
+            generation = self._generation
+
+        frame = None
+        try:
+            jpeg = produce()
+            etag = jpeg_etag(jpeg)
+            with self._condition:
+                previous = self._frame
+                if previous is not None and previous.etag == etag:
+                    # The same picture keeps its sequence, so clients do not reload it
+                    sequence = previous.sequence
+                else:
+                    self._sequence += 1
+                    sequence = self._sequence
+                    self._data_urls.clear()
+                # A frame produced while the cache was invalidated is served to this caller only
+                timestamp = time.monotonic() if generation == self._generation else float("-inf")
+                frame = CachedFrame(jpeg, etag, sequence, timestamp)
+                self._frame = frame
+        finally:
+            with self._condition:
+                self._producing = False
+                self._condition.notify_all()
+        return frame
+
+    def data_url(self, frame):
+        """
+        Returns the frame as a base64 data URL, encoded once per frame.
+        """
+        with self._condition:
+            data_url = self._data_urls.get(frame.etag)
+        if data_url is None:
+            data_url = "data:image/jpeg;base64," + base64.b64encode(frame.jpeg).decode("utf-8")
+            with self._condition:
+                self._data_urls = {frame.etag: data_url}
+        return data_url
+
+    def invalidate(self):
+        """
+        Expires the cached frame, e.g. after the mask changed. Never waits for a frame being produced.
+        """
+        with self._condition:
+            self._generation += 1
+            if self._frame is not None:
+                self._frame = self._frame._replace(timestamp=float("-inf"))
+
+    def status(self):
+        return {
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "sequence": self._sequence,
+        }
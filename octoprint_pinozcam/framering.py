@@ -0,0 +1,228 @@
+import collections
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # Python 3.7
+    shared_memory = None
+
+# Per-slot metadata, stored in front of the pixel data so every process sees it
+SLOT_DTYPE = np.dtype([
+    ("sequence", np.uint64),
+    ("timestamp", np.float64),
+    ("camera_id", np.int32),
+    ("width", np.int32),
+    ("height", np.int32),
+    ("channels", np.int32),
+])
+
+FrameRef = collections.namedtuple("FrameRef", ["slot", "sequence"])
+
+class StaleFrameError(RuntimeError):
+    """
+    Raised when a slot has been overwritten before the frame in it was read.
+    """
+
+class FrameRing:
+    """
+    A fixed ring of preallocated uint8 frame slots in shared memory.
+
+    The writer copies a decoded frame into the next slot and passes the small
+    FrameRef on; readers, in this process or in the inference worker, get a
+    numpy view or a PIL image of the slot without copying. Pixels are stored
+    as RGBX, the layout PIL keeps RGB images in, so an image can be mapped
+    onto a slot. Sequence numbers start at 1 and a
+    slot's sequence is set to 0 while it is written, so a reader can tell a
+    frame that was overwritten from the one it was sent.
+
+    A slot is reused after `slots` further frames. A frame that must not be
+    overwritten while another process reads it is pinned; writes skip pinned
+    slots, so the ring needs more slots than frames pinned at once.
+
+    Attributes:
+        name (str): The shared memory block name, used by other processes to attach.
+        slots (int): The number of frame slots.
+        max_width (int): The widest frame a slot holds.
+        max_height (int): The tallest frame a slot holds.
+    """
+
+    # RGB and an unused fourth byte
+    channels = 4
+    # PIL images are copied in bands of this many rows, so no frame sized buffer is allocated
+    band_rows = 32
+
+    def __init__(self, slots=4, max_width=1920, max_height=1080, name=None):
+        if shared_memory is None:
+            raise RuntimeError("Shared memory frame rings need Python 3.8 or newer")
+        self.slots = slots
+        self.max_width = max_width
+        self.max_height = max_height
+        self._owner = name is None
+
+        slot_bytes = max_width * max_height * self.channels
+        size = SLOT_DTYPE.itemsize * slots + slot_bytes * slots
+        if self._owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._shm = _attach(name)
+        self.name = self._shm.name
+
+        self._meta = np.ndarray((slots,), dtype=SLOT_DTYPE, buffer=self._shm.buf)
+        self._pixels = np.ndarray((slots, slot_bytes), dtype=np.uint8, buffer=self._shm.buf,
+                                  offset=SLOT_DTYPE.itemsize * slots)
+        if self._owner:
+            self._meta[:] = 0
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._pinned = set()
+
+    @classmethod
+    def attach(cls, name, slots, max_width, max_height):
+        """
+        Opens a ring created by another process. The caller must pass the same geometry.
+        """
+        return cls(slots, max_width, max_height, name=name)
+
+    def geometry(self):
+        return {"name": self.name, "slots": self.slots, "max_width": self.max_width, "max_height": self.max_height}
+
+    def fits(self, size):
+        return size[0] <= self.max_width and size[1] <= self.max_height
+
+    def write(self, image, camera_id=0, timestamp=None):
+        """
+        Copies an RGB frame into the next slot that is not pinned.
+
+        A PIL image is copied in bands of band_rows rows: np.asarray of a whole
+        image goes through Image.tobytes and would allocate a frame sized copy.
+
+        Args:
+            image (PIL.Image.Image or np.ndarray): An RGB image, or a (height, width, 3) uint8 array.
+            camera_id (int): The camera the frame comes from.
+            timestamp (float, optional): The capture time, defaults to time.time().
+
+        Returns:
+            FrameRef: The slot and sequence number of the frame.
+        """
+        if isinstance(image, np.ndarray):
+            height, width = image.shape[:2]
+        else:
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            width, height = image.size
+        if not self.fits((width, height)):
+            raise ValueError(f"Frame of {width}x{height} does not fit a {self.max_width}x{self.max_height} slot")
+
+        with self._lock:
+            if len(self._pinned) >= self.slots:
+                raise RuntimeError("Every slot of the frame ring is pinned")
+            self._sequence += 1
+            while self._sequence % self.slots in self._pinned:
+                self._sequence += 1
+            sequence = self._sequence
+            slot = sequence % self.slots
+            # Marked as being written before the lock is released, so pin() cannot take it
+            self._meta[slot]["sequence"] = 0
+
+        meta = self._meta[slot]
+        view = self._pixels[slot, :width * height * self.channels].reshape(height, width, self.channels)
+        if isinstance(image, np.ndarray):
+            np.copyto(view[:, :, :3], image)
+        else:
+            for top in range(0, height, self.band_rows):
+                bottom = min(top + self.band_rows, height)
+                np.copyto(view[top:bottom, :, :3], np.asarray(image.crop((0, top, width, bottom))))
+        meta["timestamp"] = time.time() if timestamp is None else timestamp
+        meta["camera_id"] = camera_id
+        meta["width"] = width
+        meta["height"] = height
+        meta["channels"] = self.channels
+        meta["sequence"] = sequence
+        return FrameRef(slot, sequence)
+
+    def pin(self, ref):
+        """
+        Keeps the frame of ref from being overwritten until unpin.
+
+        Returns:
+            bool: False if the slot no longer holds the frame, which is then not pinned.
+        """
+        with self._lock:
+            if int(self._meta[ref.slot]["sequence"]) != ref.sequence:
+                return False
+            self._pinned.add(ref.slot)
+            return True
+
+    def unpin(self, ref):
+        with self._lock:
+            self._pinned.discard(ref.slot)
+
+    def _slot_view(self, ref):
+        meta = self._meta[ref.slot]
+        if int(meta["sequence"]) != ref.sequence:
+            raise StaleFrameError(f"Frame {ref.sequence} in slot {ref.slot} was overwritten")
+        width, height = int(meta["width"]), int(meta["height"])
+        view = self._pixels[ref.slot, :width * height * self.channels].reshape(height, width, self.channels)
+        return view, meta
+
+    def read(self, ref):
+        """
+        Returns a view of a frame and its metadata, without copying.
+
+        The view stays valid until the slot is written again.
+
+        Returns:
+            tuple: The (height, width, 3) uint8 view and a dict with sequence, timestamp and camera_id.
+
+        Raises:
+            StaleFrameError: If the slot no longer holds the frame of ref.
+        """
+        view, meta = self._slot_view(ref)
+        return view[:, :, :3], {"sequence": ref.sequence, "timestamp": float(meta["timestamp"]),
+                                "camera_id": int(meta["camera_id"])}
+
+    def read_image(self, ref):
+        """
+        Returns a frame as a read-only RGBX PIL image backed by the slot, without copying.
+
+        The image must be released before the ring is closed, and reads the new
+        frame once the slot is written again, so pin the frame while it is used.
+
+        Raises:
+            StaleFrameError: If the slot no longer holds the frame of ref.
+        """
+        view, _ = self._slot_view(ref)
+        height, width = view.shape[:2]
+        return Image.frombuffer("RGBX", (width, height), view, "raw", "RGBX", 0, 1)
+
+    def close(self):
+        """
+        Releases the views and the mapping. The creator also removes the shared memory block.
+        """
+        self._meta = None
+        self._pixels = None
+        self._shm.close()
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+def _attach(name):
+    try:
+        # Python 3.13+: the creator alone is responsible for removing the block
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # Before 3.13 every attach registers the block with the resource tracker of the
+    # process, which starts one and removes the block when the process exits, under its creator
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
@@ -0,0 +1,139 @@
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+GATE_INFER = "infer"
+GATE_UNCHANGED = "unchanged"
+GATE_DARK = "dark"
+GATE_BLURRY = "blurry"
+
+class FrameGate:
+    """
+    Decides, before inference, whether a frame is worth running through the model.
+
+    Every frame is reduced to a small grayscale thumbnail once. From it the gate
+    computes the brightness, the sharpness (variance of the Laplacian), a 64 bit
+    difference hash and the mean absolute difference to the last inferred frame.
+    Brightness and sharpness are measured over the unmasked pixels only, so the
+    black masked regions do not make a frame look dark or blurry.
+
+    - Frames darker than dark_threshold or less sharp than blur_threshold are skipped.
+    - Frames whose hash and thumbnail match the last inferred frame are unchanged:
+      the caller reuses the previous result, unless refresh_interval has passed.
+    - Every other frame is inferred.
+
+    Attributes:
+        change_threshold (float): Mean absolute thumbnail difference (0-255) below which a frame is unchanged.
+        hash_distance (int): Maximum Hamming distance between hashes of an unchanged frame.
+        dark_threshold (float): Mean brightness (0-255) below which a frame is too dark. 0 disables it.
+        blur_threshold (float): Laplacian variance below which a frame is too blurry. 0 disables it.
+        refresh_interval (float): Seconds after which a frame is inferred even if unchanged.
+    """
+
+    thumbnail_size = (128, 96)
+
+    def __init__(self, change_threshold=1.0, hash_distance=0, dark_threshold=8.0, blur_threshold=0.0,
+                 refresh_interval=30.0):
+        self.change_threshold = change_threshold
+        self.hash_distance = hash_distance
+        self.dark_threshold = dark_threshold
+        self.blur_threshold = blur_threshold
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.Lock()
+        self._last_thumbnail = None
+        self._last_hash = None
+        self._last_inferred_time = 0.0
+        self.counters = {"inferred": 0, GATE_UNCHANGED: 0, GATE_DARK: 0, GATE_BLURRY: 0}
+
+    def reset(self):
+        """
+        Forgets the last inferred frame, so the next frame is always inferred.
+        """
+        with self._lock:
+            self._last_thumbnail = None
+            self._last_hash = None
+            self._last_inferred_time = 0.0
+
+    @staticmethod
+    def _difference_hash(thumbnail):
+        small = np.asarray(Image.fromarray(thumbnail).resize((9, 8), Image.BILINEAR), dtype=np.int16)
+        return np.packbits(small[:, 1:] > small[:, :-1])
+
+    @staticmethod
+    def _sharpness(thumbnail, visible=None):
+        gray = thumbnail.astype(np.float32)
+        laplacian = (4 * gray[1:-1, 1:-1] - gray[:-2, 1:-1] - gray[2:, 1:-1]
+                     - gray[1:-1, :-2] - gray[1:-1, 2:])
+        if visible is not None:
+            # Only where the pixel and its four neighbours are all unmasked
+            inner = (visible[1:-1, 1:-1] & visible[:-2, 1:-1] & visible[2:, 1:-1]
+                     & visible[1:-1, :-2] & visible[1:-1, 2:])
+            if inner.any():
+                laplacian = laplacian[inner]
+        return float(laplacian.var())
+
+    def _visible_pixels(self, mask):
+        """
+        Returns the bool array of the thumbnail pixels untouched by the mask, or None to use all of them.
+        """
+        if mask is None:
+            return None
+        # A thumbnail pixel blended with any masked pixel counts as masked
+        coverage = np.asarray(mask.convert("L").resize(self.thumbnail_size, Image.BILINEAR))
+        visible = coverage == 0
+        return visible if visible.any() else None
+
+    def check(self, image, now=None, mask=None):
+        """
+        Classifies a frame.
+
+        Args:
+            image (PIL.Image.Image): The (masked) frame that would be inferred.
+            now (float, optional): The current time, defaults to time.time().
+            mask (PIL.Image.Image, optional): The image of the frame size set where it is masked,
+                like CompiledMask.pixel_mask. Masked pixels are left out of the brightness and sharpness.
+
+        Returns:
+            tuple: The decision (GATE_INFER, GATE_UNCHANGED, GATE_DARK or GATE_BLURRY)
+            and a dict of the frame statistics.
+        """
+        now = time.time() if now is None else now
+        thumbnail = np.asarray(image.convert("L").resize(self.thumbnail_size, Image.BILINEAR), dtype=np.uint8)
+        frame_hash = self._difference_hash(thumbnail)
+        visible = self._visible_pixels(mask)
+        visible_pixels = thumbnail if visible is None else thumbnail[visible]
+        stats = {"brightness": float(visible_pixels.mean()), "sharpness": self._sharpness(thumbnail, visible)}
+
+        with self._lock:
+            if self.dark_threshold > 0 and stats["brightness"] < self.dark_threshold:
+                decision = GATE_DARK
+            elif self.blur_threshold > 0 and stats["sharpness"] < self.blur_threshold:
+                decision = GATE_BLURRY
+            else:
+                decision = GATE_INFER
+                if self._last_thumbnail is not None and now - self._last_inferred_time < self.refresh_interval:
+                    distance = int(np.unpackbits(frame_hash ^ self._last_hash).sum())
+                    difference = float(np.abs(thumbnail.astype(np.int16) - self._last_thumbnail).mean())
+                    stats["hash_distance"] = distance
+                    stats["difference"] = difference
+                    if distance <= self.hash_distance and difference < self.change_threshold:
+                        decision = GATE_UNCHANGED
+
+            if decision == GATE_INFER:
+                self._last_thumbnail = thumbnail.astype(np.int16)
+                self._last_hash = frame_hash
+                self._last_inferred_time = now
+                self.counters["inferred"] += 1
+            else:
+                self.counters[decision] += 1
+
+        return decision, stats
+
+    def get_counters(self):
+        with self._lock:
+            counters = dict(self.counters)
+        counters["skipped"] = counters[GATE_UNCHANGED] + counters[GATE_DARK] + counters[GATE_BLURRY]
+        return counters
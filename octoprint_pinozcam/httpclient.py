@@ -0,0 +1,185 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """
+    Raised instead of sending a request while the circuit breaker of its endpoint is open.
+    """
+
+class CircuitBreaker:
+    """
+    Stops calling an endpoint that keeps failing, and probes it again after a backoff.
+
+    After failure_threshold consecutive failures the breaker opens for base_delay
+    seconds. When the delay has passed one probe request is let through
+    (half open): a success closes the breaker, a failure opens it again for
+    twice as long, up to max_delay.
+
+    Attributes:
+        failure_threshold (int): Consecutive failures that open the breaker.
+        base_delay (float): Seconds the breaker first stays open.
+        max_delay (float): The longest time the breaker stays open.
+    """
+
+    def __init__(self, failure_threshold=3, base_delay=2.0, max_delay=120.0):
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._lock = threading.Lock()
+        self._state = BREAKER_CLOSED
+        self._failures = 0
+        self._trips = 0
+        self._open_until = 0.0
+        self._last_error = None
+
+    def allow(self):
+        """
+        Returns:
+            bool: True if a request may be sent now.
+        """
+        with self._lock:
+            if self._state == BREAKER_CLOSED:
+                return True
+            if self._state == BREAKER_OPEN and time.monotonic() >= self._open_until:
+                self._state = BREAKER_HALF_OPEN
+                return True
+            # Open, or half open with the probe still in flight
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = BREAKER_CLOSED
+            self._failures = 0
+            self._trips = 0
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self._failures += 1
+            self._last_error = str(error) if error is not None else None
+            if self._state == BREAKER_HALF_OPEN or self._failures >= self.failure_threshold:
+                delay = min(self.max_delay, self.base_delay * 2 ** self._trips)
+                self._trips += 1
+                self._state = BREAKER_OPEN
+                self._open_until = time.monotonic() + delay
+
+    def status(self):
+        with self._lock:
+            return {
+                "state": self._state,
+                "failures": self._failures,
+                "retryIn": round(max(0.0, self._open_until - time.monotonic()), 1) if self._state == BREAKER_OPEN else 0.0,
+                "lastError": self._last_error,
+            }
+
+class HttpEndpoint:
+    """
+    A pooled keep-alive requests.Session with deadlines and a circuit breaker, for one remote service.
+
+    Connection errors, timeouts and 5xx or 429 responses count as failures.
+    Other responses are returned to the caller as they are.
+
+    Attributes:
+        name (str): The endpoint name used in logs and metrics.
+        connect_timeout (float): Seconds to establish a connection.
+        read_timeout (float): Seconds to wait for the server between bytes.
+        breaker (CircuitBreaker): The breaker of the endpoint.
+    """
+
+    def __init__(self, name, connect_timeout=3.05, read_timeout=10.0, pool_size=2, breaker=None):
+        self.name = name
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, url, **kwargs):
+        """
+        Sends a request like requests.request, with the endpoint deadlines unless timeout is given.
+
+        Raises:
+            CircuitOpenError: If the breaker is open.
+            requests.exceptions.RequestException: If the request failed.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} is unavailable, retrying in {self.breaker.status()['retryIn']}s")
+        kwargs.setdefault("timeout", (self.connect_timeout, self.read_timeout))
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            self.breaker.record_failure(e)
+            raise
+        except BaseException:
+            # Never leave a half open breaker waiting for a probe that did not finish
+            self.breaker.record_failure()
+            raise
+
+        if response.status_code >= 500 or response.status_code == 429:
+            self.breaker.record_failure(f"HTTP {response.status_code}")
+        else:
+            self.breaker.record_success()
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+class HttpClients:
+    """
+    The HttpEndpoint of every remote service the plugin talks to, created on first use.
+
+    Attributes:
+        timeouts (dict): (connect, read) timeouts by endpoint name, used when the endpoint is created.
+    """
+
+    def __init__(self, timeouts=None):
+        self.timeouts = dict(timeouts or {})
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def endpoint(self, name):
+        with self._lock:
+            endpoint = self._endpoints.get(name)
+            if endpoint is None:
+                connect_timeout, read_timeout = self.timeouts.get(name, (3.05, 10.0))
+                endpoint = HttpEndpoint(name, connect_timeout, read_timeout)
+                self._endpoints[name] = endpoint
+            return endpoint
+
+    def set_timeouts(self, name, connect_timeout, read_timeout):
+        """
+        Changes the deadlines of an endpoint, now and for when it is created.
+        """
+        with self._lock:
+            self.timeouts[name] = (connect_timeout, read_timeout)
+            endpoint = self._endpoints.get(name)
+            if endpoint is not None:
+                endpoint.connect_timeout = connect_timeout
+                endpoint.read_timeout = read_timeout
+
+    def status(self):
+        with self._lock:
+            endpoints = dict(self._endpoints)
+        return {name: endpoint.breaker.status() for name, endpoint in endpoints.items()}
+
+    def close(self):
+        with self._lock:
+            endpoints, self._endpoints = self._endpoints, {}
+        for endpoint in endpoints.values():
+            endpoint.close()
@@ -1,6 +1,11 @@
+import functools
 import numpy as np
+import threading
 import time
 
+from .coverage import failure_area
+from .nms import nms as _nms
+
 def _generate_anchors(stride, ratio_vals, scales_vals):
     """Generate anchor coordinates based on scales and ratios using Numpy.
 
@@ -27,229 +32,425 @@ def _generate_anchors(stride, ratio_vals, scales_vals):
     
     return np.concatenate([xy1, xy2], axis=1)
 
-def _nms(all_scores, all_boxes, all_classes, nms=0.5, ndetections=100):
+class _DetectionDecoder:
     """
-    Apply Non-Maximum Suppression (NMS) to prediction boxes to eliminate redundant overlapping boxes.
+    Decodes the raw FPN heads into scored boxes with precomputed anchor grids.
 
-    Non-Maximum Suppression is a key post-processing step in object detection algorithms to select the most
-    probable bounding box for an object when multiple boxes predict its presence.
+    The anchor centers, anchor sizes and class ids of every flattened head
+    position are computed once per (proc width, proc height, strides), so
+    decoding a frame only touches the candidates that pass the threshold.
 
-    Parameters:
-    - all_scores (np.ndarray): A numpy array of shape (num_predictions,) containing the scores of each prediction.
-    - all_boxes (np.ndarray): A numpy array of shape (num_predictions, 4) containing the coordinates of each prediction box.
-    - all_classes (np.ndarray): A numpy array of shape (num_predictions,) containing the class IDs of each prediction.
-    - nms (float): The Non-Maximum Suppression threshold for overlap. Predictions with IoU (Intersection over Union) over this threshold will be suppressed.
-    - ndetections (int): The maximum number of detections to return after NMS.
+    Attributes:
+        width (int): The width of the processed image.
+        height (int): The height of the processed image.
+        strides (tuple of int): The stride of every FPN level.
+    """
 
-    Returns:
-    - out_scores, out_boxes, out_classes (np.ndarray): The scores, boxes, and classes after applying NMS,
-      each of shape (num_actual_detections,) or (num_actual_detections, 4) for boxes, where num_actual_detections <= ndetections.
+    def __init__(self, width, height, strides, ratio_vals=(1.0, 2.0, 0.5), scales_vals=None):
+        self.width = width
+        self.height = height
+        self.strides = tuple(strides)
+        self.ratio_vals = list(ratio_vals)
+        self.scales_vals = scales_vals if scales_vals is not None else [4 * 2 ** (i / 3) for i in range(3)]
+        self._levels = {}
+
+    def _level(self, stride, shape):
+        """
+        Return the cached flattened grid for one FPN level, building it on first use.
+
+        Args:
+            stride (int): The stride of the feature map.
+            shape (tuple): The (A * C, H', W') shape of the class head.
+
+        Returns:
+            dict: The flattened anchor centers, anchor sizes, class ids and clamp bounds.
+        """
+        level = self._levels.get(stride)
+        if level is not None and level['shape'] == shape:
+            return level
+
+        anchors = _generate_anchors(stride, self.ratio_vals, self.scales_vals)
+        channels, height, width = shape
+        num_anchors = anchors.shape[0]
+        num_classes = channels // num_anchors
+
+        # Same index math as the per-frame decoder used to do, done once for every position
+        k = np.arange(channels * height * width, dtype=np.int64)
+        x = k % width
+        y = (k // width) % height
+        a = (k / num_classes / height / width).astype(np.int64)
+
+        grid = np.stack([x, y, x, y], axis=1) * stride + anchors[a]
+        anchors_wh = grid[:, 2:] - grid[:, :2] + 1
+
+        level = {
+            'shape': shape,
+            'anchors_wh': anchors_wh,
+            'ctr': grid[:, :2] + 0.5 * anchors_wh,
+            'classes': k // (width * height * num_anchors) + 1,
+            'max': np.array([width, height], dtype=np.float64) * stride - 1,
+        }
+        self._levels[stride] = level
+        return level
+
+    def candidates(self, cls_head, top_n=1000):
+        """
+        Select the top_n candidates of one FPN level scoring at least 0.05.
+
+        The scores are sorted ascending and reversed like the former decoder
+        did, so tied scores keep the order they always had.
+
+        Args:
+            cls_head (np.ndarray): The class head with shape (A * C, H', W').
+            top_n (int): The maximum number of candidates to keep. Default is 1000.
+
+        Returns:
+            tuple: the flattened head indices (N,) and their scores (N,), sorted by descending score.
+        """
+        scores = cls_head.reshape(-1)
+        keep = np.flatnonzero(scores >= 0.05)
+        keep = keep[scores[keep].argsort()[::-1][:top_n]]
+        return keep, scores[keep]
+
+    def boxes(self, box_head, stride, shape, keep):
+        """
+        Decode the boxes of the given candidates of one FPN level.
+
+        Args:
+            box_head (np.ndarray): The box head with shape (A * 4, H', W').
+            stride (int): The stride of the feature map.
+            shape (tuple): The (A * C, H', W') shape of the class head.
+            keep (np.ndarray): The flattened class head indices of the candidates.
+
+        Returns:
+            tuple: boxes (N, 4) and classes (N,).
+        """
+        level = self._level(stride, shape)
+
+        deltas = box_head.reshape(-1, 4)[keep]
+        anchors_wh = level['anchors_wh'][keep]
+        pred_ctr = deltas[:, :2] * anchors_wh + level['ctr'][keep]
+        pred_wh = np.exp(deltas[:, 2:]) * anchors_wh
+
+        boxes = np.empty((keep.size, 4), dtype=pred_ctr.dtype)
+        boxes[:, :2] = pred_ctr - 0.5 * pred_wh
+        boxes[:, 2:] = pred_ctr + 0.5 * pred_wh - 1
+        # Clamp to the image boundaries
+        np.minimum(boxes, np.tile(level['max'], 2), out=boxes)
+        np.maximum(boxes, 0, out=boxes)
+
+        return boxes, level['classes'][keep]
+
+    def decode(self, cls_heads, box_heads, strides, threshold=0.05, top_n=1000):
+        """
+        Decode all FPN levels and keep the candidates scoring at least threshold.
+
+        The candidates of all levels are sorted by descending score exactly as
+        the former NMS sorted them, from the same scores, so ties keep their
+        order. Only the boxes of the candidates scoring at least threshold are
+        decoded.
+
+        Args:
+            cls_heads (list of np.ndarray): The class head of every level, with shape (A * C, H', W').
+            box_heads (list of np.ndarray): The box head of every level, with shape (A * 4, H', W').
+            strides (list of int): The stride of every level.
+            threshold (float): The minimum score of a decoded candidate, at least 0.05. Default is 0.05.
+            top_n (int): The maximum number of candidates of every level. Default is 1000.
+
+        Returns:
+            tuple: scores (N,), boxes (N, 4) and classes (N,), sorted by descending score.
+        """
+        levels = []
+        for cls_head, box_head, stride in zip(cls_heads, box_heads, strides):
+            keep, scores = self.candidates(cls_head, top_n)
+            if keep.size > 0:  # Only add non-empty levels
+                levels.append((cls_head.shape, box_head, stride, keep, scores))
+
+        # Handle cases where no detections meet the threshold
+        if not levels:
+            return np.array([]), np.array([]), np.array([])
+
+        all_scores = np.concatenate([level[4] for level in levels], axis=0)
+        order = np.argsort(-all_scores)
+        # The candidates below threshold sort last and are never decoded
+        order = order[:np.count_nonzero(all_scores >= threshold)]
+
+        sizes = [level[3].size for level in levels]
+        level_index = np.repeat(np.arange(len(levels)), sizes)[order]
+        position = order - np.cumsum([0] + sizes[:-1])[level_index]
+
+        boxes = np.empty((order.size, 4), dtype=np.float64)
+        classes = np.empty(order.size, dtype=np.int64)
+        for index, (shape, box_head, stride, keep, _) in enumerate(levels):
+            rows = np.flatnonzero(level_index == index)
+            if rows.size > 0:
+                boxes[rows], classes[rows] = self.boxes(box_head, stride, shape, keep[position[rows]])
+
+        return all_scores[order], boxes, classes
+
+def _get_decoder(_proc_img_width, _proc_img_height, strides):
+    """
+    Return the decoder for the given processed image size and strides, creating it once.
     """
+    return _cached_decoder(_proc_img_width, _proc_img_height, tuple(strides))
 
-    out_scores = np.zeros((ndetections,))
-    out_boxes = np.zeros((ndetections, 4))
-    out_classes = np.zeros((ndetections,))
-
-    # Discard null scores
-    keep = (all_scores > 0)
-    scores = all_scores[keep]
-    boxes = all_boxes[keep]
-    classes = all_classes[keep]
-
-    if scores.size == 0:
-        return out_scores, out_boxes, out_classes
-
-    # Sort boxes
-    indices = np.argsort(-scores)
-    scores = scores[indices]
-    boxes = boxes[indices]
-    classes = classes[indices]
-
-    areas = (boxes[:, 2] - boxes[:, 0] + 1) * (boxes[:, 3] - boxes[:, 1] + 1)
-    keep = np.ones(scores.size, dtype=bool)
-    for i in range(ndetections):
-        if i >= keep.sum() or i >= scores.size:
-            i -= 1
-            break
-
-        # Find overlapping boxes with lower score
-        xy1 = np.maximum(boxes[:, :2], boxes[i, :2])
-        xy2 = np.minimum(boxes[:, 2:], boxes[i, 2:])
-        inter = np.prod(np.maximum(0, xy2 - xy1 + 1), axis=1)
-
-        criterion = ((scores > scores[i]) |
-                     (inter / (areas + areas[i] - inter) <= nms) |
-                     (classes != classes[i]))
-        criterion[i] = True
-
-        # Only keep relevant boxes
-        scores = scores[criterion]
-        boxes = boxes[criterion]
-        classes = classes[criterion]
-        areas = areas[criterion]
-        keep = keep[criterion]
-
-    out_scores[:i + 1] = scores[:i + 1]
-    out_boxes[:i + 1] = boxes[:i + 1]
-    out_classes[:i + 1] = classes[:i + 1]
-
-    return out_scores[:i + 1], out_boxes[:i + 1], out_classes[:i + 1]
-
-def _delta2box(deltas, anchors, size, stride):
+# ROI inference on a dynamic model runs many input sizes, so only the recent ones keep their anchor grids
+@functools.lru_cache(maxsize=8)
+def _cached_decoder(_proc_img_width, _proc_img_height, strides):
+    return _DetectionDecoder(_proc_img_width, _proc_img_height, strides)
+
+def _detection_postprocess(_proc_img_width, cls_heads, box_heads, _proc_img_height=None, score_threshold=0.05,
+                           nms_method="greedy"):
     """
-    Convert deltas from anchors to boxes using Numpy.
+    Post-process detection outputs using Numpy for decoding and processing
+
+    This function decodes class and box predictions into human-readable formats,
+    concatenates results from all heads, and prepares them for further processing
+    or analysis.
 
     Args:
-        deltas (np.ndarray): The deltas between the anchors and the ground truth boxes.
-        anchors (np.ndarray): The anchor boxes.
-        size (list): The size of the feature map.
-        stride (int): The stride of the feature map.
+        _proc_img_width (int): The width of the processed image.
+        cls_heads (list of np.ndarray): List of class head tensors, each with shape (A, H', W').
+        box_heads (list of np.ndarray): List of box head tensors, each with shape (A*4, H', W').
+        _proc_img_height (int, optional): The height of the processed image, used to select the cached decoder.
+        score_threshold (float): Candidates scoring below this are never decoded. Default is 0.05.
+        nms_method (str): The NMS algorithm, one of nms.NMS_METHODS. Default is "greedy".
 
     Returns:
-        np.ndarray: The converted bounding boxes.
+        - scores (np.ndarray): Scores of the detected boxes with shape (N,).
+        - boxes (np.ndarray): Detected bounding boxes with shape (N, 4).
+        - labels (np.ndarray): Class labels for the detected boxes with shape (N,).
     """
-    # Calculate the width and height of the anchors
-    anchors_wh = anchors[:, 2:] - anchors[:, :2] + 1
-    # Calculate the center of the anchors
-    ctr = anchors[:, :2] + 0.5 * anchors_wh
-    # Predict the center of the bounding boxes
-    pred_ctr = deltas[:, :2] * anchors_wh + ctr
-    # Predict the width and height of the bounding boxes
-    pred_wh = np.exp(deltas[:, 2:]) * anchors_wh
-
-    # Define the minimum and maximum values for clamping
-    m = np.zeros([2], dtype=deltas.dtype)
-    M = np.array([size], dtype=deltas.dtype) * stride - 1
-    # Clamping function to ensure the bounding boxes are within the image boundaries
-    def clamp(t): return np.maximum(m, np.minimum(t, M))
-    
-    # Return the converted bounding boxes
-    return np.concatenate([
-        clamp(pred_ctr - 0.5 * pred_wh),
-        clamp(pred_ctr + 0.5 * pred_wh - 1)
-    ], axis=1)
 
-def _decode(all_cls_head, all_box_head, stride=1, threshold=0.05, top_n=1000, anchors=None):
-    """
-    Decode the output of the object detection model and filter the results based on a score threshold.
+    # Calculate the stride of each level based on the image and class head dimensions
+    strides = [_proc_img_width // cls_head.shape[-1] for cls_head in cls_heads]
+    decoder = _get_decoder(_proc_img_width, _proc_img_height, strides)
+    threshold = max(0.05, score_threshold)
 
-    Args:
-        all_cls_head (numpy.ndarray): The class prediction output of the model with shape (num_anchors, height, width).
-        all_box_head (numpy.ndarray): The bounding box prediction output of the model with shape (num_anchors * 4, height, width).
-        stride (int): The stride of the model's output feature map. Default is 1.
-        threshold (float): The score threshold for filtering the results. Default is 0.05.
-        top_n (int): The maximum number of top-scoring predictions to keep. Default is 1000.
-        anchors (numpy.ndarray, optional): The anchor boxes used by the model. Default is None.
+    all_scores, all_boxes, all_classes = decoder.decode(cls_heads, box_heads, strides, threshold, 1000)
+    if all_scores.size == 0:
+        return all_scores, all_boxes, all_classes
 
-    Returns:
-        tuple: A tuple containing three elements:
-            - scores (numpy.ndarray): The scores of the filtered predictions.
-            - boxes (numpy.ndarray): The bounding boxes of the filtered predictions.
-            - classes (numpy.ndarray): The class labels of the filtered predictions.
+    # Apply non-maximum suppression to remove overlapping boxes, keeping the order of the decoder
+    scores, boxes, labels = _nms(all_scores, all_boxes, all_classes, nms=0.5, ndetections=6, method=nms_method,
+                                 presorted=True)
+
+    return scores, boxes, labels
+
+def _normalization_lut():
     """
-    num_boxes = 4
+    Build the per-channel lookup table mapping uint8 pixel values to normalized float32 values.
 
-    _, height, width = all_cls_head.shape
-    num_anchors = anchors.shape[0] if anchors is not None else 1
-    num_classes = all_cls_head.shape[0] // num_anchors
+    The table is computed with the same float32 scaling and float64 mean/std
+    arithmetic the preprocessing always used, so a lookup yields exactly the
+    same values as normalizing the whole image.
 
-    cls_head = all_cls_head.reshape(-1)
-    box_head = all_box_head.reshape(-1, num_boxes)
+    Returns:
+        np.ndarray: A float32 array of shape (3, 256).
+    """
+    values = np.arange(256, dtype=np.float32) / 255.0
 
-    keep = np.where(cls_head >= threshold)[0]
-    if keep.size == 0:
-        return np.array([]), np.array([]), np.array([])
+    mean = np.array([0.485, 0.456, 0.406]).reshape((3, 1))
+    std = np.array([0.229, 0.224, 0.225]).reshape((3, 1))
+    return ((values - mean) / std).astype(np.float32)
 
-    scores = cls_head[keep]
-    indices = scores.argsort()[::-1][:top_n]
-    scores = scores[indices]
-    classes = keep[indices] // (width * height * num_anchors) + 1
+_NORMALIZATION_LUT = _normalization_lut()
 
-    x = (keep[indices] % width).astype(np.int64)
-    y = ((keep[indices] / width) % height).astype(np.int64)
-    a = (keep[indices] / num_classes / height / width).astype(np.int64)
+_input_buffers = threading.local()
 
-    boxes = box_head[keep[indices]]
+def _get_input_buffer(batch_size, height, width):
+    """
+    Return this thread's reusable NCHW float32 input buffer for the given shape.
+    """
+    shape = (batch_size, 3, height, width)
+    buffer = getattr(_input_buffers, 'buffer', None)
+    if buffer is None or buffer.shape != shape:
+        buffer = np.empty(shape, dtype=np.float32)
+        _input_buffers.buffer = buffer
+    return buffer
+
+def _preprocess_into(frame, out):
+    """
+    Normalize a uint8 HWC RGB frame straight into a CHW float32 buffer.
 
-    grid = np.stack([x, y, x, y], axis=1) * stride + anchors[a]
-    boxes = _delta2box(boxes, grid, [width, height], stride)
-    
-    return scores, boxes, classes
+    Args:
+        frame (np.ndarray): The frame with shape (H, W, 3) and dtype uint8.
+        out (np.ndarray): The destination with shape (3, H, W) and dtype float32.
 
-def _detection_postprocess(_proc_img_width, cls_heads, box_heads):
+    Returns:
+        np.ndarray: out.
     """
-    Post-process detection outputs using Numpy for decoding and processing
+    for channel in range(3):
+        np.take(_NORMALIZATION_LUT[channel], frame[:, :, channel], out=out[channel], mode='clip')
+    return out
 
-    This function decodes class and box predictions into human-readable formats,
-    concatenates results from all heads, and prepares them for further processing
-    or analysis.
+def _preprocess_image(image):
+    """
+    Preprocesses the input image for inference.
 
     Args:
-        _proc_img_width (int): The width of the processed image.
-        cls_heads (list of np.ndarray): List of class head tensors, each with shape (A, H', W').
-        box_heads (list of np.ndarray): List of box head tensors, each with shape (A*4, H', W').
+        image (PIL.Image.Image): The input image to preprocess.
 
     Returns:
-        - scores (np.ndarray): Scores of the detected boxes with shape (N,).
-        - boxes (np.ndarray): Detected bounding boxes with shape (N, 4).
-        - labels (np.ndarray): Class labels for the detected boxes with shape (N,).
+        np.ndarray: The preprocessed image as a float32 Numpy array with shape (3, H, W).
+    """
+    frame = np.asarray(image, dtype=np.uint8)
+    out = np.empty((3,) + frame.shape[:2], dtype=np.float32)
+    return _preprocess_into(frame, out)
+
+def _model_batch_size(ort_session):
+    """
+    Return the fixed batch size of the model input, or None if the batch dimension is dynamic.
+    """
+    batch_dim = ort_session.get_inputs()[0].shape[0]
+    return batch_dim if isinstance(batch_dim, int) and batch_dim > 0 else None
+
+def _model_input_is_dynamic(ort_session):
     """
+    Return True if the model accepts input sizes other than the one it was exported with.
+    """
+    height_dim, width_dim = ort_session.get_inputs()[0].shape[2:4]
+    return not (isinstance(height_dim, int) and isinstance(width_dim, int))
 
-    # Dictionary to store anchors based on stride
-    anchors = {}
-    decoded = []
+def _severity(scores, boxes, scores_threshold, img_sensitivity, _proc_img_width, _proc_img_height):
+    """
+    Computes the failure area and severity of boxes given in processed image coordinates.
 
-    for cls_head, box_head in zip(cls_heads, box_heads):
-        # Calculate the stride based on the image and class head dimensions
-        stride = _proc_img_width // cls_head.shape[-1]
+    Returns:
+        tuple: severity and percentage_area.
+    """
+    # Filter boxes based on scores_threshold
+    filtered_boxes = boxes[scores > scores_threshold] if len(boxes) else boxes
 
-        # Generate anchors if they haven't been generated for this stride
-        if stride not in anchors:
-            anchors[stride] = _generate_anchors(stride, ratio_vals=[1.0, 2.0, 0.5], scales_vals=[4 * 2 ** (i / 3) for i in range(3)])
+    # Count the pixels covered by the union of the filtered boxes
+    total_area = failure_area(filtered_boxes, _proc_img_width, _proc_img_height)
 
-        # Decode the class and box heads into human-readable format using Numpy
-        scores, boxes, classes = _decode(cls_head, box_head, stride, 0.05, 1000, anchors[stride])
-        if scores.size > 0:  # Only add non-empty detections
-            decoded.append((scores, boxes, classes))
+    # Calculate the percentage of the total area covered by the boxes
+    percentage_area = total_area / (_proc_img_width * _proc_img_height)
     
-    # Handle cases where no detections meet the threshold
-    if not decoded:
-        return np.array([]), np.array([]), np.array([])
+    # Divide by img_sensitivity
+    severity = max(0, min(percentage_area / img_sensitivity, 1.0))
 
-    # Concatenate the decoded results
-    all_scores, all_boxes, all_classes = zip(*decoded)
-    all_scores = np.concatenate(all_scores, axis=0)
-    all_boxes = np.concatenate(all_boxes, axis=0)
-    all_classes = np.concatenate(all_classes, axis=0)
+    return severity, percentage_area
 
-    # Apply non-maximum suppression to remove overlapping boxes, using the original _nms function or a modified version for Numpy
-    scores, boxes, labels = _nms(all_scores, all_boxes, all_classes, nms=0.5, ndetections=6)
+def _scale_boxes(boxes, image_size, _proc_img_width, _proc_img_height):
+    """
+    Scales boxes from processed image coordinates to the original image size.
 
-    return scores, boxes, labels
+    Returns:
+        list: One [x1, y1, x2, y2] list per box.
+    """
+    img_width, img_height = image_size
 
-def _preprocess_image(image):
+    # Calculate scaling factors
+    height_scale = img_height / _proc_img_height
+    width_scale = img_width / _proc_img_width
+
+    # Scale the boxes to the original size of picture
+    return [[x1 * width_scale, y1 * height_scale, x2 * width_scale, y2 * height_scale] for x1, y1, x2, y2 in boxes]
+
+def _frame_results(cls_heads, box_heads, image_size, scores_threshold, img_sensitivity,
+                   _proc_img_width, _proc_img_height, nms_method, decode_threshold=None):
     """
-    Preprocesses the input image for inference.
+    Turns the model heads of one frame into boxes and a severity.
 
     Args:
-        image (PIL.Image.Image): The input image to preprocess.
+        cls_heads (list of np.ndarray): The class heads of the frame, without the batch dimension.
+        box_heads (list of np.ndarray): The box heads of the frame, without the batch dimension.
+        image_size (tuple): The (width, height) of the original image.
+        decode_threshold (float, optional): The lowest score decoded. Defaults to scores_threshold.
 
     Returns:
-        np.ndarray: The preprocessed image as a Numpy array.
+        tuple: scores, scaled_boxes, labels, severity and percentage_area, as returned by image_inference.
     """
-    
-    img_arr = np.array(image).astype(np.float32) / 255.0
-    
-    img_arr = np.transpose(img_arr, (2, 0, 1))
-    
-    mean = np.array([0.485, 0.456, 0.406]).reshape((3, 1, 1))
-    std = np.array([0.229, 0.224, 0.225]).reshape((3, 1, 1))
-    img_arr = (img_arr - mean) / std
-    return img_arr
+    # Boxes scoring below scores_threshold never count towards severity, so they are not decoded
+    scores, boxes, labels = _detection_postprocess(_proc_img_width, cls_heads, box_heads,
+                                                   _proc_img_height=_proc_img_height,
+                                                   score_threshold=scores_threshold if decode_threshold is None else decode_threshold,
+                                                   nms_method=nms_method)
+
+    severity, percentage_area = _severity(scores, boxes, scores_threshold, img_sensitivity,
+                                          _proc_img_width, _proc_img_height)
+
+    scaled_boxes = _scale_boxes(boxes, image_size, _proc_img_width, _proc_img_height)
+
+    return scores, scaled_boxes, labels, severity, percentage_area
+
+def _add_timing(timings, stage, seconds):
+    timings[stage] = timings.get(stage, 0.0) + seconds * 1000.0
+
+def image_inference_batch(input_images, scores_threshold, img_sensitivity,
+                          ort_session,
+                          _proc_img_width=640, _proc_img_height=384, nms_method="greedy",
+                          decode_threshold=None, timings=None):
+    """
+    Performs inference on several images with as few ONNX runs as the model allows.
+
+    All frames go through a single ort_session.run when the model has a dynamic
+    batch dimension. A model exported with a fixed batch size is run in chunks
+    of that size instead, so a batch size 1 model is run once per frame.
+
+    Inputs:
+    - input_images (list of PIL.Image.Image): The images, possibly from different cameras or a replay.
+    - scores_threshold, img_sensitivity, nms_method: As for image_inference.
+    - decode_threshold (float, optional): The lowest score returned. Defaults to scores_threshold.
+    - timings (dict, optional): Milliseconds spent in "resize", "preprocess", "run" and "postprocess"
+      are added to it.
+
+    Outputs:
+    - list of tuple: One (scores, scaled_boxes, labels, severity, percentage_area, elapsed_time)
+      tuple per image, in input order. elapsed_time is the frame's share of its ONNX run.
+    """
+    input_name = ort_session.get_inputs()[0].name
+    chunk_size = _model_batch_size(ort_session) or max(1, len(input_images))
+
+    results = []
+    for chunk_start in range(0, len(input_images), chunk_size):
+        chunk = input_images[chunk_start:chunk_start + chunk_size]
+
+        # Normalize the uint8 frames straight into the reusable batch buffer.
+        # Unused slots of a fixed-size batch keep stale data and their outputs are ignored.
+        input_batch = _get_input_buffer(chunk_size, _proc_img_height, _proc_img_width)
+        for index, input_image in enumerate(chunk):
+            # Resize the image
+            stage_start = time.perf_counter()
+            resized_image = input_image.resize((_proc_img_width, _proc_img_height))
+            resized_time = time.perf_counter()
+            _preprocess_into(np.asarray(resized_image, dtype=np.uint8), input_batch[index])
+            if timings is not None:
+                _add_timing(timings, "resize", resized_time - stage_start)
+                _add_timing(timings, "preprocess", time.perf_counter() - resized_time)
+
+        # Start the timer
+        start_time = time.time()
+
+        # Run the ONNX model inference
+        ort_outs = ort_session.run(None, {input_name: input_batch})
+
+        # Calculate the elapsed time
+        elapsed_time = (time.time() - start_time) / len(chunk)
+        if timings is not None:
+            _add_timing(timings, "run", elapsed_time * len(chunk))
+
+        stage_start = time.perf_counter()
+        for index, input_image in enumerate(chunk):
+            # Split the output into classification and box regression heads
+            frame_outs = [out[index] for out in ort_outs]
+            cls_heads = frame_outs[:5]
+            box_heads = frame_outs[5:]
+
+            results.append(_frame_results(cls_heads, box_heads, input_image.size, scores_threshold, img_sensitivity,
+                                          _proc_img_width, _proc_img_height, nms_method,
+                                          decode_threshold=decode_threshold) + (elapsed_time,))
+        if timings is not None:
+            _add_timing(timings, "postprocess", time.perf_counter() - stage_start)
+
+    return results
 
 def image_inference(input_image, scores_threshold, img_sensitivity, 
                     ort_session,
-                    _proc_img_width=640, _proc_img_height=384):
+                    _proc_img_width=640, _proc_img_height=384, nms_method="greedy",
+                    roi=None, roi_size=None, timings=None):
     """
     Performs inference on the given image using a pre-trained ONNX model.
 
@@ -257,6 +458,11 @@ def image_inference(input_image, scores_threshold, img_sensitivity,
     - input_image (PIL.Image.Image): The input image on which inference is to be performed.
     - scores_threshold (float): Threshold for filtering boxes based on scores.
     - img_sensitivity (float): Sensitivity value used for calculating severity.   
+    - nms_method (str): The NMS algorithm, one of nms.NMS_METHODS.
+    - roi (tuple, optional): An (x0, y0, x1, y1) crop in image pixels. Only the crop is run
+      through the model; boxes and severity are still reported for the whole image.
+    - roi_size (tuple, optional): The (width, height) the crop is run at. Defaults to the processed size.
+    - timings (dict, optional): Filled with the milliseconds spent in every stage, see image_inference_batch.
 
     Outputs:
     - scores (numpy.ndarray): Confidence scores for each detected box.
@@ -266,75 +472,68 @@ def image_inference(input_image, scores_threshold, img_sensitivity,
     - elapsed_time (float): Time taken for the inference in seconds.
 
     """
+    if roi is None:
+        return image_inference_batch([input_image], scores_threshold, img_sensitivity, ort_session,
+                                     _proc_img_width=_proc_img_width, _proc_img_height=_proc_img_height,
+                                     nms_method=nms_method, timings=timings)[0]
 
-    # model internal parameters
-    #_proc_img_width = 640
-    #_proc_img_height = 384
-
-    # Get the width and height of the image
-    img_width, img_height = input_image.size
-
-    # Resize the image
-    input_image = input_image.resize((_proc_img_width, _proc_img_height))
-    
-    input_array = _preprocess_image(input_image)
-    input_array = input_array.astype(np.float32)
-    # create the batch
-    input_batch = np.expand_dims(input_array, axis=0)
-
-    # Start the timer
-    start_time = time.time()
-
-    # Run the ONNX model inference
-    ort_inputs = {ort_session.get_inputs()[0].name: input_batch}
-    ort_outs = ort_session.run(None, ort_inputs)
-
-    # Stop the timer
-    end_time = time.time()
-    # Calculate the elapsed time
-    elapsed_time = end_time - start_time
-    
-    ort_outs = [out[0] for out in ort_outs]
+    run_width, run_height = roi_size or (_proc_img_width, _proc_img_height)
+    scores, crop_boxes, labels, _, _, elapsed_time = image_inference_batch(
+        [input_image.crop(roi)], scores_threshold, img_sensitivity, ort_session,
+        _proc_img_width=run_width, _proc_img_height=run_height, nms_method=nms_method, timings=timings)[0]
 
-    # Split the output into classification and box regression heads
-    cls_heads = ort_outs[:5]
-    box_heads = ort_outs[5:]
+    # Map the boxes from the crop back to the whole image
+    x0, y0 = roi[0], roi[1]
+    scaled_boxes = [[x1 + x0, y1 + y0, x2 + x0, y2 + y0] for x1, y1, x2, y2 in crop_boxes]
 
-    scores, boxes, labels = _detection_postprocess(_proc_img_width, cls_heads, box_heads)
-
-    # Create a 2D array (bitmap) representing the image
-    bitmap = [[False for _ in range(_proc_img_width)] for _ in range(_proc_img_height)]
-    
-    # Filter boxes based on scores_threshold
-    filtered_boxes = [box for score, box in zip(scores, boxes) if score > scores_threshold]
-    
-    for box in filtered_boxes:
-        x1, y1, x2, y2 = map(int, box)
-        # Clip the coordinates to stay within the image boundaries
-        x1 = max(0, min(x1, _proc_img_width - 1))
-        y1 = max(0, min(y1, _proc_img_height - 1))
-        x2 = max(0, min(x2, _proc_img_width - 1))
-        y2 = max(0, min(y2, _proc_img_height - 1))
-
-        for i in range(y1, y2):
-            for j in range(x1, x2):
-                bitmap[i][j] = True
-
-    # Count the number of ones in the bitmap
-    total_area = sum(row.count(True) for row in bitmap)
-
-    # Calculate the percentage of the total area covered by the boxes
-    percentage_area = total_area / (_proc_img_width * _proc_img_height)
-    
-    # Divide by img_sensitivity
-    severity = max(0, min(percentage_area / img_sensitivity, 1.0))
+    # Severity stays relative to the whole image at the processed size
+    img_width, img_height = input_image.size
+    frame_scale = np.array([_proc_img_width / img_width, _proc_img_height / img_height] * 2)
+    frame_boxes = np.array(scaled_boxes, dtype=np.float64).reshape(-1, 4) * frame_scale
+    severity, percentage_area = _severity(scores, frame_boxes, scores_threshold, img_sensitivity,
+                                          _proc_img_width, _proc_img_height)
 
-    # Calculate scaling factors
-    height_scale = img_height / _proc_img_height
-    width_scale = img_width / _proc_img_width
+    return scores, scaled_boxes, labels, severity, percentage_area, elapsed_time
 
-    # Scale the boxes to the original size of picture
-    scaled_boxes = [[x1 * width_scale, y1 * height_scale, x2 * width_scale, y2 * height_scale] for x1, y1, x2, y2 in boxes]
+def image_inference_cascade(input_image, scores_threshold, img_sensitivity,
+                            ort_session, screen_session, screen_size,
+                            score_gate=0.5, area_gate=0.0,
+                            _proc_img_width=640, _proc_img_height=384, nms_method="greedy", timings=None, **kwargs):
+    """
+    Screens the image at a reduced input size and confirms it at full resolution only when needed.
 
-    return scores, scaled_boxes, labels, severity, percentage_area, elapsed_time
+    Inputs:
+    - screen_session: The session used for screening. It is ort_session itself for a model with
+      a dynamic input size, or a second model exported at screen_size.
+    - screen_size (tuple): The (width, height) the image is screened at.
+    - score_gate (float): Confirm when a screening box scores at least this much.
+    - area_gate (float): Confirm when the screening failure area reaches this fraction of the image.
+      0 disables the area gate.
+    - timings (dict, optional): Filled with the milliseconds spent in every stage. The screening
+      run is recorded as "screen", the confirmation stages as for image_inference_batch.
+    - kwargs: Passed to image_inference for the confirmation run, e.g. roi and roi_size.
+    - Other inputs are as for image_inference.
 
+    Outputs:
+    - result (tuple): As returned by image_inference, from the confirmation run when there was one,
+      otherwise from the screening run. elapsed_time covers both runs.
+    - confirmed (bool): Whether the image was run at full resolution.
+    """
+    screen_width, screen_height = screen_size
+    screen_start = time.perf_counter()
+    screen = image_inference_batch([input_image], scores_threshold, img_sensitivity, screen_session,
+                                   _proc_img_width=screen_width, _proc_img_height=screen_height,
+                                   nms_method=nms_method,
+                                   decode_threshold=min(score_gate, scores_threshold))[0]
+    scores, percentage_area, screen_time = screen[0], screen[4], screen[5]
+    if timings is not None:
+        _add_timing(timings, "screen", time.perf_counter() - screen_start)
+
+    confirmed = (len(scores) > 0 and scores.max() >= score_gate) or (area_gate > 0 and percentage_area >= area_gate)
+    if not confirmed:
+        return screen, False
+
+    result = image_inference(input_image, scores_threshold, img_sensitivity, ort_session,
+                             _proc_img_width=_proc_img_width, _proc_img_height=_proc_img_height,
+                             nms_method=nms_method, timings=timings, **kwargs)
+    return result[:5] + (result[5] + screen_time,), True
@@ -0,0 +1,148 @@
+import bisect
+import threading
+
+# Seconds, from a fast snapshot to a slow frame on a Raspberry Pi
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+    return "{" + pairs + "}"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """
+    A monotonically increasing count. With func, the count is read from it at scrape time,
+    for counts the plugin already keeps elsewhere.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=None, func=None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels or {}
+        self.func = func
+        self._lock = threading.Lock()
+        self._value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def samples(self):
+        value = self.func() if self.func else self._value
+        return [(self.name, self.labels, value)]
+
+class Gauge:
+    """
+    A value that can go up and down. With func, the value is read from it at scrape time,
+    so the gauge costs nothing between scrapes.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labels=None, func=None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels or {}
+        self.func = func
+        self._value = 0
+
+    def set(self, value):
+        self._value = value
+
+    def samples(self):
+        value = self.func() if self.func else self._value
+        return [(self.name, self.labels, value)]
+
+class Histogram:
+    """
+    A distribution of observed values in cumulative buckets, plus their sum and count.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=None, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels or {}
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def samples(self):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            samples.append((f"{self.name}_bucket", dict(self.labels, le=_format_value(float(bound))), cumulative))
+        samples.append((f"{self.name}_sum", self.labels, total))
+        samples.append((f"{self.name}_count", self.labels, cumulative))
+        return samples
+
+class MetricsRegistry:
+    """
+    Holds the plugin metrics and renders them in the Prometheus text exposition format.
+
+    Updating a metric takes one uncontended lock, and gauges backed by a function
+    are only evaluated when the metrics are scraped.
+    """
+
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=None, func=None):
+        return self._register(Counter(name, documentation, labels, func))
+
+    def gauge(self, name, documentation, labels=None, func=None):
+        return self._register(Gauge(name, documentation, labels, func))
+
+    def histogram(self, name, documentation, labels=None, buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def render(self):
+        """
+        Returns:
+            str: Every metric, with one HELP and TYPE line per metric name.
+        """
+        lines = []
+        described = set()
+        for metric in self._metrics:
+            if metric.name not in described:
+                described.add(metric.name)
+                lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                samples = metric.samples()
+            except Exception:
+                # A failing gauge callback must not break the whole scrape
+                continue
+            for name, labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,224 @@
+import logging
+import re
+import threading
+import time
+
+import requests
+import urllib3
+
+SOI = b"\xff\xd8"
+EOI = b"\xff\xd9"
+_HEADER_WINDOW = 512
+_CONTENT_LENGTH = re.compile(rb"content-length:\s*(\d+)", re.IGNORECASE)
+
+class MjpegParser:
+    """
+    Splits an MJPEG multipart stream into JPEG frames, fed in chunks of any size.
+
+    Parts with a Content-Length header, as sent by mjpg-streamer and
+    camera-streamer, are cut by length. Otherwise a frame runs from the JPEG
+    start marker to the next end marker. The buffer never grows beyond
+    max_frame_bytes: a part that large is discarded and the parser resyncs
+    on the next start marker.
+
+    Attributes:
+        max_frame_bytes (int): The largest accepted frame.
+        discarded (int): The number of oversized or broken parts dropped.
+    """
+
+    def __init__(self, max_frame_bytes=8 * 1024 * 1024):
+        self.max_frame_bytes = max_frame_bytes
+        self.discarded = 0
+        self._buffer = bytearray()
+
+    def feed(self, chunk):
+        """
+        Adds a chunk of the stream.
+
+        Returns:
+            list of bytes: The frames completed by the chunk, oldest first.
+        """
+        self._buffer += chunk
+        frames = []
+        while True:
+            frame = self._next_frame()
+            if frame is None:
+                break
+            frames.append(frame)
+
+        if len(self._buffer) > self.max_frame_bytes:
+            self.discarded += 1
+            start = self._buffer.find(SOI, 1)
+            del self._buffer[:start if start > 0 else len(self._buffer)]
+        return frames
+
+    def _next_frame(self):
+        buffer = self._buffer
+        start = buffer.find(SOI)
+        if start < 0:
+            # Keep the tail, it may hold the part headers and the first half of a start marker
+            del buffer[:max(0, len(buffer) - _HEADER_WINDOW)]
+            return None
+
+        # The headers of this part end right before the start marker
+        headers = bytes(buffer[max(0, start - _HEADER_WINDOW):start])
+        match = None
+        if headers.endswith(b"\r\n\r\n"):
+            match = _CONTENT_LENGTH.search(headers[headers.rfind(b"--") + 1:])
+
+        if match:
+            length = int(match.group(1))
+            if length > self.max_frame_bytes:
+                self.discarded += 1
+                del buffer[:start + 2]
+                return self._next_frame()
+            if len(buffer) < start + length:
+                return None
+            frame = bytes(buffer[start:start + length])
+            del buffer[:start + length]
+            return frame
+
+        end = buffer.find(EOI, start + 2)
+        if end < 0:
+            return None
+        frame = bytes(buffer[start:end + 2])
+        del buffer[:end + 2]
+        return frame
+
+class MjpegStream:
+    """
+    Keeps one MJPEG stream open in a background thread and holds its latest frame.
+
+    The stream is reopened after an error or a stall of the endpoint read
+    timeout, after retry_delay seconds, doubled after every failed attempt up
+    to 30 seconds. Only the newest JPEG is kept, so memory stays bounded by
+    the parser buffer and one frame.
+
+    Attributes:
+        url (str): The stream URL, e.g. http://127.0.0.1:8080/?action=stream.
+        endpoint (HttpEndpoint): Opens the stream with its deadlines and circuit breaker.
+        max_age (float): Seconds after which the latest frame is too old to be used.
+        frames (int): The number of frames received.
+        reconnects (int): The number of times the stream was reopened.
+    """
+
+    chunk_size = 64 * 1024
+    # Without read1 every read waits until the chunk is full, so keep it below one frame
+    fill_chunk_size = 4 * 1024
+
+    def __init__(self, url, endpoint, max_age=5.0, retry_delay=1.0, max_frame_bytes=8 * 1024 * 1024, logger=None):
+        self.url = url
+        self.endpoint = endpoint
+        self.max_age = max_age
+        self.retry_delay = retry_delay
+        self.max_frame_bytes = max_frame_bytes
+        self._logger = logger or logging.getLogger(__name__)
+
+        self._condition = threading.Condition()
+        self._jpeg = None
+        self._timestamp = 0.0
+        self._sequence = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._response = None
+        self.frames = 0
+        self.reconnects = 0
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="PiNozCam MJPEG", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        response = self._response
+        if response is not None:
+            # Unblocks a read in progress
+            response.close()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def latest(self):
+        """
+        Returns:
+            tuple: The newest JPEG bytes and their receive time, or None when there is
+            no frame younger than max_age.
+        """
+        with self._condition:
+            if self._jpeg is None or time.time() - self._timestamp > self.max_age:
+                return None
+            return self._jpeg, self._timestamp
+
+    def wait_for_frame(self, after_sequence, timeout):
+        """
+        Waits for a frame newer than after_sequence.
+
+        Returns:
+            tuple: The JPEG bytes, their receive time and sequence number, or None on timeout.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._sequence > after_sequence, timeout):
+                return None
+            return self._jpeg, self._timestamp, self._sequence
+
+    def _run(self):
+        failed_attempts = 0
+        while not self._stop_event.is_set():
+            frames_before = self.frames
+            try:
+                self._read_stream()
+            except requests.exceptions.RequestException as e:
+                if not self._stop_event.is_set():
+                    self._logger.error(f"MJPEG stream {self.url} failed: {e}")
+            except Exception as e:
+                self._logger.error(f"MJPEG stream {self.url} stopped unexpectedly: {e}")
+            finally:
+                self._response = None
+            # A stream that delivered frames before it dropped starts the backoff over
+            failed_attempts = 1 if self.frames > frames_before else failed_attempts + 1
+
+            if self._stop_event.is_set():
+                break
+            self.reconnects += 1
+            self._stop_event.wait(min(30.0, self.retry_delay * 2 ** max(0, failed_attempts - 1)))
+
+    def _read_stream(self):
+        parser = MjpegParser(self.max_frame_bytes)
+        with self.endpoint.get(self.url, stream=True) as response:
+            self._response = response
+            response.raise_for_status()
+            self._logger.info(f"MJPEG stream {self.url} opened.")
+            for chunk in self._iter_chunks(response):
+                if self._stop_event.is_set():
+                    return
+                frames = parser.feed(chunk)
+                if frames:
+                    with self._condition:
+                        self._jpeg = frames[-1]
+                        self._timestamp = time.time()
+                        self._sequence += 1
+                        self.frames += len(frames)
+                        self._condition.notify_all()
+        raise requests.exceptions.ConnectionError("Stream ended")
+
+    def _iter_chunks(self, response):
+        """
+        Yields the stream as the data arrives, instead of waiting for chunk_size bytes.
+        """
+        read1 = getattr(response.raw, "read1", None)
+        if read1 is None:
+            # urllib3 before 2.0
+            yield from response.iter_content(self.fill_chunk_size)
+            return
+        while True:
+            try:
+                chunk = read1(self.chunk_size)
+            except urllib3.exceptions.HTTPError as e:
+                raise requests.exceptions.ConnectionError(e)
+            if not chunk:
+                return
+            yield chunk
@@ -0,0 +1,157 @@
+import numpy as np
+
+NMS_METHODS = ("greedy", "fast", "agnostic")
+
+def _sort_candidates(all_scores, all_boxes, all_classes):
+    """
+    Discard null scores and sort the candidates by descending score.
+
+    Returns:
+        tuple: scores, boxes and classes sorted by descending score.
+    """
+    keep = np.flatnonzero(all_scores > 0)
+    if keep.size == 0:
+        return all_scores[keep], all_boxes[keep], all_classes[keep]
+
+    order = keep[np.argsort(-all_scores[keep])]
+    return all_scores[order], all_boxes[order], all_classes[order]
+
+def _class_offset_boxes(boxes, classes):
+    """
+    Shift the boxes of every class to a disjoint region of the plane.
+
+    Boxes of different classes can then never overlap, so one class-agnostic
+    IoU computation performs class-aware suppression for all classes at once.
+
+    Args:
+        boxes (np.ndarray): Boxes with shape (N, 4).
+        classes (np.ndarray): Class ids with shape (N,).
+
+    Returns:
+        np.ndarray: The shifted boxes with shape (N, 4).
+    """
+    if boxes.shape[0] == 0:
+        return boxes
+    # The +1 pixel convention of the IoU needs one extra pixel of separation
+    span = boxes.max() - min(boxes.min(), 0) + 2
+    _, class_index = np.unique(classes, return_inverse=True)
+    return boxes + (class_index.reshape(-1) * span)[:, None]
+
+def _box_areas(boxes):
+    return (boxes[:, 2] - boxes[:, 0] + 1) * (boxes[:, 3] - boxes[:, 1] + 1)
+
+def _pairwise_iou(boxes, areas, other_boxes, other_areas):
+    """
+    Compute the IoU of every box against every other box, using the inclusive pixel convention.
+
+    Returns:
+        np.ndarray: The IoU matrix with shape (N, M).
+    """
+    xy1 = np.maximum(boxes[:, None, :2], other_boxes[None, :, :2])
+    xy2 = np.minimum(boxes[:, None, 2:], other_boxes[None, :, 2:])
+    wh = np.maximum(0, xy2 - xy1 + 1)
+    inter = wh[..., 0] * wh[..., 1]
+    return inter / (areas[:, None] + other_areas[None, :] - inter)
+
+def _iou_matrix(boxes, areas):
+    """
+    Compute the pairwise IoU matrix of the boxes in one batch.
+
+    Returns:
+        np.ndarray: The IoU matrix with shape (N, N).
+    """
+    return _pairwise_iou(boxes, areas, boxes, areas)
+
+def _greedy_keep(scores, boxes, nms, ndetections, block_size=256):
+    """
+    Greedy suppression over score-sorted boxes.
+
+    A box is suppressed by every kept box before it whose IoU with it exceeds
+    nms. The overlaps are decided from batched IoU matrices: the candidates
+    are taken in blocks of block_size, which bounds the size of the matrices.
+    Each block is first checked against the boxes kept so far, then against
+    itself, and the walk over its rows only combines boolean masks. The walk
+    stops after ndetections boxes.
+
+    Returns:
+        np.ndarray: The indices of the kept boxes, in score order.
+    """
+    areas = _box_areas(boxes)
+    kept = []
+    for start in range(0, scores.size, block_size):
+        stop = min(start + block_size, scores.size)
+        block_boxes, block_areas = boxes[start:stop], areas[start:stop]
+        alive = np.ones(stop - start, dtype=bool)
+        if kept:
+            kept_index = np.array(kept, dtype=np.int64)
+            alive &= ~(_pairwise_iou(boxes[kept_index], areas[kept_index], block_boxes, block_areas) > nms).any(axis=0)
+        # Scores are sorted, so a box only suppresses the boxes after it, ties included
+        overlaps = np.triu(_iou_matrix(block_boxes, block_areas) > nms, k=1)
+        for offset in np.flatnonzero(alive):
+            if not alive[offset]:
+                continue
+            kept.append(start + offset)
+            if len(kept) == ndetections:
+                return np.array(kept, dtype=np.int64)
+            alive &= ~overlaps[offset]
+    return np.array(kept, dtype=np.int64)
+
+def _fast_keep(scores, boxes, nms, ndetections, top_k=200):
+    """
+    Fast NMS: suppress every box that overlaps any higher scored box.
+
+    Unlike greedy NMS, a box that is itself suppressed still suppresses the
+    boxes below it, which removes the sequential dependency and lets the
+    whole decision be made from one IoU matrix. Only the top_k candidates are
+    considered to bound the size of the matrix.
+
+    Returns:
+        np.ndarray: The indices of the kept boxes, in score order.
+    """
+    boxes = boxes[:top_k]
+    iou = _iou_matrix(boxes, _box_areas(boxes))
+    # Only boxes earlier in the sorted order may suppress a box
+    iou = np.triu(iou, k=1)
+    return np.flatnonzero(iou.max(axis=0) <= nms)[:ndetections]
+
+def nms(all_scores, all_boxes, all_classes, nms=0.5, ndetections=100, method="greedy", presorted=False):
+    """
+    Apply Non-Maximum Suppression (NMS) to prediction boxes to eliminate redundant overlapping boxes.
+
+    Parameters:
+    - all_scores (np.ndarray): A numpy array of shape (num_predictions,) containing the scores of each prediction.
+    - all_boxes (np.ndarray): A numpy array of shape (num_predictions, 4) containing the coordinates of each prediction box.
+    - all_classes (np.ndarray): A numpy array of shape (num_predictions,) containing the class IDs of each prediction.
+    - nms (float): The IoU threshold above which a lower scored box is suppressed.
+    - ndetections (int): The maximum number of detections to return after NMS.
+    - method (str): One of NMS_METHODS:
+        - "greedy": exact class-aware greedy NMS (the default).
+        - "fast": class-aware Fast NMS, decided from one batched IoU matrix.
+        - "agnostic": greedy NMS where boxes of any class suppress each other.
+    - presorted (bool): The candidates are already sorted by descending score and have no null scores,
+      so their order, ties included, is kept as given.
+
+    Returns:
+    - out_scores, out_boxes, out_classes (np.ndarray): The float64 scores, boxes, and classes after applying NMS,
+      sorted by descending score, with at most ndetections entries.
+    """
+    if method not in NMS_METHODS:
+        raise ValueError(f"Unknown NMS method: {method}")
+
+    if presorted:
+        scores, boxes, classes = all_scores, np.asarray(all_boxes).reshape(-1, 4), all_classes
+    else:
+        scores, boxes, classes = _sort_candidates(all_scores, np.asarray(all_boxes).reshape(-1, 4), all_classes)
+    if scores.size == 0 or ndetections <= 0:
+        keep = np.zeros(0, dtype=np.int64)
+    elif method == "agnostic":
+        keep = _greedy_keep(scores, boxes, nms, ndetections)
+    else:
+        offset_boxes = _class_offset_boxes(boxes.astype(np.float64), classes)
+        if method == "fast":
+            keep = _fast_keep(scores, offset_boxes, nms, ndetections)
+        else:
+            keep = _greedy_keep(scores, offset_boxes, nms, ndetections)
+
+    # The former NMS filled float64 arrays, whatever the dtype of the candidates
+    return scores[keep].astype(np.float64), boxes[keep].astype(np.float64), classes[keep].astype(np.float64)
@@ -0,0 +1,161 @@
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+
+class FrameTimer:
+    """
+    Collects the wall time of the stages of one AI frame.
+
+    Stages are timed with the stage() context manager or added with add().
+    A stage timed more than once in a frame accumulates.
+
+    Attributes:
+        start_time (float): The perf_counter value at which the frame started.
+        stages (dict): The milliseconds spent in every stage, in the order the stages ran.
+    """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.stages = {}
+
+    def add(self, name, milliseconds):
+        self.stages[name] = self.stages.get(name, 0.0) + milliseconds
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start_time) * 1000.0)
+
+    def record(self):
+        """
+        Returns:
+            dict: The stage times in milliseconds, rounded to 0.01 ms, and the frame "total".
+        """
+        record = {name: round(milliseconds, 2) for name, milliseconds in self.stages.items()}
+        record["total"] = round((time.perf_counter() - self.start_time) * 1000.0, 2)
+        return record
+
+class FrameProfiler:
+    """
+    Runs cProfile in the AI thread for the next N frames and writes the stats to a file.
+
+    start() may be called from any thread. The AI thread calls tick() once at the
+    start of every frame: the first tick after start() enables the profiler, the
+    tick after the N-th profiled frame disables it and writes two files to output_dir:
+    a .prof file for pstats or snakeviz and a .txt summary sorted by cumulative time.
+
+    Attributes:
+        output_dir (str): The directory the profiles are written to.
+        keep (int): The number of profiles kept in output_dir, older ones are removed.
+    """
+
+    def __init__(self, output_dir=None, keep=5, logger=None):
+        self.output_dir = output_dir
+        self.keep = keep
+        self._logger = logger
+
+        self._lock = threading.Lock()
+        self._requested_frames = 0
+        self._profile = None
+        self._frames_left = 0
+        self._frames = 0
+        self.last_profile = None
+
+    def start(self, frames):
+        """
+        Requests a profile of the next frames. Ignored while a profile is running.
+
+        Returns:
+            bool: True if the request was accepted.
+        """
+        if frames < 1:
+            raise ValueError("The number of profiled frames must be at least 1")
+        with self._lock:
+            if self._requested_frames or self._profile is not None:
+                return False
+            self._requested_frames = frames
+            return True
+
+    def status(self):
+        with self._lock:
+            return {
+                "running": self._profile is not None,
+                "pending": bool(self._requested_frames),
+                "framesLeft": self._frames_left,
+                "lastProfile": os.path.basename(self.last_profile) if self.last_profile else None,
+            }
+
+    def tick(self):
+        """
+        Called by the AI thread at the start of every frame.
+        """
+        with self._lock:
+            if self._profile is not None:
+                self._frames_left -= 1
+                if self._frames_left > 0:
+                    return
+                profile, frames = self._profile, self._frames
+                self._profile = None
+            elif self._requested_frames:
+                self._frames = self._frames_left = self._requested_frames
+                self._requested_frames = 0
+                self._profile = cProfile.Profile()
+                self._profile.enable()
+                return
+            else:
+                return
+
+        profile.disable()
+        self._write(profile, frames)
+
+    def stop(self):
+        """
+        Called by the AI thread when it stops: writes the frames profiled so far.
+        """
+        with self._lock:
+            profile, frames = self._profile, self._frames - self._frames_left
+            self._profile = None
+            self._requested_frames = 0
+            self._frames_left = 0
+        if profile is not None:
+            profile.disable()
+            if frames > 0:
+                self._write(profile, frames)
+
+    def _write(self, profile, frames):
+        if not self.output_dir:
+            return
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            base_path = os.path.join(self.output_dir, f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{frames}frames")
+            profile.dump_stats(f"{base_path}.prof")
+
+            summary = io.StringIO()
+            stats = pstats.Stats(profile, stream=summary)
+            stats.sort_stats("cumulative").print_stats(60)
+            with open(f"{base_path}.txt", 'w') as summary_file:
+                summary_file.write(summary.getvalue())
+
+            with self._lock:
+                self.last_profile = f"{base_path}.prof"
+            self._prune()
+            if self._logger:
+                self._logger.info(f"Wrote profile of {frames} frames to {base_path}.prof")
+        except Exception as e:
+            if self._logger:
+                self._logger.error(f"Failed to write profile: {e}")
+
+    def _prune(self):
+        profiles = sorted(name for name in os.listdir(self.output_dir) if name.startswith("profile-") and name.endswith(".prof"))
+        for name in profiles[:-self.keep]:
+            for extension in (".prof", ".txt"):
+                path = os.path.join(self.output_dir, name[:-len(".prof")] + extension)
+                if os.path.exists(path):
+                    os.remove(path)
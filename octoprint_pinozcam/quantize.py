@@ -0,0 +1,183 @@
+"""
+Tools for the INT8 variants of the PiNozCam model.
+
+Produce a quantized model from the float model, calibrating on recorded frames:
+
+    python -m octoprint_pinozcam.quantize quantize --mode static --frames FRAMES_DIR \
+        --output ~/.octoprint/data/pinozcam/nozcam_int8_static.onnx
+
+Compare it with the float model on the same frames:
+
+    python -m octoprint_pinozcam.quantize compare --int8 nozcam_int8_static.onnx --frames FRAMES_DIR
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import onnxruntime
+from PIL import Image
+
+from .inference import _preprocess_image, image_inference
+
+FRAME_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+def _default_float_model():
+    return os.path.join(os.path.dirname(__file__), 'static', 'nozcam.bin')
+
+def _list_frames(frames_dir, limit=None):
+    names = sorted(name for name in os.listdir(frames_dir) if name.lower().endswith(FRAME_EXTENSIONS))
+    if limit:
+        names = names[:limit]
+    if not names:
+        raise ValueError(f"No frames found in {frames_dir}")
+    return [os.path.join(frames_dir, name) for name in names]
+
+def _load_frame(path):
+    with Image.open(path) as img:
+        return img.convert("RGB")
+
+def _iou(box, boxes):
+    """
+    Compute the IoU of one box against an array of boxes, using the inclusive pixel convention of nms.
+    """
+    xy1 = np.maximum(boxes[:, :2], box[:2])
+    xy2 = np.minimum(boxes[:, 2:], box[2:])
+    inter = np.prod(np.maximum(0, xy2 - xy1 + 1), axis=1)
+    areas = np.prod(boxes[:, 2:] - boxes[:, :2] + 1, axis=1)
+    area = np.prod(box[2:] - box[:2] + 1)
+    return inter / (area + areas - inter)
+
+def quantize_model(float_model, output, mode="dynamic", frames_dir=None, max_frames=100, width=640, height=384):
+    """
+    Writes an INT8 variant of the float model.
+
+    Args:
+        float_model (str): Path of the float model.
+        output (str): Path of the quantized model to write.
+        mode (str): "dynamic" (weights only, no calibration) or "static" (weights and activations).
+        frames_dir (str): Directory of recorded frames, required for static calibration.
+        max_frames (int): The maximum number of frames used for calibration.
+    """
+    # onnxruntime.quantization needs the onnx package, which the plugin itself does not require
+    from onnxruntime.quantization import CalibrationDataReader, QuantType, quantize_dynamic, quantize_static
+
+    class FrameCalibrationReader(CalibrationDataReader):
+        """
+        Feeds recorded frames, preprocessed like the plugin does, to the calibrator.
+        """
+
+        def __init__(self, input_name, frame_paths):
+            self.input_name = input_name
+            self.frame_paths = frame_paths
+            self._index = 0
+
+        def get_next(self):
+            if self._index >= len(self.frame_paths):
+                return None
+            frame = _load_frame(self.frame_paths[self._index]).resize((width, height))
+            self._index += 1
+            return {self.input_name: _preprocess_image(frame)[np.newaxis]}
+
+        def rewind(self):
+            self._index = 0
+
+    if mode == "dynamic":
+        quantize_dynamic(float_model, output, weight_type=QuantType.QUInt8)
+        return
+
+    if mode != "static":
+        raise ValueError(f"Unknown quantization mode: {mode}")
+    if not frames_dir:
+        raise ValueError("Static quantization needs recorded frames for calibration (--frames)")
+
+    input_name = onnxruntime.InferenceSession(float_model, providers=['CPUExecutionProvider']).get_inputs()[0].name
+    reader = FrameCalibrationReader(input_name, _list_frames(frames_dir, max_frames))
+    quantize_static(float_model, output, reader,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+
+def compare_models(float_model, int8_model, frames_dir, scores_threshold=0.75, img_sensitivity=0.04,
+                   num_threads=1, max_frames=None):
+    """
+    Runs the float and INT8 models over the same frames and reports latency and agreement.
+
+    Returns:
+        dict: Per-frame records and a summary with mean latencies, mean box overlap
+        (best IoU of every float box above the threshold with the INT8 boxes) and
+        severity differences.
+    """
+    def create_session(path):
+        sess_opt = onnxruntime.SessionOptions()
+        sess_opt.intra_op_num_threads = num_threads
+        return onnxruntime.InferenceSession(path, sess_opt, providers=['CPUExecutionProvider'])
+
+    sessions = {"float": create_session(float_model), "int8": create_session(int8_model)}
+
+    frames = []
+    for path in _list_frames(frames_dir, max_frames):
+        frame = _load_frame(path)
+        record = {"frame": os.path.basename(path)}
+        results = {}
+        for name, session in sessions.items():
+            scores, boxes, labels, severity, percentage_area, elapsed_time = image_inference(
+                frame, scores_threshold, img_sensitivity, session)
+            boxes = np.array(boxes, dtype=np.float64).reshape(-1, 4)[np.asarray(scores) >= scores_threshold]
+            results[name] = boxes
+            record[f"{name}_latency_ms"] = elapsed_time * 1000.0
+            record[f"{name}_severity"] = float(severity)
+            record[f"{name}_boxes"] = len(boxes)
+
+        float_boxes, int8_boxes = results["float"], results["int8"]
+        if len(float_boxes) and len(int8_boxes):
+            record["overlap"] = float(np.mean([_iou(box, int8_boxes).max() for box in float_boxes]))
+        else:
+            record["overlap"] = 1.0 if len(float_boxes) == len(int8_boxes) else 0.0
+        record["severity_diff"] = record["int8_severity"] - record["float_severity"]
+        frames.append(record)
+
+    severity_diff = np.array([record["severity_diff"] for record in frames])
+    summary = {
+        "frames": len(frames),
+        "float_latency_ms": float(np.mean([record["float_latency_ms"] for record in frames])),
+        "int8_latency_ms": float(np.mean([record["int8_latency_ms"] for record in frames])),
+        "mean_overlap": float(np.mean([record["overlap"] for record in frames])),
+        "mean_abs_severity_diff": float(np.mean(np.abs(severity_diff))),
+        "max_abs_severity_diff": float(np.max(np.abs(severity_diff))),
+        # Frames on the other side of the 0.66 failure line
+        "failure_disagreements": int(sum((record["float_severity"] > 0.66) != (record["int8_severity"] > 0.66) for record in frames)),
+    }
+    summary["speedup"] = summary["float_latency_ms"] / max(summary["int8_latency_ms"], 1e-9)
+    return {"summary": summary, "frames": frames}
+
+def main():
+    parser = argparse.ArgumentParser(description="PiNozCam INT8 model tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    quantize_parser = subparsers.add_parser("quantize", help="produce an INT8 model from the float model")
+    quantize_parser.add_argument("--float-model", default=_default_float_model(), help="path of the float model")
+    quantize_parser.add_argument("--output", required=True, help="path of the INT8 model to write")
+    quantize_parser.add_argument("--mode", choices=("dynamic", "static"), default="dynamic", help="quantization mode")
+    quantize_parser.add_argument("--frames", help="directory of recorded frames used for static calibration")
+    quantize_parser.add_argument("--max-frames", type=int, default=100, help="maximum number of calibration frames")
+
+    compare_parser = subparsers.add_parser("compare", help="compare the float and INT8 models on recorded frames")
+    compare_parser.add_argument("--float-model", default=_default_float_model(), help="path of the float model")
+    compare_parser.add_argument("--int8", required=True, help="path of the INT8 model")
+    compare_parser.add_argument("--frames", required=True, help="directory of recorded frames")
+    compare_parser.add_argument("--max-frames", type=int, default=None, help="maximum number of frames")
+    compare_parser.add_argument("--threads", type=int, default=1, help="intra-op threads per session")
+    compare_parser.add_argument("--scores-threshold", type=float, default=0.75)
+    compare_parser.add_argument("--img-sensitivity", type=float, default=0.04)
+
+    args = parser.parse_args()
+    if args.command == "quantize":
+        quantize_model(args.float_model, args.output, mode=args.mode, frames_dir=args.frames, max_frames=args.max_frames)
+        print(f"Wrote {args.output}")
+    else:
+        report = compare_models(args.float_model, args.int8, args.frames,
+                                scores_threshold=args.scores_threshold, img_sensitivity=args.img_sensitivity,
+                                num_threads=args.threads, max_frames=args.max_frames)
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import functools
+import math
+
+import numpy as np
+
+from .mask import decode_mask
+
+@functools.lru_cache(maxsize=8)
+def unmasked_region(mask_image_data, image_size):
+    """
+    Find the bounding region of the unmasked cells of the mask.
+
+    The cells are laid out like apply_mask_to_image draws them: ceil(size / grid_size)
+    pixels per cell, starting at the top left corner.
+
+    Args:
+        mask_image_data (str): The mask, in any encoding accepted by decode_mask.
+        image_size (tuple): The (width, height) of the image.
+
+    Returns:
+        tuple: The (x0, y0, x1, y1) region in image pixels, or None if every cell is masked.
+    """
+    width, height = image_size
+    grid = decode_mask(mask_image_data)
+    grid_size = grid.shape[0]
+    open_rows = np.flatnonzero(~grid.all(axis=1))
+    if not open_rows.size:
+        return None
+    open_cols = np.flatnonzero(~grid.all(axis=0))
+
+    block_width = math.ceil(width / grid_size)
+    block_height = math.ceil(height / grid_size)
+    x0 = min(int(open_cols[0]) * block_width, width)
+    y0 = min(int(open_rows[0]) * block_height, height)
+    x1 = min((int(open_cols[-1]) + 1) * block_width, width)
+    y1 = min((int(open_rows[-1]) + 1) * block_height, height)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1, y1
+
+def _place_window(start, end, size, limit):
+    """
+    Center a window of the given size on [start, end) and shift it inside [0, limit].
+    """
+    size = min(size, limit)
+    begin = (start + end - size) / 2
+    begin = max(0, min(begin, limit - size))
+    return begin, begin + size
+
+def fit_roi(region, image_size, proc_size, dynamic_input, align=128):
+    """
+    Turn an unmasked region into the crop and input size used for ROI inference.
+
+    The region is taken in processed image coordinates, so the crop keeps the
+    pixel scale of the full frame pipeline, and is run at its own size, rounded
+    up to a multiple of align (the largest model stride) and capped at proc_size.
+
+    A model with a fixed input size would have to run the crop resized to
+    proc_size, the same number of pixels as the whole frame, so there is no
+    crop for it.
+
+    Args:
+        region (tuple): The (x0, y0, x1, y1) unmasked region in image pixels.
+        image_size (tuple): The (width, height) of the image.
+        proc_size (tuple): The (width, height) the full frame is processed at.
+        dynamic_input (bool): Whether the model accepts other input sizes.
+        align (int): The input size granularity. Default is 128.
+
+    Returns:
+        tuple: The crop box in image pixels and the (width, height) to run it at,
+        or (None, None) when the crop would be the whole frame or the input is fixed.
+    """
+    if region is None or not dynamic_input:
+        return None, None
+
+    width, height = image_size
+    proc_width, proc_height = proc_size
+    scale_x = proc_width / width
+    scale_y = proc_height / height
+    x0, y0, x1, y1 = region[0] * scale_x, region[1] * scale_y, region[2] * scale_x, region[3] * scale_y
+
+    run_width = min(proc_width, math.ceil((x1 - x0) / align) * align)
+    run_height = min(proc_height, math.ceil((y1 - y0) / align) * align)
+    if run_width >= proc_width and run_height >= proc_height:
+        return None, None
+
+    left, right = _place_window(x0, x1, run_width, proc_width)
+    top, bottom = _place_window(y0, y1, run_height, proc_height)
+    crop = (round(left / scale_x), round(top / scale_y), round(right / scale_x), round(bottom / scale_y))
+    return crop, (run_width, run_height)
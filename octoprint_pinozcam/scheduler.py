@@ -0,0 +1,180 @@
+import time
+
+DEFAULT_THERMAL_STEPS = ((70.0, 2.0), (75.0, 4.0), (80.0, 8.0))
+
+def parse_thermal_steps(value):
+    """
+    Turn the thermalSteps setting into sorted (temperature, slowdown) pairs.
+
+    Args:
+        value (list): [temperature, slowdown] pairs, e.g. [[70, 2], [75, 4]].
+
+    Returns:
+        tuple: The (temperature, slowdown) pairs sorted by temperature.
+
+    Raises:
+        ValueError: If a pair is malformed or a slowdown is below 1.
+    """
+    steps = []
+    for step in value or ():
+        temperature, slowdown = (float(item) for item in step)
+        if slowdown < 1.0:
+            raise ValueError(f"Thermal slowdown {slowdown} at {temperature}°C is below 1")
+        steps.append((temperature, slowdown))
+    return tuple(sorted(steps))
+
+class FrameScheduler:
+    """
+    Paces the AI loop to a target rate, a duty cycle cap and the CPU temperature.
+
+    Each camera is started at most every 60 / frames_per_minute seconds
+    (0 means no target rate), or at its own rate set with set_rate. The loop
+    as a whole waits after every frame until the busy time of that frame is
+    at most max_duty_cycle of the time, so the AI keeps the CPU busy at most
+    that fraction of the time however many cameras there are.
+
+    Both waits are multiplied by the slowdown of the highest thermal step the
+    temperature has reached. A step is left again once the temperature is
+    hysteresis degrees below it. After a suspicious frame the next
+    burst_frames frames of that camera use burst_frames_per_minute instead of
+    its target rate; the duty cycle cap and the thermal slowdown still apply.
+
+    Attributes:
+        frames_per_minute (float): The target rate of a camera, 0 for none.
+        max_duty_cycle (float): The busiest fraction of the time, in (0, 1].
+        thermal_steps (tuple): (temperature, slowdown) pairs sorted by temperature.
+        burst_frames (int): Frames sampled at the burst rate after a suspicious frame.
+        burst_frames_per_minute (float): The burst rate, 0 for the duty cycle cap alone.
+        temperature (callable): Returns the CPU temperature in °C, 0 when unknown.
+        temperature_interval (float): Seconds between two temperature readings.
+    """
+
+    hysteresis = 2.0
+
+    def __init__(self, frames_per_minute=0.0, max_duty_cycle=1.0, thermal_steps=DEFAULT_THERMAL_STEPS,
+                 burst_frames=0, burst_frames_per_minute=0.0, temperature=None, temperature_interval=5.0):
+        self.frames_per_minute = frames_per_minute
+        self.max_duty_cycle = max_duty_cycle
+        self.thermal_steps = tuple(thermal_steps)
+        self.burst_frames = burst_frames
+        self.burst_frames_per_minute = burst_frames_per_minute
+        self.temperature = temperature
+        self.temperature_interval = temperature_interval
+
+        self.slowdown = 1.0
+        self.last_temperature = 0.0
+        self.duty_cycle = 0.0
+        self._rates = {}
+        self._bursts = {}
+        self._camera_starts = {}
+        self._frame_start = None
+        self._next_reading = 0.0
+
+    def reset(self):
+        self._frame_start = None
+        self._camera_starts.clear()
+        self._bursts.clear()
+
+    def set_rate(self, camera, frames_per_minute):
+        """
+        Sets the target rate of one camera, None for frames_per_minute.
+        """
+        if frames_per_minute is None:
+            self._rates.pop(camera, None)
+        else:
+            self._rates[camera] = frames_per_minute
+
+    def report(self, severity, camera=None):
+        """
+        Starts a burst of the camera when a frame is at least suspicious (severity above 0.33).
+        """
+        if severity > 0.33 and self.burst_frames > 0:
+            self._bursts[camera] = self.burst_frames
+
+    def _update_slowdown(self, now):
+        if self.temperature is None or now < self._next_reading:
+            return
+        self._next_reading = now + self.temperature_interval
+        temperature = self.temperature() or 0.0
+        self.last_temperature = temperature
+
+        slowdown = 1.0
+        for step_temperature, step_slowdown in self.thermal_steps:
+            # Stay on a step until the temperature is clearly below it
+            threshold = step_temperature - self.hysteresis if step_slowdown <= self.slowdown else step_temperature
+            if temperature >= threshold:
+                slowdown = max(slowdown, step_slowdown)
+        self.slowdown = slowdown
+
+    def next_delay(self, camera=None, now=None):
+        """
+        Returns:
+            float: Seconds to wait before the next frame of the camera starts.
+        """
+        now = time.monotonic() if now is None else now
+        self._update_slowdown(now)
+        delay = 0.0
+
+        if self._frame_start is not None:
+            busy = now - self._frame_start
+            if 0.0 < self.max_duty_cycle <= 1.0:
+                # At 1 the AI only rests when the CPU is hot
+                delay = max(busy / self.max_duty_cycle, busy) * self.slowdown - busy
+
+        camera_start = self._camera_starts.get(camera)
+        if camera_start is not None:
+            if self._bursts.get(camera, 0) > 0:
+                frames_per_minute = self.burst_frames_per_minute
+            else:
+                frames_per_minute = self._rates.get(camera, self.frames_per_minute)
+            if frames_per_minute > 0:
+                delay = max(delay, camera_start + 60.0 / frames_per_minute * self.slowdown - now)
+        return max(0.0, delay)
+
+    def pick(self, cameras):
+        """
+        Returns the camera whose next frame is due first. Of cameras due at the
+        same time, the one started longest ago goes first, so they take turns.
+        """
+        now = time.monotonic()
+        return min(cameras, key=lambda camera: (self.next_delay(camera, now),
+                                                self._camera_starts.get(camera, float("-inf"))))
+
+    def wait(self, running, camera=None, step=0.5):
+        """
+        Waits until the next frame of the camera is due, then marks it as started.
+
+        Args:
+            running (callable): Returns False to stop waiting early, checked every step seconds.
+            camera: The camera of the next frame, None with a single camera.
+
+        Returns:
+            float: The seconds waited.
+        """
+        delay = self.next_delay(camera)
+        if self._frame_start is not None:
+            busy = time.monotonic() - self._frame_start
+            period = busy + delay
+            self.duty_cycle = busy / period if period > 0 else 1.0
+
+        deadline = time.monotonic() + delay
+        while running():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(step, remaining))
+
+        self._frame_start = time.monotonic()
+        self._camera_starts[camera] = self._frame_start
+        if self._bursts.get(camera, 0) > 0:
+            self._bursts[camera] -= 1
+        return delay
+
+    def status(self):
+        return {
+            "framesPerMinute": self.frames_per_minute,
+            "dutyCycle": round(self.duty_cycle, 3),
+            "slowdown": self.slowdown,
+            "temperature": self.last_temperature,
+            "burstRemaining": max(self._bursts.values(), default=0),
+        }
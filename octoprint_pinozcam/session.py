@@ -0,0 +1,194 @@
+import collections
+import hashlib
+import logging
+import os
+import platform
+import threading
+
+import onnxruntime
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+MODEL_VARIANTS = ("float", "int8_dynamic", "int8_static")
+
+def quantized_model_filename(variant):
+    """
+    Return the file name of a quantized model variant in the plugin data folder, e.g. nozcam_int8_static.onnx.
+    """
+    return f"nozcam_{variant}.onnx"
+
+class SessionManager:
+    """
+    Creates and runs the ONNX Runtime session for the PiNozCam model.
+
+    The manager can be passed anywhere an onnxruntime.InferenceSession is
+    expected by image_inference: it exposes get_inputs, get_outputs and run.
+
+    - The graph is optimized at the configured level and the optimized model
+      is saved in cache_dir, keyed by the model file name, the model hash, the
+      optimization level, the ONNX Runtime version and the machine. Later
+      sessions load it without optimizing. The main, screening and quantized
+      models share cache_dir, and each keeps its own entry.
+    - With io_binding, inputs are bound in place and the outputs are written
+      into buffers that are preallocated once per input shape. A binding is kept
+      for each of the last max_bound_shapes input shapes, so the screening and
+      full-size frames of the cascade each keep theirs on a dynamic-input model.
+    - cpu_mem_arena and mem_pattern are passed to the SessionOptions.
+
+    Attributes:
+        model_path (str): Path of the float model (nozcam.bin).
+        cache_dir (str): Directory for optimized models, or None to disable the cache.
+        num_threads (int): Num of threads to use for AI inference.
+        graph_optimization_level (str): One of GRAPH_OPTIMIZATION_LEVELS.
+        io_binding (bool): Run through IO binding with preallocated outputs.
+        cpu_mem_arena (bool): Enable the CPU memory arena.
+        mem_pattern (bool): Enable memory pattern planning.
+    """
+
+    max_bound_shapes = 4
+
+    def __init__(self, model_path, cache_dir=None, num_threads=1, graph_optimization_level="all",
+                 io_binding=True, cpu_mem_arena=True, mem_pattern=True, logger=None):
+        if graph_optimization_level not in GRAPH_OPTIMIZATION_LEVELS:
+            raise ValueError(f"Unknown graph optimization level: {graph_optimization_level}")
+
+        self.model_path = model_path
+        self.cache_dir = cache_dir
+        self.num_threads = num_threads
+        self.graph_optimization_level = graph_optimization_level
+        self.io_binding = io_binding
+        self.cpu_mem_arena = cpu_mem_arena
+        self.mem_pattern = mem_pattern
+        self._logger = logger or logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._session = None
+        # Input shape -> (binding, output buffers), least recently used first
+        self._bindings = collections.OrderedDict()
+
+    def _session_options(self, optimization_level):
+        sess_opt = onnxruntime.SessionOptions()
+        sess_opt.intra_op_num_threads = self.num_threads
+        sess_opt.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[optimization_level]
+        sess_opt.enable_cpu_mem_arena = self.cpu_mem_arena
+        sess_opt.enable_mem_pattern = self.mem_pattern
+        return sess_opt
+
+    def _cache_prefix(self):
+        model_name = os.path.splitext(os.path.basename(self.model_path))[0]
+        return f"nozcam-{model_name}-"
+
+    def _cache_name(self, model_data):
+        model_hash = hashlib.sha256(model_data).hexdigest()[:16]
+        # Optimized graphs may contain hardware specific kernels, so the machine is part of the key
+        return f"{self._cache_prefix()}{model_hash}-{self.graph_optimization_level}-ort{onnxruntime.__version__}-{platform.machine()}.onnx"
+
+    def _prune_cache(self, keep_name):
+        """
+        Remove optimized models left behind by older versions of the same model file, other
+        optimization levels or ONNX Runtime versions. Entries of other models are kept.
+        """
+        prefix = self._cache_prefix()
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(prefix) and name != keep_name:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError as e:
+                    self._logger.warning(f"Failed to remove stale optimized model {name}: {e}")
+
+    def load(self):
+        """
+        Creates the InferenceSession, from the optimized model cache when possible.
+
+        Returns:
+            SessionManager: self, so the call can be chained.
+        """
+        with open(self.model_path, 'rb') as model_file:
+            model_data = model_file.read()
+
+        providers = ['CPUExecutionProvider']
+        cache_path = None
+        if self.cache_dir and self.graph_optimization_level != "disable":
+            os.makedirs(self.cache_dir, exist_ok=True)
+            cache_name = self._cache_name(model_data)
+            cache_path = os.path.join(self.cache_dir, cache_name)
+            self._prune_cache(cache_name)
+
+            if os.path.exists(cache_path):
+                try:
+                    # The cached graph is already optimized, do not pay for it again
+                    self._session = onnxruntime.InferenceSession(cache_path, self._session_options("disable"), providers=providers)
+                    self._logger.info(f"InferenceSession loaded from optimized model cache {cache_path}")
+                    return self
+                except Exception as e:
+                    self._logger.error(f"Failed to load optimized model {cache_path}, rebuilding it. Error: {e}")
+                    os.remove(cache_path)
+
+        sess_opt = self._session_options(self.graph_optimization_level)
+        tmp_path = None
+        if cache_path:
+            tmp_path = f"{cache_path}.tmp"
+            sess_opt.optimized_model_filepath = tmp_path
+
+        self._session = onnxruntime.InferenceSession(model_data, sess_opt, providers=providers)
+
+        if tmp_path and os.path.exists(tmp_path):
+            os.replace(tmp_path, cache_path)
+            self._logger.info(f"Saved optimized model to {cache_path}")
+        return self
+
+    def close(self):
+        with self._lock:
+            self._bindings.clear()
+            self._session = None
+
+    def get_inputs(self):
+        return self._session.get_inputs()
+
+    def get_outputs(self):
+        return self._session.get_outputs()
+
+    def run(self, output_names, input_feed):
+        """
+        Runs the model, with the same arguments and result as InferenceSession.run.
+
+        With io_binding the returned arrays are the preallocated output buffers:
+        they are overwritten by the next run with the same input shape.
+        """
+        if not self.io_binding or len(input_feed) != 1:
+            return self._session.run(output_names, input_feed)
+
+        (input_name, input_array), = input_feed.items()
+        with self._lock:
+            bound = self._bindings.get(input_array.shape)
+            if bound is None:
+                # Learn the output shapes with a plain run and keep its outputs as the buffers
+                outputs = self._session.run(None, input_feed)
+                self._bind(input_name, input_array, outputs)
+                return self._select(outputs, output_names)
+
+            self._bindings.move_to_end(input_array.shape)
+            binding, outputs = bound
+            binding.bind_cpu_input(input_name, input_array)
+            self._session.run_with_iobinding(binding)
+            return self._select(outputs, output_names)
+
+    def _bind(self, input_name, input_array, outputs):
+        binding = self._session.io_binding()
+        binding.bind_cpu_input(input_name, input_array)
+        for output, buffer in zip(self._session.get_outputs(), outputs):
+            binding.bind_output(output.name, 'cpu', 0, buffer.dtype, list(buffer.shape), buffer.ctypes.data)
+        self._bindings[input_array.shape] = (binding, outputs)
+        while len(self._bindings) > self.max_bound_shapes:
+            self._bindings.popitem(last=False)
+
+    def _select(self, outputs, output_names):
+        if not output_names:
+            return outputs
+        names = [output.name for output in self._session.get_outputs()]
+        return [outputs[names.index(name)] for name in output_names]
@@ -79,6 +79,26 @@ $(function () {
         self.currentCpuSpeedControl = ko.observable();
         self.newCpuSpeedControl = ko.observable("");
 
+        self.currentTargetFramesPerMinute = ko.observable();
+        self.newTargetFramesPerMinute = ko.observable();
+        self.newTargetFramesPerMinute.subscribe(function(newTargetFramesPerMinute) {
+            var newFloatTargetFramesPerMinute = parseFloat(newTargetFramesPerMinute); 
+            if (isNaN(newFloatTargetFramesPerMinute) || newFloatTargetFramesPerMinute < 0 || newFloatTargetFramesPerMinute > 600) {
+                alert("Target Frames per Minute must be between 0 and 600.");
+                self.newTargetFramesPerMinute(undefined); 
+            }
+        });
+
+        self.currentMaxDutyCycle = ko.observable();
+        self.newMaxDutyCycle = ko.observable();
+        self.newMaxDutyCycle.subscribe(function(newMaxDutyCycle) {
+            var newFloatMaxDutyCycle = parseFloat(newMaxDutyCycle); 
+            if (isNaN(newFloatMaxDutyCycle) || newFloatMaxDutyCycle <= 0 || newFloatMaxDutyCycle > 1.0) {
+                alert("Max AI Duty Cycle must be above 0 and at most 1.");
+                self.newMaxDutyCycle(undefined); 
+            }
+        });
+
         self.currentCustomSnapshotURL = ko.observable();
         self.newCustomSnapshotURL = ko.observable();
 
@@ -129,11 +149,11 @@ $(function () {
                     maskCanvas.height = backgroundImage.height;
                     maskContext.clearRect(0, 0, maskCanvas.width, maskCanvas.height);
                     maskContext.drawImage(backgroundImage, 0, 0, maskCanvas.width, maskCanvas.height);
-                    var blockWidth = Math.ceil(maskCanvas.width / 64);
-                    var blockHeight = Math.ceil(maskCanvas.height / 64);
-        
                     if (self.currentMaskImageData()) {
+                        // Drawn at the grid size of the stored mask, which may be finer than the editor's
                         var maskMatrix = decompressMaskMatrix(self.currentMaskImageData());
+                        var blockWidth = Math.ceil(maskCanvas.width / maskMatrix.length);
+                        var blockHeight = Math.ceil(maskCanvas.height / maskMatrix.length);
     
                         for (var i = 0; i < maskMatrix.length; i++) {
                             for (var j = 0; j < maskMatrix[i].length; j++) {
@@ -180,13 +200,47 @@ $(function () {
                 isDrawing = false;
             }
 
+            // Run-length encoded as "rle:<grid size>:<runs>", alternating unmasked and masked cell counts
             function compressMaskMatrix(maskMatrix) {
-                return maskMatrix.flat().map(cell => cell ? '1' : '0').join('');
+                var cells = maskMatrix.flat();
+                var runs = [];
+                var current = false;
+                var length = 0;
+                cells.forEach(function(cell) {
+                    if (!!cell !== current) {
+                        runs.push(length);
+                        current = !!cell;
+                        length = 0;
+                    }
+                    length++;
+                });
+                runs.push(length);
+                return 'rle:' + maskMatrix.length + ':' + runs.join(',');
             }
-            
+
+            // Reads both the run-length encoding and the legacy '0'/'1' string,
+            // keeping the grid size of the stored mask
             function decompressMaskMatrix(compressedMaskMatrix) {
-                return Array.from({ length: 64 }, (_, i) =>
-                    Array.from({ length: 64 }, (_, j) => compressedMaskMatrix[i * 64 + j] === '1')
+                var cells = compressedMaskMatrix;
+                var gridSize = Math.round(Math.sqrt(cells.length));
+                if (compressedMaskMatrix.startsWith('rle:')) {
+                    var parts = compressedMaskMatrix.split(':');
+                    gridSize = parseInt(parts[1], 10);
+                    cells = parts[2].split(',').map(function(run, k) {
+                        return (k % 2 ? '1' : '0').repeat(parseInt(run, 10));
+                    }).join('');
+                }
+                return Array.from({ length: gridSize }, (_, i) =>
+                    Array.from({ length: gridSize }, (_, j) => cells[i * gridSize + j] === '1')
+                );
+            }
+
+            // Samples a square mask matrix onto a grid of the given size
+            function resampleMaskMatrix(maskMatrix, gridSize) {
+                var sourceSize = maskMatrix.length;
+                return Array.from({ length: gridSize }, (_, i) =>
+                    Array.from({ length: gridSize }, (_, j) =>
+                        !!maskMatrix[Math.floor(i * sourceSize / gridSize)][Math.floor(j * sourceSize / gridSize)])
                 );
             }
 
@@ -213,7 +267,11 @@ $(function () {
                 // Decompress the new mask data into a 2D boolean array
                 var newMaskMatrix = decompressMaskMatrix(compressedMaskMatrix);
 
-                // Merge the previous mask data with the new mask data
+                // Merge the previous mask data with the new mask data, on the finer of the two grids
+                // so a finer mask set in config.yaml is not sampled down to the 64x64 cells of the editor
+                var gridSize = Math.max(previousMaskMatrix.length, newMaskMatrix.length);
+                previousMaskMatrix = resampleMaskMatrix(previousMaskMatrix, gridSize);
+                newMaskMatrix = resampleMaskMatrix(newMaskMatrix, gridSize);
                 var mergedMaskMatrix = previousMaskMatrix.map((row, i) => row.map((cell, j) => cell || newMaskMatrix[i][j]));
 
                 // Compress the merged mask data into a string
@@ -283,6 +341,12 @@ $(function () {
             self.newCpuSpeedControl(pluginSettings.cpuSpeedControl().toString());
             self.currentCpuSpeedControl(self.newCpuSpeedControl());
 
+            self.newTargetFramesPerMinute(pluginSettings.targetFramesPerMinute());
+            self.currentTargetFramesPerMinute(self.newTargetFramesPerMinute());
+
+            self.newMaxDutyCycle(pluginSettings.maxDutyCycle());
+            self.currentMaxDutyCycle(self.newMaxDutyCycle());
+
             self.newCustomSnapshotURL(pluginSettings.customSnapshotURL());
             self.currentCustomSnapshotURL(self.newCustomSnapshotURL());
 
@@ -312,6 +376,8 @@ $(function () {
                 enableMaxFailureCountNotification: self.newEnableMaxFailureCountNotification() === "true",
                 countTime: parseInt(self.newCountTime(), 10), 
                 cpuSpeedControl: parseFloat(self.newCpuSpeedControl()),
+                targetFramesPerMinute: parseFloat(self.newTargetFramesPerMinute()),
+                maxDutyCycle: parseFloat(self.newMaxDutyCycle()),
                 customSnapshotURL: self.newCustomSnapshotURL(),
                 maxNotification: parseInt(self.newMaxNotification(), 10),
                 telegramBotToken: self.newTelegramBotToken(),
@@ -336,6 +402,8 @@ $(function () {
                     self.currentMaxCount(self.newMaxCount());
                     self.currentCountTime(self.newCountTime());
                     self.currentCpuSpeedControl(self.newCpuSpeedControl());
+                    self.currentTargetFramesPerMinute(self.newTargetFramesPerMinute());
+                    self.currentMaxDutyCycle(self.newMaxDutyCycle());
                     self.currentCustomSnapshotURL(self.newCustomSnapshotURL());
                     self.currentMaxNotification(self.newMaxNotification());
                     self.currentTelegramBotToken(self.newTelegramBotToken());
@@ -354,6 +422,13 @@ $(function () {
         self.onStartupComplete = function() {
             self.handleMaskDialog();
         };
+
+        self.onDataUpdaterPluginMessage = function(plugin, data) {
+            if (plugin !== "pinozcam") {
+                return;
+            }
+            updatePiNozCamStatus(data);
+        };
     }
 
     // Register the plugin's ViewModel
@@ -364,22 +439,42 @@ $(function () {
     ]);
 });
 
-setInterval(function () {
+var lastFrameSequence = null;
+var lastImageEtag = null;
+
+function updatePiNozCamStatus(response) {
+    // Pushed after every AI frame and status change, without the image ETag, and polled as a fallback
+    var etagChanged = response.imageEtag !== undefined && response.imageEtag !== lastImageEtag;
+    if (response.frameSequence !== lastFrameSequence || etagChanged) {
+        // Only load the image when it changed: the URL names the frame, so every new frame is a new URL
+        // and an unchanged image is not requested again. /image itself also answers If-None-Match with 304.
+        lastFrameSequence = response.frameSequence;
+        if (response.imageEtag !== undefined) {
+            lastImageEtag = response.imageEtag;
+        }
+        $("#ai-image").attr("src", "/plugin/pinozcam/image?frame=" + response.frameSequence + "&etag=" + encodeURIComponent(lastImageEtag));
+    }
+    $("#failure-count").text("Failure Count: " + response.failureCount);  // Update the failure count display
+    $("#ai-status").text("AI Status: " + response.aiStatus);  // Update the AI status display
+    $("#telegram-status").text("Telegram Status: " + response.telegramStatus); // Update the telegram status display
+    $("#cpu-temperature").text("CPU Temperature: " + response.cpuTemperature + "°C");  // Update the CPU temperature display
+}
+
+function pollPiNozCamStatus() {
+    if (document.hidden) {
+        return;
+    }
     $.ajax({
-        url: "/plugin/pinozcam/check",
+        url: "/plugin/pinozcam/check?image=0",  // Status only, the image is loaded from /image
         type: "GET",
         dataType: "json",
-        success: function (response) {
-            console.log("Fetched data:", response);
-            //var data = JSON.parse(response);  // Parse the JSON response
-            $("#ai-image").attr("src", response.image);  // Update the image source
-            $("#failure-count").text("Failure Count: " + response.failureCount);  // Update the failure count display
-            $("#ai-status").text("AI Status: " + response.aiStatus);  // Update the AI status display
-            $("#telegram-status").text("Telegram Status: " + response.telegramStatus); // Update the telegram status display
-            $("#cpu-temperature").text("CPU Temperature: " + response.cpuTemperature + "°C");  // Update the CPU temperature display
-        },
+        success: updatePiNozCamStatus,
         error: function (error) {
             console.log("Error fetching data:", error);
         },
     });
-}, 500); // Request every 0.5 seconds
\ No newline at end of file
+}
+
+pollPiNozCamStatus();
+// Updates are pushed, polling only keeps the camera view of an idle printer current
+setInterval(pollPiNozCamStatus, 10000); // Request every 10 seconds
@@ -0,0 +1,378 @@
+import collections
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from PIL import Image
+
+from .framering import FrameRef, FrameRing, shared_memory
+from .inference import _model_input_is_dynamic, image_inference, image_inference_cascade
+from .session import SessionManager
+
+_WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker_process.py")
+
+# A frame written into the frame ring before it is inferred, and the ring it was written into
+StagedFrame = collections.namedtuple("StagedFrame", ["ring", "ref"])
+
+class WorkerError(RuntimeError):
+    """
+    Raised when the inference worker crashed, timed out or could not start.
+    """
+
+def run_inference(image, ort_session, screen_session, options, cascade=None, timings=None):
+    """
+    Runs one frame through image_inference, or image_inference_cascade when cascade is set.
+
+    Args:
+        image (PIL.Image.Image): The masked frame.
+        options (dict): The keyword arguments of image_inference, without the image and session.
+        cascade (dict, optional): screen_size, score_gate and area_gate of the cascade.
+        timings (dict, optional): Filled with the milliseconds spent in every stage.
+
+    Returns:
+        tuple: The image_inference result, and whether the cascade confirmed the frame
+        (None without a cascade).
+    """
+    if cascade is None or screen_session is None:
+        return image_inference(image, ort_session=ort_session, timings=timings, **options), None
+    return image_inference_cascade(image, ort_session=ort_session, screen_session=screen_session,
+                                   timings=timings, **cascade, **options)
+
+def _load_sessions(config):
+    ort_session = SessionManager(**config["session"]).load()
+    dynamic_input = _model_input_is_dynamic(ort_session)
+    screen_session = None
+    if config.get("cascade"):
+        if dynamic_input:
+            screen_session = ort_session
+        elif config.get("screen_session"):
+            screen_session = SessionManager(**config["screen_session"]).load()
+    return ort_session, screen_session, dynamic_input
+
+def _limit_memory(memory_limit_mb):
+    """
+    Caps the heap and private mappings of the worker process, so a runaway request fails
+    with a MemoryError, or at worst kills the worker, instead of taking the memory of the Pi.
+    """
+    try:
+        import resource
+    except ImportError:  # Windows
+        return
+    limit = int(memory_limit_mb * 1024 * 1024)
+    try:
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+    except (ValueError, OSError):
+        pass
+
+def _worker_main(conn, config, niceness, memory_limit_mb=0):
+    """
+    The main loop of the worker process, started by worker_process.py: loads the model,
+    then answers requests until stopped.
+
+    Requests are ("infer", mode, size, pixels, options, cascade) tuples, or
+    ("infer_ring", ring geometry, FrameRef, options, cascade) for a frame in a shared
+    FrameRing. They are answered with ("ok", result, confirmed, timings) or
+    ("error", message). The first message sent is ("ready", info) or ("error", message).
+    """
+    if niceness:
+        try:
+            os.nice(niceness)
+        except OSError:
+            pass
+    if memory_limit_mb:
+        _limit_memory(memory_limit_mb)
+
+    try:
+        ort_session, screen_session, dynamic_input = _load_sessions(config)
+    except Exception as e:
+        conn.send(("error", f"Failed to load model: {e}"))
+        return
+    conn.send(("ready", {"pid": os.getpid(), "dynamic_input": dynamic_input,
+                         "cascade": screen_session is not None}))
+
+    ring = None
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+        if request[0] == "stop":
+            break
+
+        try:
+            if request[0] == "infer_ring":
+                _, geometry, ref, options, cascade = request
+                if ring is None or ring.name != geometry["name"]:
+                    if ring is not None:
+                        ring.close()
+                    ring = FrameRing.attach(**geometry)
+                # Resized straight from the slot, which the plugin keeps pinned until the answer
+                image = ring.read_image(FrameRef(*ref))
+            else:
+                _, mode, size, pixels, options, cascade = request
+                image = Image.frombytes(mode, size, pixels)
+            timings = {}
+            result, confirmed = run_inference(image, ort_session, screen_session, options, cascade, timings)
+            conn.send(("ok", result, confirmed, timings))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+        finally:
+            # No image of the ring may outlive the request, so the ring can be closed when replaced
+            image = None
+
+    if ring is not None:
+        ring.close()
+
+def _resident_memory_mb(pid):
+    """
+    Returns the resident memory of a process in MB, or None where /proc is not available.
+    """
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+class InferenceWorker:
+    """
+    Runs the model in a separate process, so inference does not compete with the
+    OctoPrint server for the GIL and its heap.
+
+    The worker is started as a script, see worker_process.py, and is supervised by infer():
+
+    - A worker that crashed is restarted on the next request, after restart_delay
+      seconds, doubled after every failed start up to 60 seconds.
+    - A request not answered within timeout seconds kills the worker.
+    - The worker cannot allocate more than memory_limit_mb (RLIMIT_DATA), so a
+      request that needs more fails. A worker whose resident memory exceeds
+      memory_limit_mb after a request is restarted before the next one.
+
+    With frame_ring_slots, frames are handed over through a shared memory FrameRing
+    and only the slot reference is sent through the pipe. The ring grows when a
+    larger frame arrives. A capture thread can stage a frame in the ring as soon
+    as it is decoded; infer then sends its reference as it is, and copies the
+    frame in only when it was not staged or its slot was reused since. The slot
+    of the frame being inferred is pinned, so staging never overwrites it.
+
+    Attributes:
+        config (dict): The SessionManager arguments of the model ("session"), of the
+            screening model ("screen_session") and whether to run the cascade ("cascade").
+        memory_limit_mb (int): The memory ceiling of the worker, 0 disables it.
+        timeout (float): Seconds to wait for one frame.
+        niceness (int): Added to the nice value of the worker, so it yields the CPU to OctoPrint.
+        frame_ring_slots (int): The slots of the shared frame ring, 0 sends the pixels through the pipe.
+        restarts (int): The number of times the worker was restarted.
+        dynamic_input (bool): Whether the model accepts other input sizes, known once started.
+        cascade (bool): Whether the worker runs the screening cascade, known once started.
+    """
+
+    startup_timeout = 120.0
+
+    def __init__(self, config, memory_limit_mb=512, timeout=30.0, niceness=5, restart_delay=1.0,
+                 frame_ring_slots=3, logger=None):
+        self.config = config
+        self.memory_limit_mb = memory_limit_mb
+        self.timeout = timeout
+        self.niceness = niceness
+        self.frame_ring_slots = frame_ring_slots if shared_memory is not None else 0
+        self.restart_delay = restart_delay
+        self._logger = logger or logging.getLogger(__name__)
+
+        self._process = None
+        self._conn = None
+        self._ring = None
+        # Guards the ring against being replaced or closed while a frame is written into it
+        self._ring_lock = threading.Lock()
+        self._next_start = 0.0
+        self._failed_starts = 0
+        self.restarts = 0
+        self.dynamic_input = False
+        self.cascade = False
+
+    def is_alive(self):
+        return self._process is not None and self._process.poll() is None
+
+    def start(self):
+        """
+        Starts the worker and waits until its model is loaded.
+
+        Raises:
+            WorkerError: If the worker failed to load the model or to answer in time.
+        """
+        parent_conn, child_conn = multiprocessing.Pipe()
+        try:
+            process = subprocess.Popen([sys.executable, _WORKER_SCRIPT, str(child_conn.fileno())],
+                                       pass_fds=(child_conn.fileno(),))
+        except OSError as e:
+            parent_conn.close()
+            self._fail_start()
+            raise WorkerError(f"Inference worker could not be started: {e}")
+        finally:
+            child_conn.close()
+        self._process, self._conn = process, parent_conn
+
+        try:
+            parent_conn.send(("start", self.config, self.niceness, self.memory_limit_mb))
+            if not parent_conn.poll(self.startup_timeout):
+                raise WorkerError(f"Inference worker did not start within {self.startup_timeout:.0f}s")
+            message = parent_conn.recv()
+        except (EOFError, OSError) as e:
+            self._fail_start()
+            raise WorkerError(f"Inference worker exited during startup: {e}")
+        except WorkerError:
+            self._fail_start()
+            raise
+        if message[0] != "ready":
+            self._fail_start()
+            raise WorkerError(message[1])
+
+        self._failed_starts = 0
+        info = message[1]
+        self.dynamic_input = info["dynamic_input"]
+        self.cascade = info["cascade"]
+        self._logger.info(f"Inference worker started with pid {info['pid']}.")
+
+    def _fail_start(self):
+        self._kill()
+        delay = min(60.0, self.restart_delay * 2 ** self._failed_starts)
+        self._failed_starts += 1
+        self._next_start = time.monotonic() + delay
+
+    def _kill(self):
+        if self._conn is not None:
+            self._conn.close()
+        if self._process is not None:
+            if self._process.poll() is None:
+                self._process.kill()
+            try:
+                self._process.wait(5)
+            except subprocess.TimeoutExpired:
+                pass
+        self._process, self._conn = None, None
+
+    def stop(self):
+        """
+        Asks the worker to exit and kills it if it does not within 5 seconds.
+        """
+        if self.is_alive():
+            try:
+                self._conn.send(("stop",))
+                self._process.wait(5)
+            except (OSError, ValueError, subprocess.TimeoutExpired):
+                pass
+        self._kill()
+        with self._ring_lock:
+            if self._ring is not None:
+                self._ring.close()
+                self._ring = None
+
+    def _ring_for(self, size):
+        """
+        Returns a frame ring with slots for frames of the given size, replacing a smaller one.
+        Called with _ring_lock held.
+        """
+        if self._ring is None or not self._ring.fits(size):
+            old_ring = self._ring
+            # Round up so a slightly larger frame does not reallocate again
+            max_width = max(size[0] + -size[0] % 64, old_ring.max_width if old_ring else 0)
+            max_height = max(size[1] + -size[1] % 64, old_ring.max_height if old_ring else 0)
+            self._ring = FrameRing(self.frame_ring_slots, max_width, max_height)
+            if old_ring is not None:
+                # The worker keeps its own mapping of the old ring until it attaches the new one
+                old_ring.close()
+        return self._ring
+
+    def _ensure_running(self):
+        if self.is_alive():
+            return
+        if self._process is not None:
+            self._logger.error(f"Inference worker exited with code {self._process.returncode}, restarting it.")
+            self._kill()
+            self._next_start = time.monotonic() + self.restart_delay
+        wait = self._next_start - time.monotonic()
+        if wait > 0:
+            raise WorkerError(f"Inference worker restarts in {wait:.0f}s")
+        self.restarts += 1
+        self.start()
+
+    def stage(self, image):
+        """
+        Writes a frame into the frame ring ahead of infer, e.g. from a capture thread.
+
+        Returns:
+            StagedFrame: Where the frame was written, or None without a frame ring.
+        """
+        if not self.frame_ring_slots:
+            return None
+        with self._ring_lock:
+            ring = self._ring_for(image.size)
+            return StagedFrame(ring.name, ring.write(image))
+
+    def _pin_frame(self, image, staged):
+        """
+        Returns the ring and the pinned reference of the frame, writing it in unless it is
+        still in the slot it was staged in.
+        """
+        with self._ring_lock:
+            ring = self._ring_for(image.size)
+            if staged is not None and staged.ring == ring.name and ring.pin(staged.ref):
+                return ring, staged.ref
+            ref = ring.write(image)
+            ring.pin(ref)
+            return ring, ref
+
+    def infer(self, image, options, cascade=None, timings=None, staged=None):
+        """
+        Runs one frame in the worker, with the arguments and result of run_inference.
+
+        Args:
+            staged (StagedFrame, optional): Where stage wrote the same image.
+
+        Raises:
+            WorkerError: If the worker crashed, timed out or could not be restarted.
+                The frame is lost, the next call restarts the worker.
+            RuntimeError: If inference itself failed in the worker.
+        """
+        self._ensure_running()
+        ring, ref = None, None
+        try:
+            if self.frame_ring_slots:
+                ring, ref = self._pin_frame(image, staged)
+                self._conn.send(("infer_ring", ring.geometry(), tuple(ref), options, cascade))
+            else:
+                self._conn.send(("infer", image.mode, image.size, image.tobytes(), options, cascade))
+            if not self._conn.poll(self.timeout):
+                self._logger.error(f"Inference worker did not answer within {self.timeout:.0f}s, killing it.")
+                self._kill()
+                raise WorkerError("Inference worker timed out")
+            message = self._conn.recv()
+        except (EOFError, OSError) as e:
+            # The pipe closes before the process is reaped, wait for it so the next request restarts it
+            try:
+                self._process.wait(1)
+            except subprocess.TimeoutExpired:
+                pass
+            raise WorkerError(f"Inference worker crashed: {e}")
+        finally:
+            if ref is not None:
+                with self._ring_lock:
+                    ring.unpin(ref)
+
+        if self.memory_limit_mb:
+            resident_mb = _resident_memory_mb(self._process.pid)
+            if resident_mb is not None and resident_mb > self.memory_limit_mb:
+                self._logger.warning(f"Inference worker uses {resident_mb:.0f} MB, above the {self.memory_limit_mb} MB limit. Restarting it.")
+                self.stop()
+
+        if message[0] != "ok":
+            raise RuntimeError(message[1])
+        _, result, confirmed, worker_timings = message
+        if timings is not None:
+            for stage, milliseconds in worker_timings.items():
+                timings[stage] = timings.get(stage, 0.0) + milliseconds
+        return result, confirmed
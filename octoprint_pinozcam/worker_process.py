@@ -0,0 +1,35 @@
+"""
+The entry point of the inference worker process, run as a script by InferenceWorker.
+
+The worker is started as a script instead of through multiprocessing, which would
+import octoprint_pinozcam and, through it, OctoPrint, Flask and telebot. Here the
+package is registered as a bare module, so only the modules the worker runs are
+loaded: the worker, the inference pipeline and their numpy, PIL and ONNX Runtime.
+
+Usage: python worker_process.py <connection fd>
+"""
+import os
+import sys
+import types
+
+def main():
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    # Python puts the script directory first on the path, where the package modules would
+    # shadow installed ones of the same name, e.g. coverage
+    if sys.path and os.path.abspath(sys.path[0] or os.curdir) == package_dir:
+        sys.path.pop(0)
+    sys.path.insert(0, os.path.dirname(package_dir))
+
+    package = types.ModuleType("octoprint_pinozcam")
+    package.__path__ = [package_dir]
+    sys.modules["octoprint_pinozcam"] = package
+
+    from multiprocessing.connection import Connection
+    from octoprint_pinozcam.worker import _worker_main
+
+    conn = Connection(int(sys.argv[1]))
+    _, config, niceness, memory_limit_mb = conn.recv()
+    _worker_main(conn, config, niceness, memory_limit_mb)
+
+if __name__ == "__main__":
+    main()
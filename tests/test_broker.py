@@ -0,0 +1,88 @@
+import threading
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from octoprint_pinozcam.broker import SnapshotBroker
+from octoprint_pinozcam.decode import SnapshotSource
+
+def make_source(index):
+    buffered = BytesIO()
+    Image.new("RGB", (32, 24), (index * 40 % 256, 0, 0)).save(buffered, format="JPEG")
+    return SnapshotSource(buffered.getvalue(), False, False, False)
+
+class SlowFetch:
+    """
+    A webcam that holds every fetch until it is released, and counts the fetches.
+    """
+
+    def __init__(self):
+        self.fetches = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.fetches += 1
+        self.started.set()
+        self.release.wait(5.0)
+        return make_source(self.fetches)
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+def test_concurrent_callers_share_one_fetch():
+    fetch = SlowFetch()
+    broker = SnapshotBroker(fetch)
+    results = []
+
+    def call():
+        results.append(broker.source(max_age=0))
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    assert fetch.started.wait(5.0)
+    threads += [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads[1:]:
+        thread.start()
+    assert wait_until(lambda: broker.coalesced == 4)
+    fetch.release.set()
+    for thread in threads:
+        thread.join(5.0)
+
+    assert fetch.fetches == 1
+    assert len(results) == 5
+    assert all(result is results[0] for result in results)
+    assert (broker.hits, broker.coalesced, broker.misses) == (0, 4, 1)
+
+def test_fresh_snapshots_are_reused_and_max_age_0_fetches_a_new_one():
+    fetch = SlowFetch()
+    fetch.release.set()
+    broker = SnapshotBroker(fetch)
+
+    first = broker.source(max_age=0)
+    assert broker.source(max_age=60) is first
+    time.sleep(0.01)
+    second = broker.source(max_age=0)
+
+    assert second is not first
+    assert fetch.fetches == 2
+    assert (broker.hits, broker.coalesced, broker.misses) == (1, 0, 2)
+
+def test_images_are_decoded_once_and_copied():
+    fetch = SlowFetch()
+    fetch.release.set()
+    broker = SnapshotBroker(fetch)
+
+    first = broker.image(max_age=60)
+    second = broker.image(max_age=60)
+
+    assert first is not second
+    assert np.array_equal(np.asarray(first), np.asarray(second))
+    assert fetch.fetches == 1
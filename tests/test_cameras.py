@@ -0,0 +1,263 @@
+import json
+import logging
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from octoprint_pinozcam import FAILURE_DETECTED_EVENT, PinozcamPlugin
+from octoprint_pinozcam.cameras import DEFAULT_CAMERA, CameraMonitor
+from octoprint_pinozcam.mask import encode_mask
+
+from test_inference import FakeSession
+
+EMPTY_MASK = "0" * 64 * 64
+
+def left_half_mask():
+    grid = np.zeros((64, 64), dtype=bool)
+    grid[:, :32] = True
+    return encode_mask(grid)
+
+class FakeWebcamProvider:
+    def __init__(self, *names):
+        self.configs = [SimpleNamespace(name=name, flipH=False, flipV=False, rotate90=False) for name in names]
+
+    def get_webcam_configurations(self):
+        return self.configs
+
+    def take_webcam_snapshot(self, config):
+        return [config.name.encode()]
+
+class FakeEventBus:
+    def __init__(self):
+        self.events = []
+
+    def fire(self, event, payload=None):
+        self.events.append((event, payload))
+
+def make_plugin(multi_camera=False, cameras=(), camera_settings=None):
+    plugin = PinozcamPlugin()
+    plugin._logger = logging.getLogger("test")
+    plugin._event_bus = FakeEventBus()
+    plugin.multi_camera = multi_camera
+    plugin.cameras = list(cameras)
+    plugin.camera_settings = camera_settings or {}
+    plugin._build_monitors()
+    return plugin
+
+def result(severity, now):
+    return {'time': now, 'severity': severity}
+
+def test_prune_removes_old_results_and_their_failures():
+    monitor = CameraMonitor("side", None, EMPTY_MASK, 0.75, 0.04)
+    for age, severity in ((400, 0.9), (350, 0.5), (10, 0.9)):
+        monitor.ai_results.append(result(severity, 1000.0 - age))
+    monitor.count = 2
+
+    monitor.prune(300, now=1000.0)
+
+    assert [entry['severity'] for entry in monitor.ai_results] == [0.9]
+    assert monitor.count == 1
+
+def test_configure_keeps_the_count_and_results():
+    monitor = CameraMonitor("side", None, EMPTY_MASK, 0.75, 0.04)
+    monitor.count = 3
+    monitor.ai_results.append(result(0.9, 0.0))
+
+    monitor.configure(None, left_half_mask(), 0.5, 0.1, {"change_threshold": 4.0})
+
+    assert monitor.count == 3 and len(monitor.ai_results) == 1
+    assert monitor.scores_threshold == 0.5 and monitor.img_sensitivity == 0.1
+    assert monitor.frame_gate.change_threshold == 4.0
+    assert not monitor.mask.is_empty
+
+def test_configure_rejects_an_invalid_mask():
+    monitor = CameraMonitor("side", None, EMPTY_MASK, 0.75, 0.04)
+    with pytest.raises(ValueError):
+        monitor.configure(None, "rle:64:1,2", 0.75, 0.04, {})
+    assert monitor.mask_image_data == EMPTY_MASK
+
+def test_clear_forgets_the_failures():
+    monitor = CameraMonitor("side", None, EMPTY_MASK, 0.75, 0.04)
+    monitor.count = 2
+    monitor.ai_results.append(result(0.9, 0.0))
+    monitor.last_result = ()
+
+    monitor.clear()
+
+    assert monitor.count == 0 and not monitor.ai_results and monitor.last_result is None
+
+def test_single_camera_monitors_the_default_snapshot():
+    plugin = make_plugin(cameras=[FakeWebcamProvider("nozzle", "side")])
+
+    assert [monitor.name for monitor in plugin.monitors] == [DEFAULT_CAMERA]
+    assert plugin.monitors[0].fetch == plugin._ai_snapshot_source
+
+def test_multi_camera_monitors_every_webcam_with_its_overrides():
+    camera_settings = {"side": {"scoresThreshold": 0.6, "imgSensitivity": 0.1, "targetFramesPerMinute": 10,
+                                "maskImageData": left_half_mask()}}
+    plugin = make_plugin(True, [FakeWebcamProvider("nozzle", "side")], camera_settings)
+    nozzle, side = plugin.monitors
+
+    assert (nozzle.name, side.name) == ("nozzle", "side")
+    assert (nozzle.scores_threshold, nozzle.img_sensitivity) == (0.75, 0.04)
+    assert (side.scores_threshold, side.img_sensitivity) == (0.6, 0.1)
+    assert nozzle.mask.is_empty and not side.mask.is_empty
+    assert plugin.scheduler._rates == {"side": 10.0}
+    assert side.fetch().data == b"side"
+
+def test_invalid_camera_mask_falls_back_to_the_plugin_mask():
+    plugin = make_plugin(True, [FakeWebcamProvider("side")], {"side": {"maskImageData": "rle:64:1,2"}})
+    assert plugin.monitors[0].mask_image_data == plugin.mask_image_data
+
+def test_multi_camera_without_webcams_monitors_the_default_camera():
+    plugin = make_plugin(True)
+    assert [monitor.name for monitor in plugin.monitors] == [DEFAULT_CAMERA]
+
+def test_rebuilding_keeps_the_state_of_remaining_cameras():
+    provider = FakeWebcamProvider("nozzle", "side")
+    plugin = make_plugin(True, [provider])
+    nozzle = plugin.monitors[0]
+    nozzle.count = 2
+
+    provider.configs = provider.configs[:1]
+    plugin.camera_settings = {"nozzle": {"scoresThreshold": 0.5}}
+    plugin._build_monitors()
+
+    assert plugin.monitors == [nozzle]
+    assert nozzle.count == 2 and nozzle.scores_threshold == 0.5
+
+def test_check_reports_every_camera():
+    plugin = make_plugin(True, [FakeWebcamProvider("nozzle", "side")])
+    nozzle, side = plugin.monitors
+    nozzle.count, nozzle.last_severity, nozzle.frames = 1, 0.8, 5
+
+    data = json.loads(plugin.check_response(None).get_data())
+
+    assert data["failureCount"] == 1
+    assert data["cameras"] == [
+        {"name": "nozzle", "failureCount": 1, "lastSeverity": 0.8, "framesProcessed": 5,
+         "framesInferred": 0, "framesSkipped": 0, "capturing": False},
+        {"name": "side", "failureCount": 0, "lastSeverity": 0.0, "framesProcessed": 0,
+         "framesInferred": 0, "framesSkipped": 0, "capturing": False},
+    ]
+
+def run_ai_loop(plugin, frames, severity=0.9):
+    """
+    Runs process_ai_image on a fake model and the same webcam image until frames were processed.
+
+    Returns:
+        tuple: The monitor of every inferred frame and the thread of every snapshot fetch.
+    """
+    image = Image.new("RGB", (64, 48), (128, 128, 128))
+    inferred, fetch_threads = [], []
+
+    def fetch_snapshot(monitor):
+        fetch_threads.append(threading.current_thread())
+        return image.copy(), None
+
+    def infer_frame(monitor, ai_input_image, *args, **kwargs):
+        inferred.append(monitor)
+        return np.array([severity]), [[0, 0, 10, 10]], np.array([1.0]), severity, 0.5, 0.01
+
+    push_status = plugin._push_status
+
+    def push_status_and_stop(new_frame=False):
+        push_status(new_frame)
+        if sum(monitor.frames for monitor in plugin.monitors) >= frames:
+            plugin.ai_running = False
+
+    plugin.ai_running = True
+    plugin.perform_action = lambda: None
+    plugin._model_path = lambda: "model"
+    plugin._create_session = lambda model_path: SimpleNamespace(
+        get_inputs=lambda: [SimpleNamespace(shape=[1, 3, 384, 640])])
+    plugin._fetch_snapshot = fetch_snapshot
+    plugin._infer_frame = infer_frame
+    plugin.draw_response_data = lambda scores, boxes, labels, severity, image, scores_threshold=None: image
+    plugin.get_printer_status = lambda: ("printer", "Printing", 0, 200, 60, None)
+    plugin._push_status = push_status_and_stop
+    plugin.process_ai_image()
+    return inferred, fetch_threads
+
+def test_reused_results_are_not_counted_again():
+    plugin = make_plugin()
+    plugin.frame_gating = True
+    monitor = plugin.monitors[0]
+
+    inferred, fetch_threads = run_ai_loop(plugin, frames=4)
+
+    assert set(fetch_threads) == {threading.current_thread()}
+    # Only the first frame was inferred, the unchanged ones reused its result
+    assert len(inferred) == 1
+    assert monitor.frames == 4
+    assert monitor.frame_gate.get_counters()["unchanged"] == 3
+    assert monitor.count == 1
+    assert len(monitor.ai_results) == 1
+    assert len(plugin._event_bus.events) == 1
+
+def test_failure_fires_the_failure_detected_event():
+    plugin = make_plugin()
+    plugin.max_count = 5
+
+    run_ai_loop(plugin, frames=2, severity=0.9)
+
+    assert plugin._event_bus.events == [
+        (FAILURE_DETECTED_EVENT, {"camera": DEFAULT_CAMERA, "severity": 0.9, "percentageArea": 0.5,
+                                  "failureCount": count, "maxCount": 5})
+        for count in (1, 2)
+    ]
+
+def test_frame_sequence_only_changes_with_the_preview():
+    plugin = make_plugin()
+    run_ai_loop(plugin, frames=3, severity=0.1)
+    # Clean frames leave the preview to the webcam snapshot, which the tab polls
+    assert plugin.frame_sequence == 0
+
+    plugin = make_plugin()
+    run_ai_loop(plugin, frames=3, severity=0.5)
+    assert plugin.frame_sequence == 3
+
+def test_inferred_frames_are_all_counted():
+    plugin = make_plugin()
+
+    inferred, _ = run_ai_loop(plugin, frames=3)
+
+    assert len(inferred) == 3
+    assert plugin.monitors[0].count == 3
+    assert len(plugin.monitors[0].ai_results) == 3
+    assert [payload["failureCount"] for _, payload in plugin._event_bus.events] == [1, 2, 3]
+
+def test_multi_camera_captures_every_camera_in_the_background():
+    plugin = make_plugin(True, [FakeWebcamProvider("nozzle", "side")])
+
+    inferred, fetch_threads = run_ai_loop(plugin, frames=4)
+
+    assert {monitor.name for monitor in inferred} == {"nozzle", "side"}
+    assert {monitor.count for monitor in plugin.monitors} == {2}
+    assert threading.current_thread() not in fetch_threads
+    # The capture threads are stopped with the AI loop
+    assert all(monitor.capture is None for monitor in plugin.monitors)
+    assert {payload["camera"] for _, payload in plugin._event_bus.events} == {"nozzle", "side"}
+
+def test_cascade_counts_screened_and_confirmed_frames():
+    plugin = make_plugin()
+    plugin.proc_img_width, plugin.proc_img_height = 512, 256
+    plugin.cascade_width, plugin.cascade_height = 256, 128
+    monitor = plugin.monitors[0]
+    image = Image.new("RGB", (512, 256))
+    full_session = FakeSession([(0.95, 4, 4)])
+
+    for screen_score in (0.1, 0.9, 0.2):
+        result = plugin._infer_frame(monitor, image, full_session, FakeSession([(screen_score, 2, 3)]), True)
+
+    assert (plugin.cascade_screened, plugin.cascade_confirmed) == (3, 1)
+    assert len(full_session.inputs) == 1
+    assert result[3] == 0
+
+    # Without a screening session every frame is run at full resolution and not counted
+    result = plugin._infer_frame(monitor, image, full_session, None, True)
+    assert (plugin.cascade_screened, plugin.cascade_confirmed) == (3, 1)
+    assert result[0].tolist() == pytest.approx([0.95])
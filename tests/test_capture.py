@@ -0,0 +1,38 @@
+import time
+
+from PIL import Image
+
+from octoprint_pinozcam.capture import CaptureThread
+
+def counting_fetch():
+    return Image.new("RGB", (8, 8)), None
+
+def test_deferred_capture_fetches_once_just_before_the_frame_is_due():
+    capture = CaptureThread(counting_fetch, max_age=0.05, retry_delay=0.05)
+    capture.start()
+    try:
+        while capture.fetches == 0:
+            time.sleep(0.01)
+        # Like the AI loop when a frame starts, at a rate of one frame every 0.6 s
+        capture.defer(0.6)
+        assert capture.latest.take(timeout=2.0) is not None
+        fetches = capture.fetches
+        time.sleep(0.4)
+        # Without defer the next frame would have been fetched at once and refreshed every 0.05 s
+        assert capture.fetches == fetches
+
+        frame = capture.latest.take(timeout=2.0)
+        assert frame is not None
+        assert time.time() - frame.timestamp < 0.1
+        assert capture.fetches == fetches + 1
+    finally:
+        capture.stop()
+
+def test_capture_refreshes_a_waiting_frame_after_max_age():
+    capture = CaptureThread(counting_fetch, max_age=0.05, retry_delay=0.05)
+    capture.start()
+    try:
+        time.sleep(0.4)
+        assert capture.fetches >= 3
+    finally:
+        capture.stop()
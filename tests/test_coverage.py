@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from octoprint_pinozcam.coverage import coverage_map, failure_area
+
+def bitmap(boxes, width, height):
+    """
+    The per-pixel bitmap image_inference built before failure_area, kept as the reference.
+    """
+    bitmap = [[False for _ in range(width)] for _ in range(height)]
+    for box in boxes:
+        x1, y1, x2, y2 = map(int, box)
+        # Clip the coordinates to stay within the image boundaries
+        x1 = max(0, min(x1, width - 1))
+        y1 = max(0, min(y1, height - 1))
+        x2 = max(0, min(x2, width - 1))
+        y2 = max(0, min(y2, height - 1))
+
+        for i in range(y1, y2):
+            for j in range(x1, x2):
+                bitmap[i][j] = True
+    return bitmap
+
+def bitmap_failure_area(boxes, width, height):
+    return sum(row.count(True) for row in bitmap(boxes, width, height))
+
+def random_boxes(rng, count, width, height, margin=0):
+    """
+    Returns float32 boxes like the model's, reaching margin pixels outside the image.
+    """
+    corners = rng.uniform(-margin, [width + margin, height + margin], (count, 2, 2))
+    corners.sort(axis=1)
+    return corners.reshape(count, 4).astype(np.float32)
+
+SIZES = [(160, 120), (97, 61)]
+
+@pytest.mark.parametrize("width, height", SIZES)
+@pytest.mark.parametrize("count", [1, 2, 5, 40])
+def test_random_boxes_match_the_bitmap(width, height, count):
+    rng = np.random.default_rng(count * width)
+    for _ in range(10):
+        boxes = random_boxes(rng, count, width, height)
+        assert failure_area(boxes, width, height) == bitmap_failure_area(boxes, width, height)
+
+@pytest.mark.parametrize("width, height", SIZES)
+def test_overlapping_boxes_match_the_bitmap(width, height):
+    rng = np.random.default_rng(1)
+    for _ in range(10):
+        # Boxes around one point overlap each other, some of them exactly
+        center = rng.uniform((10, 10), (width - 10, height - 10))
+        half_sizes = rng.uniform(1, 30, (8, 2))
+        boxes = np.hstack([center - half_sizes, center + half_sizes]).astype(np.float32)
+        boxes = np.vstack([boxes, boxes[:2], [[0.5, 0.5, 30.9, 30.9], [0.2, 0.2, 30.1, 30.1]]])
+        assert failure_area(boxes, width, height) == bitmap_failure_area(boxes, width, height)
+
+@pytest.mark.parametrize("width, height", SIZES)
+def test_edge_clipped_boxes_match_the_bitmap(width, height):
+    rng = np.random.default_rng(2)
+    for _ in range(10):
+        boxes = random_boxes(rng, 12, width, height, margin=50)
+        assert failure_area(boxes, width, height) == bitmap_failure_area(boxes, width, height)
+
+    edge_cases = np.array([
+        [-20.7, -3.2, 15.9, 14.1],                   # negative corner, truncated toward zero
+        [width - 5, height - 5, width + 40, height + 40],  # past the far edge, clipped to size - 1
+        [0, 0, width, height],                       # the whole image misses the last row and column
+        [-30, 10, -1, 20],                           # fully outside
+        [10, 10, 10.9, 40],                          # thinner than a pixel
+    ], dtype=np.float32)
+    for box in edge_cases:
+        assert failure_area(box[None], width, height) == bitmap_failure_area(box[None], width, height)
+    assert failure_area(edge_cases, width, height) == bitmap_failure_area(edge_cases, width, height)
+
+def test_no_boxes_cover_nothing():
+    assert failure_area(np.zeros((0, 4), dtype=np.float32), 160, 120) == 0
+
+@pytest.mark.parametrize("width, height, grid_size", [(160, 120, 64), (97, 61, 8)])
+def test_coverage_map_matches_the_bitmap_per_cell(width, height, grid_size):
+    rng = np.random.default_rng(3)
+    boxes = random_boxes(rng, 6, width, height, margin=20)
+    pixels = np.array(bitmap(boxes, width, height))
+
+    result = coverage_map(boxes, width, height, grid_size)
+
+    block_width, block_height = -(-width // grid_size), -(-height // grid_size)
+    for row in range(grid_size):
+        for col in range(grid_size):
+            cell = pixels[row * block_height:(row + 1) * block_height, col * block_width:(col + 1) * block_width]
+            expected = cell.mean() if cell.size else 0.0
+            assert result[row, col] == pytest.approx(expected, abs=1e-6)
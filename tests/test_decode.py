@@ -0,0 +1,54 @@
+from io import BytesIO
+from itertools import product
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from octoprint_pinozcam.decode import SnapshotSource, decode_snapshot
+
+def encode(img, image_format="JPEG"):
+    buffer = BytesIO()
+    img.save(buffer, format=image_format, quality=95)
+    return buffer.getvalue()
+
+def snapshot_image(width=1280, height=960):
+    """
+    A smooth gradient with a bright block in the top left corner, so every flip and rotation is told apart.
+    """
+    x = np.linspace(0, 160, width)[None, :]
+    y = np.linspace(0, 80, height)[:, None]
+    pixels = np.zeros((height, width, 3), dtype=np.uint8)
+    pixels[..., 0] = x + y
+    pixels[..., 1] = 255 - x
+    pixels[..., 2] = y
+    pixels[:height // 4, :width // 4] = 255
+    return Image.fromarray(pixels)
+
+TRANSFORMS = list(product((False, True), repeat=3))
+
+@pytest.mark.parametrize("flip_h, flip_v, rotate90", TRANSFORMS)
+def test_draft_decode_is_at_least_the_target_size(flip_h, flip_v, rotate90):
+    source = SnapshotSource(encode(snapshot_image()), flip_h, flip_v, rotate90)
+    target_size = (300, 200)
+
+    img = decode_snapshot(source, target_size)
+
+    assert img.width >= target_size[0] and img.height >= target_size[1]
+    # The smallest covering scale: 1/4 of 1280x960, or 1/2 once the 300 pixels are the rotated height
+    assert img.size == ((480, 640) if rotate90 else (320, 240))
+
+@pytest.mark.parametrize("flip_h, flip_v, rotate90", TRANSFORMS)
+def test_draft_decode_has_the_orientation_of_a_full_decode(flip_h, flip_v, rotate90):
+    source = SnapshotSource(encode(snapshot_image()), flip_h, flip_v, rotate90)
+    target_size = (160, 120)
+
+    full = decode_snapshot(source).resize(target_size)
+    draft = decode_snapshot(source, target_size).resize(target_size)
+
+    difference = np.abs(np.asarray(full, dtype=np.int16) - np.asarray(draft, dtype=np.int16))
+    assert difference.mean() < 4
+
+def test_other_formats_are_decoded_at_full_resolution():
+    source = SnapshotSource(encode(snapshot_image(), "PNG"), False, False, True)
+    assert decode_snapshot(source, (160, 120)).size == (960, 1280)
@@ -0,0 +1,71 @@
+import threading
+import time
+
+from octoprint_pinozcam.framecache import FrameCache
+
+def test_concurrent_callers_share_one_produced_frame():
+    cache = FrameCache(ttl=10.0)
+    calls = []
+
+    def produce():
+        calls.append(1)
+        time.sleep(0.2)
+        return b"jpeg"
+
+    frames = []
+    threads = [threading.Thread(target=lambda: frames.append(cache.get(produce))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert {frame.etag for frame in frames} == {frames[0].etag}
+    assert (cache.hits, cache.misses) == (7, 1)
+
+def test_invalidate_does_not_wait_for_a_slow_produce():
+    cache = FrameCache(ttl=10.0)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_produce():
+        started.set()
+        release.wait(5.0)
+        return b"old"
+
+    thread = threading.Thread(target=cache.get, args=(slow_produce,))
+    thread.start()
+    started.wait(5.0)
+
+    start = time.monotonic()
+    cache.invalidate()
+    assert time.monotonic() - start < 0.1
+
+    release.set()
+    thread.join()
+    # The frame produced before the invalidation is not served again
+    assert cache.get(lambda: b"new").jpeg == b"new"
+
+def test_an_unchanged_picture_keeps_its_sequence():
+    cache = FrameCache(ttl=0.0)
+
+    first = cache.get(lambda: b"same")
+    second = cache.get(lambda: b"same")
+    third = cache.get(lambda: b"other")
+
+    assert first.sequence == second.sequence
+    assert third.sequence == first.sequence + 1
+    assert cache.data_url(third) == "data:image/jpeg;base64,b3RoZXI="
+
+def test_a_failed_produce_lets_the_next_caller_produce():
+    cache = FrameCache(ttl=10.0)
+
+    def failing_produce():
+        raise IOError("camera unavailable")
+
+    try:
+        cache.get(failing_produce)
+    except IOError:
+        pass
+
+    assert cache.get(lambda: b"jpeg").jpeg == b"jpeg"
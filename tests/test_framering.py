@@ -0,0 +1,116 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from octoprint_pinozcam.benchmark import synthetic_model
+from octoprint_pinozcam.framering import FrameRing, StaleFrameError
+from octoprint_pinozcam.session import SessionManager
+from octoprint_pinozcam.worker import InferenceWorker, run_inference
+
+def random_image(width, height, seed=0):
+    pixels = np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    return Image.fromarray(pixels)
+
+@pytest.fixture
+def ring():
+    ring = FrameRing(slots=3, max_width=1280, max_height=720)
+    yield ring
+    ring.close()
+
+@pytest.mark.parametrize("size", [(1280, 720), (641, 479), (17, 5)])
+def test_write_keeps_every_pixel(ring, size):
+    image = random_image(*size)
+
+    view, meta = ring.read(ring.write(image, camera_id=2, timestamp=1.5))
+
+    assert np.array_equal(view, np.asarray(image))
+    assert (meta["camera_id"], meta["timestamp"]) == (2, 1.5)
+    array = np.asarray(random_image(*size, seed=1))
+    assert np.array_equal(ring.read(ring.write(array))[0], array)
+
+def test_read_image_maps_the_slot_without_copying(ring):
+    image = random_image(641, 479)
+    ref = ring.write(image)
+
+    mapped = ring.read_image(ref)
+
+    assert mapped.size == image.size
+    assert np.array_equal(np.asarray(mapped.resize((320, 192)))[:, :, :3], np.asarray(image.resize((320, 192))))
+    ring.read(ref)[0][0, 0] = (1, 2, 3)
+    assert mapped.getpixel((0, 0))[:3] == (1, 2, 3)
+    del mapped
+
+def test_write_does_not_allocate_a_frame_sized_copy(ring):
+    image = random_image(1280, 720)
+    frame_bytes = 1280 * 720 * 3
+    ring.write(image)
+
+    tracemalloc.start()
+    try:
+        ring.write(image)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert peak < frame_bytes / 8
+
+def test_writes_skip_pinned_slots(ring):
+    image = random_image(64, 48)
+    pinned = ring.write(image)
+    assert ring.pin(pinned)
+
+    refs = [ring.write(random_image(64, 48, seed=index)) for index in range(5)]
+
+    assert pinned.slot not in {ref.slot for ref in refs}
+    assert np.array_equal(ring.read(pinned)[0], np.asarray(image))
+    ring.unpin(pinned)
+    ring.write(image)
+    ring.write(image)
+    with pytest.raises(StaleFrameError):
+        ring.read(pinned)
+    assert not ring.pin(pinned)
+
+def test_worker_hands_over_a_staged_frame_until_its_slot_is_reused():
+    worker = InferenceWorker({}, frame_ring_slots=3)
+    image = random_image(320, 240)
+    try:
+        staged = worker.stage(image)
+        ring, ref = worker._pin_frame(image, staged)
+        assert ref == staged.ref
+        ring.unpin(ref)
+
+        for index in range(3):
+            worker.stage(random_image(320, 240, seed=index + 1))
+        ring, ref = worker._pin_frame(image, staged)
+        assert ref != staged.ref
+        assert np.array_equal(ring.read(ref)[0], np.asarray(image))
+        ring.unpin(ref)
+
+        # A larger frame replaces the ring, so a frame staged in the old one is written again
+        worker.stage(random_image(1280, 720))
+        ring, ref = worker._pin_frame(image, staged)
+        assert ring.name != staged.ring
+        assert np.array_equal(ring.read(ref)[0], np.asarray(image))
+    finally:
+        worker.stop()
+
+def test_worker_infers_frames_read_from_the_ring_like_the_plugin(tmp_path):
+    model_path = tmp_path / "nozcam.onnx"
+    model_path.write_bytes(synthetic_model())
+    config = {"session": {"model_path": str(model_path)}}
+    options = dict(scores_threshold=0.3, img_sensitivity=0.04, _proc_img_width=256, _proc_img_height=128)
+    session = SessionManager(**config["session"]).load()
+    worker = InferenceWorker(config, memory_limit_mb=0)
+    try:
+        # The second, larger frame makes the worker close the first ring and attach a new one
+        for size in ((320, 240), (1280, 720)):
+            image = random_image(*size)
+            result, _ = worker.infer(image, options)
+            expected, _ = run_inference(image, session, None, options)
+            assert np.allclose(result[0], expected[0])
+            assert np.allclose(result[1], expected[1])
+            assert result[3] == expected[3]
+    finally:
+        worker.stop()
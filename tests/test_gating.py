@@ -0,0 +1,42 @@
+import numpy as np
+from PIL import Image
+
+from octoprint_pinozcam.gating import GATE_DARK, GATE_INFER, FrameGate
+from octoprint_pinozcam.mask import CompiledMask, encode_mask
+
+def masked_nozzle_frame(size=(640, 480)):
+    """
+    A dim frame with pixel values 20-60 and all but a 22x22 corner of the 64x64 grid masked.
+    """
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(20, 61, (size[1], size[0], 3), dtype=np.uint8)
+    grid = np.ones((64, 64), dtype=bool)
+    grid[:22, :22] = False
+    mask = CompiledMask(encode_mask(grid))
+    return mask.apply(Image.fromarray(pixels)), mask
+
+def test_masked_pixels_make_a_dim_frame_look_dark():
+    image, _ = masked_nozzle_frame()
+
+    decision, stats = FrameGate().check(image, now=0.0)
+
+    assert decision == GATE_DARK
+    assert stats["brightness"] < 8.0
+
+def test_brightness_and_sharpness_leave_out_masked_pixels():
+    image, mask = masked_nozzle_frame()
+
+    decision, stats = FrameGate(blur_threshold=1.0).check(image, now=0.0, mask=mask.pixel_mask(image.size))
+
+    assert decision == GATE_INFER
+    assert 20.0 <= stats["brightness"] <= 60.0
+    assert stats["sharpness"] > 1.0
+
+def test_fully_masked_frame_uses_every_pixel():
+    image = Image.new("RGB", (64, 48))
+    mask = CompiledMask("1" * 64 * 64)
+
+    decision, stats = FrameGate().check(mask.apply(image), now=0.0, mask=mask.pixel_mask(image.size))
+
+    assert decision == GATE_DARK
+    assert stats["brightness"] == 0.0
@@ -0,0 +1,98 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from octoprint_pinozcam.httpclient import (BREAKER_CLOSED, BREAKER_OPEN, CircuitBreaker, CircuitOpenError,
+                                           HttpEndpoint)
+
+class FakeSnapshotHandler(BaseHTTPRequestHandler):
+    """
+    Answers every request with the status code of the server.
+    """
+
+    def do_GET(self):
+        self.server.requests += 1
+        self.send_response(self.server.status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def fake_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSnapshotHandler)
+    server.daemon_threads = True
+    server.requests = 0
+    server.status = 500
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def server_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/?action=snapshot"
+
+@pytest.fixture
+def endpoint():
+    endpoint = HttpEndpoint("snapshot", read_timeout=2.0, breaker=CircuitBreaker(base_delay=0.2))
+    yield endpoint
+    endpoint.close()
+
+def trip(endpoint, url):
+    for _ in range(endpoint.breaker.failure_threshold):
+        assert endpoint.get(url).status_code == 500
+
+def test_three_failures_open_the_breaker(fake_server, endpoint):
+    trip(endpoint, server_url(fake_server))
+
+    with pytest.raises(CircuitOpenError):
+        endpoint.get(server_url(fake_server))
+    assert fake_server.requests == 3
+    status = endpoint.breaker.status()
+    assert status["state"] == BREAKER_OPEN
+    assert status["retryIn"] == pytest.approx(0.2, abs=0.1)
+    assert status["lastError"] == "HTTP 500"
+
+def test_connection_errors_count_as_failures(endpoint):
+    # Nothing listens on the discard port
+    for _ in range(3):
+        with pytest.raises(Exception) as error:
+            endpoint.get("http://127.0.0.1:9/")
+        assert not isinstance(error.value, CircuitOpenError)
+
+    with pytest.raises(CircuitOpenError):
+        endpoint.get("http://127.0.0.1:9/")
+
+def test_failed_probe_doubles_the_delay(fake_server, endpoint):
+    trip(endpoint, server_url(fake_server))
+    time.sleep(0.25)
+
+    # One probe is let through when the delay has passed, and fails again
+    assert endpoint.get(server_url(fake_server)).status_code == 500
+
+    status = endpoint.breaker.status()
+    assert status["state"] == BREAKER_OPEN
+    assert status["retryIn"] == pytest.approx(0.4, abs=0.1)
+    with pytest.raises(CircuitOpenError):
+        endpoint.get(server_url(fake_server))
+    assert fake_server.requests == 4
+
+def test_successful_probe_resets_the_delay(fake_server, endpoint):
+    trip(endpoint, server_url(fake_server))
+    time.sleep(0.25)
+    assert endpoint.get(server_url(fake_server)).status_code == 500
+    time.sleep(0.45)
+
+    fake_server.status = 200
+    assert endpoint.get(server_url(fake_server)).status_code == 200
+    assert endpoint.breaker.status()["state"] == BREAKER_CLOSED
+
+    # The next trip starts from the base delay again
+    fake_server.status = 500
+    trip(endpoint, server_url(fake_server))
+    assert endpoint.breaker.status()["retryIn"] == pytest.approx(0.2, abs=0.1)
@@ -0,0 +1,400 @@
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from octoprint_pinozcam.inference import (_cached_decoder, _detection_postprocess, _generate_anchors, _get_decoder,
+                                          _get_input_buffer, _preprocess_image, _preprocess_into, image_inference,
+                                          image_inference_batch, image_inference_cascade)
+
+from test_nms import assert_same_detections, baseline_nms
+
+PROC_WIDTH, PROC_HEIGHT = 256, 128
+STRIDES = (8, 16, 32, 64, 128)
+
+def baseline_delta2box(deltas, anchors, size, stride):
+    """
+    The box decoding of inference.py before the decoder cache, kept as the reference.
+    """
+    anchors_wh = anchors[:, 2:] - anchors[:, :2] + 1
+    ctr = anchors[:, :2] + 0.5 * anchors_wh
+    pred_ctr = deltas[:, :2] * anchors_wh + ctr
+    pred_wh = np.exp(deltas[:, 2:]) * anchors_wh
+
+    m = np.zeros([2], dtype=deltas.dtype)
+    M = np.array([size], dtype=deltas.dtype) * stride - 1
+    def clamp(t): return np.maximum(m, np.minimum(t, M))
+
+    return np.concatenate([
+        clamp(pred_ctr - 0.5 * pred_wh),
+        clamp(pred_ctr + 0.5 * pred_wh - 1)
+    ], axis=1)
+
+def baseline_decode(all_cls_head, all_box_head, stride=1, threshold=0.05, top_n=1000, anchors=None):
+    """
+    The _decode of inference.py before the decoder cache, kept as the reference.
+    """
+    num_boxes = 4
+
+    _, height, width = all_cls_head.shape
+    num_anchors = anchors.shape[0] if anchors is not None else 1
+    num_classes = all_cls_head.shape[0] // num_anchors
+
+    cls_head = all_cls_head.reshape(-1)
+    box_head = all_box_head.reshape(-1, num_boxes)
+
+    keep = np.where(cls_head >= threshold)[0]
+    if keep.size == 0:
+        return np.array([]), np.array([]), np.array([])
+
+    scores = cls_head[keep]
+    indices = scores.argsort()[::-1][:top_n]
+    scores = scores[indices]
+    classes = keep[indices] // (width * height * num_anchors) + 1
+
+    x = (keep[indices] % width).astype(np.int64)
+    y = ((keep[indices] / width) % height).astype(np.int64)
+    a = (keep[indices] / num_classes / height / width).astype(np.int64)
+
+    boxes = box_head[keep[indices]]
+
+    grid = np.stack([x, y, x, y], axis=1) * stride + anchors[a]
+    boxes = baseline_delta2box(boxes, grid, [width, height], stride)
+
+    return scores, boxes, classes
+
+def baseline_detection_postprocess(_proc_img_width, cls_heads, box_heads):
+    """
+    The _detection_postprocess of inference.py before the decoder cache, kept as the reference.
+    """
+    anchors = {}
+    decoded = []
+
+    for cls_head, box_head in zip(cls_heads, box_heads):
+        stride = _proc_img_width // cls_head.shape[-1]
+        if stride not in anchors:
+            anchors[stride] = _generate_anchors(stride, ratio_vals=[1.0, 2.0, 0.5], scales_vals=[4 * 2 ** (i / 3) for i in range(3)])
+        scores, boxes, classes = baseline_decode(cls_head, box_head, stride, 0.05, 1000, anchors[stride])
+        if scores.size > 0:
+            decoded.append((scores, boxes, classes))
+
+    if not decoded:
+        return np.array([]), np.array([]), np.array([])
+
+    all_scores, all_boxes, all_classes = zip(*decoded)
+    all_scores = np.concatenate(all_scores, axis=0)
+    all_boxes = np.concatenate(all_boxes, axis=0)
+    all_classes = np.concatenate(all_classes, axis=0)
+
+    return baseline_nms(all_scores, all_boxes, all_classes, nms=0.5, ndetections=6)
+
+def random_heads(rng, ties=True):
+    """
+    Returns float32 class and box heads for every level, with many tied and saturated scores when ties is set.
+    """
+    cls_heads, box_heads = [], []
+    for stride in STRIDES:
+        height, width = PROC_HEIGHT // stride, PROC_WIDTH // stride
+        scores = rng.uniform(0, 1, (9, height, width)) ** 3
+        if ties:
+            scores = np.round(scores, 1)
+            scores[rng.uniform(size=scores.shape) < 0.1] = 1.0
+        deltas = rng.normal(0, 0.2, (9 * 4, height, width))
+        if ties:
+            # Neighbouring anchors then decode to heavily overlapping boxes
+            deltas = np.round(deltas, 1)
+        cls_heads.append(scores.astype(np.float32))
+        box_heads.append(deltas.astype(np.float32))
+    return cls_heads, box_heads
+
+@pytest.mark.parametrize("ties", [False, True])
+def test_postprocess_matches_the_baseline(ties):
+    rng = np.random.default_rng(int(ties))
+    for _ in range(10):
+        cls_heads, box_heads = random_heads(rng, ties)
+        assert_same_detections(_detection_postprocess(PROC_WIDTH, cls_heads, box_heads, _proc_img_height=PROC_HEIGHT),
+                               baseline_detection_postprocess(PROC_WIDTH, cls_heads, box_heads))
+
+@pytest.mark.parametrize("method", ["greedy", "fast", "agnostic"])
+@pytest.mark.parametrize("score_threshold", [0.3, 0.75, 0.95])
+def test_pushed_down_threshold_keeps_the_baseline_detections_above_it(method, score_threshold):
+    rng = np.random.default_rng(int(score_threshold * 100))
+    for _ in range(10):
+        cls_heads, box_heads = random_heads(rng)
+        if method == "greedy":
+            full = baseline_detection_postprocess(PROC_WIDTH, cls_heads, box_heads)
+        else:
+            full = _detection_postprocess(PROC_WIDTH, cls_heads, box_heads, _proc_img_height=PROC_HEIGHT,
+                                          nms_method=method)
+        result = _detection_postprocess(PROC_WIDTH, cls_heads, box_heads, _proc_img_height=PROC_HEIGHT,
+                                        score_threshold=score_threshold, nms_method=method)
+        # Lower scored boxes never suppress higher scored ones, so the boxes above the threshold are the same
+        above = full[0] >= score_threshold
+        assert_same_detections(result, tuple(values[above] for values in full))
+
+def test_more_candidates_than_top_n_keep_the_baseline_selection():
+    rng = np.random.default_rng(0)
+    cls_heads, box_heads = random_heads(rng)
+    # Every score of the finest level is tied, so the top 1000 cut falls inside the ties
+    cls_heads[0][:] = 0.5
+
+    assert cls_heads[0].size > 1000
+    assert_same_detections(_detection_postprocess(PROC_WIDTH, cls_heads, box_heads, _proc_img_height=PROC_HEIGHT),
+                           baseline_detection_postprocess(PROC_WIDTH, cls_heads, box_heads))
+
+def test_no_candidate_returns_empty_arrays():
+    cls_heads, box_heads = random_heads(np.random.default_rng(0))
+    cls_heads = [np.zeros_like(cls_head) for cls_head in cls_heads]
+
+    scores, boxes, labels = _detection_postprocess(PROC_WIDTH, cls_heads, box_heads, _proc_img_height=PROC_HEIGHT)
+
+    assert scores.size == boxes.size == labels.size == 0
+
+def test_decoder_cache_evicts_the_least_recently_used_size():
+    _cached_decoder.cache_clear()
+    first = _get_decoder(64, 64, STRIDES)
+    for size in range(72, 136, 8):
+        _get_decoder(size, size, STRIDES)
+    last = _get_decoder(128, 128, STRIDES)
+
+    assert _cached_decoder.cache_info().currsize == 8
+    # The 9th size evicted the first one, which is created again
+    assert _get_decoder(128, 128, STRIDES) is last
+    assert _get_decoder(64, 64, STRIDES) is not first
+    assert _cached_decoder.cache_info().currsize == 8
+    _cached_decoder.cache_clear()
+
+class FakeSession:
+    """
+    An ONNX session returning fixed detections: every (score, x, y) entry puts a box on
+    the first anchor of that position of the stride 8 level, with zero box deltas.
+
+    Attributes:
+        inputs (list): The shape of every input batch it was run with.
+    """
+
+    def __init__(self, detections, batch=None, height=None, width=None):
+        self.detections = detections
+        self.shape = [batch or "batch", 3, height or "height", width or "width"]
+        self.inputs = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input", shape=self.shape)]
+
+    def run(self, output_names, feed):
+        batch = feed["input"]
+        self.inputs.append(batch.shape)
+        batch_size, _, height, width = batch.shape
+        cls_heads = [np.zeros((batch_size, 9, height // stride, width // stride), dtype=np.float32) for stride in STRIDES]
+        box_heads = [np.zeros((batch_size, 36, height // stride, width // stride), dtype=np.float32) for stride in STRIDES]
+        for score, x, y in self.detections:
+            cls_heads[0][:, 0, y, x] = score
+        return cls_heads + box_heads
+
+def anchor_box(x, y):
+    """
+    The box FakeSession detects at a position of the stride 8 level, in the run input pixels.
+    """
+    # The first anchor is 32 pixels wide and centered on the 8 pixel cell
+    return [8 * x - 12, 8 * y - 12, 8 * x + 20, 8 * y + 20]
+
+def test_roi_maps_the_boxes_back_to_the_whole_image():
+    session = FakeSession([(0.9, 2, 3)])
+    image = Image.new("RGB", (1280, 768))
+
+    # A 512x256 crop run at half its size, like a frame decoded at twice the processed size
+    scores, boxes, labels, severity, percentage_area, _ = image_inference(
+        image, 0.75, 0.04, session, _proc_img_width=640, _proc_img_height=384,
+        roi=(256, 128, 768, 384), roi_size=(256, 128))
+
+    assert session.inputs == [(1, 3, 128, 256)]
+    assert scores.tolist() == pytest.approx([0.9])
+    x1, y1, x2, y2 = anchor_box(2, 3)
+    assert boxes[0] == pytest.approx([256 + 2 * x1, 128 + 2 * y1, 256 + 2 * x2, 128 + 2 * y2])
+    # The 64x64 box of the whole image is a 32x32 box of the 640x384 processed image
+    assert percentage_area == pytest.approx(32 * 32 / (640 * 384))
+    assert severity == pytest.approx(percentage_area / 0.04)
+
+def test_roi_severity_matches_the_whole_frame():
+    image = Image.new("RGB", (640, 384))
+    session = FakeSession([(0.9, 2, 3), (0.8, 10, 5)])
+
+    roi_result = image_inference(image, 0.75, 0.04, session, roi=(128, 64, 384, 192), roi_size=(256, 128))
+    # The same detections, 16 cells right and 8 cells down of the crop, on the whole frame
+    frame_session = FakeSession([(0.9, 18, 11), (0.8, 26, 13)])
+    frame_result = image_inference(image, 0.75, 0.04, frame_session)
+
+    assert np.array_equal(roi_result[0], frame_result[0])
+    assert np.allclose(roi_result[1], frame_result[1])
+    assert roi_result[3:5] == pytest.approx(frame_result[3:5])
+
+def baseline_preprocess_image(image):
+    """
+    The float64 preprocessing of inference.py before the lookup table, kept as the reference.
+    image_inference cast its result to float32.
+    """
+    img_arr = np.array(image).astype(np.float32) / 255.0
+    img_arr = np.transpose(img_arr, (2, 0, 1))
+    mean = np.array([0.485, 0.456, 0.406]).reshape((3, 1, 1))
+    std = np.array([0.229, 0.224, 0.225]).reshape((3, 1, 1))
+    img_arr = (img_arr - mean) / std
+    return img_arr.astype(np.float32)
+
+def assert_bitwise_equal(values, expected):
+    assert values.dtype == expected.dtype and values.shape == expected.shape
+    assert values.tobytes() == expected.tobytes()
+
+def test_preprocessing_is_bitwise_identical_to_the_float64_path():
+    rng = np.random.default_rng(0)
+    # Every pixel value in every channel, then random frames
+    frames = [np.broadcast_to(np.arange(256, dtype=np.uint8)[None, :, None], (2, 256, 3))]
+    frames += [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for height, width in ((384, 640), (7, 13))]
+    for frame in frames:
+        image = Image.fromarray(np.ascontiguousarray(frame))
+        expected = baseline_preprocess_image(image)
+
+        assert_bitwise_equal(_preprocess_image(image), expected)
+        out = np.full((3,) + frame.shape[:2], np.nan, dtype=np.float32)
+        assert _preprocess_into(frame, out) is out
+        assert_bitwise_equal(out, expected)
+
+def test_model_input_is_the_float64_path_result():
+    image = Image.fromarray(np.random.default_rng(1).integers(0, 256, (384, 640, 3), dtype=np.uint8))
+    session = FakeSession([])
+    fed = []
+    run = session.run
+    session.run = lambda output_names, feed: fed.append(feed["input"].copy()) or run(output_names, feed)
+
+    image_inference(image, 0.75, 0.04, session)
+
+    assert_bitwise_equal(fed[0], baseline_preprocess_image(image)[None])
+
+def test_input_buffer_is_reused_per_thread_and_shape():
+    buffer = _get_input_buffer(1, 384, 640)
+    assert buffer.shape == (1, 3, 384, 640) and buffer.dtype == np.float32
+    assert _get_input_buffer(1, 384, 640) is buffer
+
+    other_threads = []
+    thread = threading.Thread(target=lambda: other_threads.append(_get_input_buffer(1, 384, 640)))
+    thread.start()
+    thread.join()
+    # Threads running inference at the same time never share a buffer
+    assert other_threads[0] is not buffer
+
+    resized = _get_input_buffer(2, 384, 640)
+    assert resized.shape == (2, 3, 384, 640)
+    assert _get_input_buffer(1, 384, 640) is not buffer
+
+class GraySession(FakeSession):
+    """
+    A FakeSession detecting one box per frame, on the column of the stride 8 level
+    given by the gray level of the top left pixel of the frame.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__([], **kwargs)
+
+    def run(self, output_names, feed):
+        outs = super().run(output_names, feed)
+        batch = feed["input"]
+        for index in range(batch.shape[0]):
+            gray = round((batch[index, 0, 0, 0] * 0.229 + 0.485) * 255)
+            outs[0][index, 0, 1, gray % outs[0].shape[-1]] = 0.9
+        return outs
+
+def gray_images(*grays):
+    return [Image.new("RGB", (512, 256), (gray, gray, gray)) for gray in grays]
+
+def assert_same_results(results, expected):
+    assert len(results) == len(expected)
+    for result, expected_result in zip(results, expected):
+        assert np.array_equal(result[0], expected_result[0])
+        assert result[1] == expected_result[1]
+        assert np.array_equal(result[2], expected_result[2])
+        assert result[3:5] == expected_result[3:5]
+
+def test_batch_runs_all_frames_at_once():
+    session = GraySession()
+    images = gray_images(3, 9, 20)
+
+    results = image_inference_batch(images, 0.75, 0.04, session, _proc_img_width=256, _proc_img_height=128)
+
+    assert session.inputs == [(3, 3, 128, 256)]
+    serial = [image_inference(image, 0.75, 0.04, GraySession(), _proc_img_width=256, _proc_img_height=128)
+              for image in images]
+    assert_same_results(results, serial)
+    assert [result[1][0][0] for result in results] == pytest.approx([2 * (8 * x - 12) for x in (3, 9, 20)])
+
+def test_fixed_batch_model_runs_in_chunks_and_ignores_unused_slots():
+    session = GraySession(batch=2)
+    images = gray_images(3, 9, 20)
+
+    results = image_inference_batch(images, 0.75, 0.04, session, _proc_img_width=256, _proc_img_height=128)
+
+    assert session.inputs == [(2, 3, 128, 256), (2, 3, 128, 256)]
+    # The second slot of the last chunk still holds the frame of gray 9, which is not returned again
+    serial = [image_inference(image, 0.75, 0.04, GraySession(), _proc_img_width=256, _proc_img_height=128)
+              for image in images]
+    assert_same_results(results, serial)
+
+def test_batch_size_one_model_runs_every_frame():
+    session = GraySession(batch=1)
+
+    results = image_inference_batch(gray_images(3, 9), 0.75, 0.04, session, _proc_img_width=256, _proc_img_height=128)
+
+    assert session.inputs == [(1, 3, 128, 256)] * 2
+    assert [len(result[0]) for result in results] == [1, 1]
+
+def test_batch_records_the_stage_timings():
+    timings = {}
+    image_inference_batch(gray_images(3, 9), 0.75, 0.04, GraySession(), _proc_img_width=256, _proc_img_height=128,
+                          timings=timings)
+    assert set(timings) == {"resize", "preprocess", "run", "postprocess"}
+
+def run_cascade(screen_detections, score_gate=0.5, area_gate=0.0):
+    """
+    Runs the cascade on a 512x256 frame, screened at 256x128 and confirmed at 512x256.
+
+    Returns:
+        tuple: The result, whether it was confirmed, the full session and the timings.
+    """
+    screen_session = FakeSession(screen_detections)
+    full_session = FakeSession([(0.95, 4, 4)])
+    timings = {}
+    result, confirmed = image_inference_cascade(Image.new("RGB", (512, 256)), 0.75, 0.04, full_session,
+                                                screen_session, (256, 128), score_gate=score_gate,
+                                                area_gate=area_gate, _proc_img_width=512, _proc_img_height=256,
+                                                timings=timings)
+    assert screen_session.inputs == [(1, 3, 128, 256)]
+    return result, confirmed, full_session, timings
+
+def test_clean_screening_is_not_confirmed():
+    result, confirmed, full_session, timings = run_cascade([(0.3, 2, 3)])
+
+    assert not confirmed
+    assert full_session.inputs == []
+    assert len(result[0]) == 0 and result[3] == 0
+    assert "screen" in timings
+
+def test_screening_score_gate_confirms_at_full_resolution():
+    # Below scores_threshold, the screening box still reaches the score gate
+    result, confirmed, full_session, timings = run_cascade([(0.6, 2, 3)], score_gate=0.5)
+
+    assert confirmed
+    assert full_session.inputs == [(1, 3, 256, 512)]
+    expected = image_inference(Image.new("RGB", (512, 256)), 0.75, 0.04, FakeSession([(0.95, 4, 4)]),
+                               _proc_img_width=512, _proc_img_height=256)
+    assert result[0].tolist() == expected[0].tolist() == pytest.approx([0.95])
+    assert result[1] == expected[1]
+    assert result[3:5] == expected[3:5]
+    assert {"screen", "run"} <= set(timings)
+
+@pytest.mark.parametrize("area_gate, confirmed", [(0.03, True), (0.05, False)])
+def test_screening_area_gate(area_gate, confirmed):
+    # A 32x32 box covers 3.1% of the 256x128 screening input
+    _, result_confirmed, full_session, _ = run_cascade([(0.9, 2, 3)], score_gate=1.0, area_gate=area_gate)
+
+    assert result_confirmed == confirmed
+    assert len(full_session.inputs) == int(confirmed)
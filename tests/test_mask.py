@@ -0,0 +1,70 @@
+import math
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from octoprint_pinozcam.mask import CompiledMask, decode_mask, encode_mask
+
+def draw_mask(mask_image_data, input_image):
+    """
+    The apply_mask_to_image of the plugin before CompiledMask, kept as the reference.
+    """
+    # Decompress the mask_image_data into a 2D boolean array
+    mask_matrix = [[char == '1' for char in mask_image_data[i:i+64]] for i in range(0, len(mask_image_data), 64)]
+
+    # Create a drawing context for the input image
+    draw = ImageDraw.Draw(input_image)
+
+    # Draw black rectangles on the input image based on the mask_matrix
+    block_width = math.ceil(input_image.size[0] / 64)
+    block_height = math.ceil(input_image.size[1] / 64)
+    for i in range(64):
+        for j in range(64):
+            if mask_matrix[i][j]:
+                x, y = j * block_width, i * block_height
+                draw.rectangle((x, y, x + block_width, y + block_height), fill=(0, 0, 0))
+
+    return input_image
+
+def random_mask(rng):
+    """
+    Returns a legacy '0'/'1' mask of a few random rectangles of cells, or of random cells.
+    """
+    if rng.uniform() < 0.3:
+        grid = rng.uniform(size=(64, 64)) < 0.2
+    else:
+        grid = np.zeros((64, 64), dtype=bool)
+        for _ in range(rng.integers(1, 5)):
+            top, left = rng.integers(0, 64, 2)
+            bottom, right = rng.integers([top + 1, left + 1], 65)
+            grid[top:bottom, left:right] = True
+    return "".join("1" if cell else "0" for cell in grid.ravel())
+
+def random_image(rng, size):
+    return Image.fromarray(rng.integers(1, 256, (size[1], size[0], 3), dtype=np.uint8))
+
+SIZES = [(640, 480), (1280, 720), (1920, 1080), (97, 61), (64, 64)]
+
+@pytest.mark.parametrize("size", SIZES)
+def test_apply_matches_the_former_rectangles(size):
+    rng = np.random.default_rng(size[0] * size[1])
+    for _ in range(20):
+        mask_image_data = random_mask(rng)
+        image = random_image(rng, size)
+
+        expected = draw_mask(mask_image_data, image.copy())
+        result = CompiledMask(mask_image_data).apply(image.copy())
+
+        assert np.array_equal(np.asarray(result), np.asarray(expected))
+
+@pytest.mark.parametrize("size", SIZES[:2])
+def test_run_length_encoding_applies_the_same_mask(size):
+    rng = np.random.default_rng(0)
+    mask_image_data = random_mask(rng)
+    encoded = encode_mask(decode_mask(mask_image_data))
+    image = random_image(rng, size)
+
+    assert encoded.startswith("rle:64:")
+    assert np.array_equal(np.asarray(CompiledMask(encoded).apply(image.copy())),
+                          np.asarray(CompiledMask(mask_image_data).apply(image.copy())))
@@ -0,0 +1,25 @@
+import logging
+
+from octoprint_pinozcam import PinozcamPlugin
+
+def test_scrape_does_not_create_http_endpoints():
+    plugin = PinozcamPlugin()
+    plugin._logger = logging.getLogger("test")
+
+    text = plugin.metrics.render()
+
+    assert 'pinozcam_circuit_state{endpoint="discord"} 0' in text
+    assert plugin.http.status() == {}
+
+def test_circuit_state_reports_an_open_breaker():
+    plugin = PinozcamPlugin()
+    plugin._logger = logging.getLogger("test")
+    breaker = plugin.http.endpoint("telegram").breaker
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure("HTTP 500")
+
+    text = plugin.metrics.render()
+
+    assert 'pinozcam_circuit_state{endpoint="telegram"} 2' in text
+    assert 'pinozcam_circuit_state{endpoint="camera"} 0' in text
+    assert set(plugin.http.status()) == {"telegram"}
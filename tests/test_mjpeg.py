@@ -0,0 +1,174 @@
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from octoprint_pinozcam import PinozcamPlugin
+from octoprint_pinozcam.httpclient import HttpEndpoint
+from octoprint_pinozcam.mjpeg import EOI, MjpegParser, MjpegStream
+
+BOUNDARY = b"frame"
+
+def make_jpeg(color):
+    buffered = BytesIO()
+    Image.new("RGB", (32, 24), color).save(buffered, format="JPEG")
+    return buffered.getvalue()
+
+def make_part(jpeg, content_length=True):
+    headers = b"--" + BOUNDARY + b"\r\nContent-Type: image/jpeg\r\n"
+    if content_length:
+        headers += b"Content-Length: " + str(len(jpeg)).encode() + b"\r\n"
+    return headers + b"\r\n" + jpeg + b"\r\n"
+
+def feed_in_chunks(parser, data, size):
+    frames = []
+    for start in range(0, len(data), size):
+        frames.extend(parser.feed(data[start:start + size]))
+    return frames
+
+JPEGS = [make_jpeg(color) for color in ("red", "green", "blue")]
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+@pytest.mark.parametrize("content_length", [True, False])
+def test_parser_splits_parts_at_any_chunk_size(chunk_size, content_length):
+    stream = b"".join(make_part(jpeg, content_length) for jpeg in JPEGS)
+
+    frames = feed_in_chunks(MjpegParser(), stream, chunk_size)
+
+    assert frames == JPEGS
+
+def test_parser_cuts_by_content_length_past_an_embedded_end_marker():
+    # An end marker inside the data, e.g. in an EXIF thumbnail, must not end the frame
+    jpeg = JPEGS[0][:-2] + EOI + b"tail" + EOI
+
+    frames = MjpegParser().feed(make_part(jpeg) + make_part(JPEGS[1]))
+
+    assert frames == [jpeg, JPEGS[1]]
+
+def test_parser_discards_oversized_parts_and_resyncs():
+    parser = MjpegParser(max_frame_bytes=len(JPEGS[1]) + 16)
+    oversized = JPEGS[0] + b"\x00" * (2 * parser.max_frame_bytes)
+
+    frames = feed_in_chunks(parser, make_part(oversized) + make_part(JPEGS[1]), 64)
+
+    assert frames == [JPEGS[1]]
+    assert parser.discarded >= 1
+
+class FakeStreamHandler(BaseHTTPRequestHandler):
+    """
+    Serves frames_per_connection frames of an MJPEG stream, then closes the connection.
+    """
+
+    def do_GET(self):
+        server = self.server
+        server.connections += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=" + BOUNDARY.decode())
+        self.end_headers()
+        for index in range(server.frames_per_connection):
+            self.wfile.write(make_part(JPEGS[index % len(JPEGS)], server.content_length))
+            self.wfile.flush()
+            time.sleep(0.01)
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def fake_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeStreamHandler)
+    server.daemon_threads = True
+    server.connections = 0
+    server.frames_per_connection = 3
+    server.content_length = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def stream_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/?action=stream"
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+@pytest.mark.parametrize("content_length", [True, False])
+def test_stream_reconnects_after_the_server_closes(fake_server, content_length):
+    fake_server.content_length = content_length
+    stream = MjpegStream(stream_url(fake_server), HttpEndpoint("stream", read_timeout=2.0), retry_delay=0.05)
+    stream.start()
+    try:
+        assert wait_until(lambda: stream.reconnects >= 2 and stream.frames >= 6)
+        jpeg, _, sequence = stream.wait_for_frame(0, timeout=2.0)
+        assert jpeg in JPEGS
+        assert sequence >= 1
+        assert stream.latest()[0] in JPEGS
+    finally:
+        stream.stop()
+    assert fake_server.connections >= 2
+    assert not stream.is_running()
+
+def test_backoff_starts_over_after_a_stream_delivered_frames(fake_server):
+    fake_server.frames_per_connection = 1
+    stream = MjpegStream(stream_url(fake_server), HttpEndpoint("stream", read_timeout=2.0), retry_delay=0.2)
+    stream.start()
+    try:
+        # Doubling delays of 0.2, 0.4, 0.8, 1.6 s would allow only 4 reconnects in 3 s
+        assert wait_until(lambda: stream.reconnects >= 8, timeout=3.0)
+    finally:
+        stream.stop()
+    assert stream.frames >= 8
+
+def make_plugin(tmp_path):
+    plugin = PinozcamPlugin()
+    plugin._logger = logging.getLogger("test")
+    snapshot_path = tmp_path / "snapshot.jpg"
+    snapshot_path.write_bytes(JPEGS[2])
+    plugin.custom_snapshot_url = f"file://{snapshot_path}"
+    plugin.snapshot_timeout = 0.2
+    return plugin
+
+def test_ai_falls_back_to_snapshots_without_stream_frames(tmp_path):
+    plugin = make_plugin(tmp_path)
+    # Nothing listens on the stream, so no frame ever arrives
+    plugin.mjpeg = MjpegStream("http://127.0.0.1:9/?action=stream", HttpEndpoint("stream", connect_timeout=0.1),
+                               retry_delay=0.05)
+    plugin.mjpeg.start()
+    try:
+        source = plugin._ai_snapshot_source()
+    finally:
+        plugin.mjpeg.stop()
+
+    assert source.data == JPEGS[2]
+
+def test_ai_takes_new_frames_after_the_stream_is_replaced(tmp_path, fake_server):
+    fake_server.frames_per_connection = 1000
+    plugin = make_plugin(tmp_path)
+    plugin.snapshot_timeout = 2.0
+    plugin.mjpeg_stream = True
+    plugin.mjpeg_stream_url = stream_url(fake_server)
+    plugin._start_mjpeg_stream()
+    try:
+        for _ in range(20):
+            assert plugin._ai_snapshot_source().data in JPEGS
+        assert plugin.mjpeg_sequence >= 20
+
+        # A settings save opens a new stream, counting from 0 again
+        plugin._start_mjpeg_stream()
+        start = time.monotonic()
+        source = plugin._ai_snapshot_source()
+        assert time.monotonic() - start < 1.0
+        assert plugin.mjpeg_sequence >= 1
+        assert source.data in JPEGS
+    finally:
+        plugin.mjpeg.stop()
@@ -0,0 +1,166 @@
+import numpy as np
+import pytest
+
+from octoprint_pinozcam.nms import NMS_METHODS, _greedy_keep, _sort_candidates, nms
+
+def baseline_nms(all_scores, all_boxes, all_classes, nms=0.5, ndetections=100):
+    """
+    The NMS of inference.py before the nms module, kept as the reference.
+    """
+    out_scores = np.zeros((ndetections,))
+    out_boxes = np.zeros((ndetections, 4))
+    out_classes = np.zeros((ndetections,))
+
+    # Discard null scores
+    keep = (all_scores > 0)
+    scores = all_scores[keep]
+    boxes = all_boxes[keep]
+    classes = all_classes[keep]
+
+    if scores.size == 0:
+        return out_scores, out_boxes, out_classes
+
+    # Sort boxes
+    indices = np.argsort(-scores)
+    scores = scores[indices]
+    boxes = boxes[indices]
+    classes = classes[indices]
+
+    areas = (boxes[:, 2] - boxes[:, 0] + 1) * (boxes[:, 3] - boxes[:, 1] + 1)
+    keep = np.ones(scores.size, dtype=bool)
+    for i in range(ndetections):
+        if i >= keep.sum() or i >= scores.size:
+            i -= 1
+            break
+
+        # Find overlapping boxes with lower score
+        xy1 = np.maximum(boxes[:, :2], boxes[i, :2])
+        xy2 = np.minimum(boxes[:, 2:], boxes[i, 2:])
+        inter = np.prod(np.maximum(0, xy2 - xy1 + 1), axis=1)
+
+        criterion = ((scores > scores[i]) |
+                     (inter / (areas + areas[i] - inter) <= nms) |
+                     (classes != classes[i]))
+        criterion[i] = True
+
+        # Only keep relevant boxes
+        scores = scores[criterion]
+        boxes = boxes[criterion]
+        classes = classes[criterion]
+        areas = areas[criterion]
+        keep = keep[criterion]
+
+    out_scores[:i + 1] = scores[:i + 1]
+    out_boxes[:i + 1] = boxes[:i + 1]
+    out_classes[:i + 1] = classes[:i + 1]
+
+    return out_scores[:i + 1], out_boxes[:i + 1], out_classes[:i + 1]
+
+def random_candidates(rng, count, classes=3, ties=False):
+    """
+    Returns float32 scores, boxes and classes like _detection_postprocess, with clusters of overlapping boxes.
+    """
+    centers = rng.uniform(20, 300, (max(1, count // 4), 2))[rng.integers(0, max(1, count // 4), count)]
+    half_sizes = rng.uniform(5, 40, (count, 2))
+    boxes = np.hstack([centers - half_sizes, centers + half_sizes]) + rng.normal(0, 4, (count, 4))
+    scores = rng.uniform(0, 1, count)
+    if ties:
+        scores = np.round(scores, 1)
+    scores[rng.uniform(size=count) < 0.1] = 0
+    # Without any candidate the baseline pads its result, see test_no_candidates_return_empty_arrays
+    scores[0] = max(scores[0], 0.05)
+    labels = rng.integers(0, classes, count)
+    return scores.astype(np.float32), boxes.astype(np.float32), labels.astype(np.float32)
+
+def assert_same_detections(result, expected):
+    for values, expected_values in zip(result, expected):
+        assert values.shape == expected_values.shape
+        assert values.dtype == expected_values.dtype
+        assert np.array_equal(values, expected_values)
+
+@pytest.mark.parametrize("count", [1, 5, 50, 400])
+@pytest.mark.parametrize("ndetections", [1, 6, 100])
+@pytest.mark.parametrize("ties", [False, True])
+def test_greedy_matches_the_baseline_on_multi_class_boxes(count, ndetections, ties):
+    rng = np.random.default_rng(count * ndetections)
+    for _ in range(10):
+        scores, boxes, labels = random_candidates(rng, count, ties=ties)
+        assert_same_detections(nms(scores, boxes, labels, ndetections=ndetections),
+                               baseline_nms(scores, boxes, labels, ndetections=ndetections))
+
+@pytest.mark.parametrize("block_size", [1, 7, 64])
+def test_greedy_blocks_keep_the_same_boxes(block_size):
+    rng = np.random.default_rng(block_size)
+    for _ in range(10):
+        scores, boxes, _ = _sort_candidates(*random_candidates(rng, 300, ties=True))
+        assert np.array_equal(_greedy_keep(scores, boxes, 0.5, 100, block_size=block_size),
+                              _greedy_keep(scores, boxes, 0.5, 100))
+
+def test_greedy_returns_as_few_detections_as_the_baseline():
+    # Only two boxes survive, so the baseline loop left through its i -= 1 exit
+    scores = np.array([0.9, 0.8, 0.7, 0.6], dtype=np.float32)
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 10, 10], [50, 50, 60, 60], [51, 50, 60, 60]], dtype=np.float32)
+    labels = np.zeros(4, dtype=np.float32)
+
+    result = nms(scores, boxes, labels, ndetections=6)
+
+    assert_same_detections(result, baseline_nms(scores, boxes, labels, ndetections=6))
+    assert result[0].tolist() == pytest.approx([0.9, 0.7])
+
+def test_tied_scores_suppress_the_later_box():
+    scores = np.array([0.5, 0.5, 0.5], dtype=np.float32)
+    boxes = np.array([[0, 0, 10, 10], [0, 0, 10, 10], [0, 0, 10, 10]], dtype=np.float32)
+    labels = np.array([0, 0, 1], dtype=np.float32)
+
+    for method in ("greedy", "fast"):
+        assert_same_detections(nms(scores, boxes, labels, ndetections=6, method=method),
+                               baseline_nms(scores, boxes, labels, ndetections=6))
+    assert nms(scores, boxes, labels, method="agnostic")[0].size == 1
+
+@pytest.mark.parametrize("count", [5, 50, 400])
+def test_agnostic_matches_the_baseline_with_one_class(count):
+    rng = np.random.default_rng(count)
+    for _ in range(10):
+        scores, boxes, labels = random_candidates(rng, count, ties=True)
+        result = nms(scores, boxes, labels, ndetections=6, method="agnostic")
+        expected = baseline_nms(scores, boxes, np.zeros_like(labels), ndetections=6)
+        assert_same_detections(result[:2], expected[:2])
+
+@pytest.mark.parametrize("count", [5, 50, 150])
+def test_fast_keeps_a_subset_of_greedy(count):
+    rng = np.random.default_rng(count)
+    for _ in range(10):
+        scores, boxes, labels = random_candidates(rng, count, ties=True)
+        fast = nms(scores, boxes, labels, ndetections=1000, method="fast")
+        greedy = nms(scores, boxes, labels, ndetections=1000)
+        greedy_rows = {tuple(box) for box in np.column_stack(greedy[1:])}
+        assert all(tuple(box) in greedy_rows for box in np.column_stack(fast[1:]))
+        assert np.all(np.diff(fast[0]) <= 0)
+
+def test_fast_suppresses_with_suppressed_boxes():
+    # b overlaps a and c, a does not overlap c: greedy keeps c, Fast NMS does not
+    scores = np.array([0.9, 0.8, 0.7], dtype=np.float32)
+    boxes = np.array([[0, 0, 10, 10], [4, 0, 14, 10], [8, 0, 18, 10]], dtype=np.float32)
+    labels = np.zeros(3, dtype=np.float32)
+
+    assert nms(scores, boxes, labels, nms=0.3)[0].tolist() == pytest.approx([0.9, 0.7])
+    assert nms(scores, boxes, labels, nms=0.3, method="fast")[0].tolist() == pytest.approx([0.9])
+
+@pytest.mark.parametrize("method", NMS_METHODS)
+@pytest.mark.parametrize("count", [0, 3])
+def test_no_candidates_return_empty_arrays(method, count):
+    # The baseline padded the result with ndetections zeros; it is empty now
+    scores = np.zeros(count, dtype=np.float32)
+    boxes = np.ones((count, 4), dtype=np.float32)
+    labels = np.zeros(count, dtype=np.float32)
+
+    out_scores, out_boxes, out_classes = nms(scores, boxes, labels, ndetections=6, method=method)
+
+    assert baseline_nms(scores, boxes, labels, ndetections=6)[0].shape == (6,)
+    assert out_scores.shape == (0,)
+    assert out_boxes.shape == (0, 4)
+    assert out_classes.shape == (0,)
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        nms(np.ones(1), np.ones((1, 4)), np.zeros(1), method="soft")
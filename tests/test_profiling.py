@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from octoprint_pinozcam import PinozcamPlugin
+from octoprint_pinozcam import profiling
+from octoprint_pinozcam.profiling import FrameProfiler, FrameTimer
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def perf_counter(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(profiling, "time", SimpleNamespace(perf_counter=clock.perf_counter, strftime=time.strftime))
+    return clock
+
+def test_frame_timer_records_every_stage(clock):
+    timer = FrameTimer()
+    with timer.stage("snapshot"):
+        clock.now += 0.012
+    with timer.stage("inference"):
+        clock.now += 0.1
+    # A stage timed twice in a frame accumulates
+    with timer.stage("snapshot"):
+        clock.now += 0.003
+    timer.add("frame_age", 40.0)
+
+    record = timer.record()
+
+    assert list(record) == ["snapshot", "inference", "frame_age", "total"]
+    assert record == pytest.approx({"snapshot": 15.0, "inference": 100.0, "frame_age": 40.0, "total": 115.0})
+
+def test_frame_timer_records_a_failed_stage(clock):
+    timer = FrameTimer()
+    with pytest.raises(RuntimeError):
+        with timer.stage("inference"):
+            clock.now += 0.005
+            raise RuntimeError("model failed")
+    assert timer.stages == pytest.approx({"inference": 5.0})
+
+def run_frames(profiler, frames):
+    for _ in range(frames):
+        profiler.tick()
+        sum(range(1000))
+
+def test_profiler_writes_the_profiled_frames(tmp_path):
+    profiler = FrameProfiler(str(tmp_path))
+    assert profiler.start(3)
+    # Refused while the first one has not finished
+    assert not profiler.start(3)
+
+    run_frames(profiler, 3)
+    assert profiler.status()["running"] and profiler.status()["framesLeft"] == 1
+    profiler.tick()
+
+    status = profiler.status()
+    assert not status["running"] and not status["pending"]
+    assert status["lastProfile"].endswith("-3frames.prof")
+    base_path = profiler.last_profile[:-len(".prof")]
+    assert os.path.getsize(base_path + ".prof") > 0
+    with open(base_path + ".txt") as summary:
+        assert "cumulative" in summary.read()
+    assert profiler.start(1)
+
+def test_stopping_writes_the_frames_profiled_so_far(tmp_path):
+    profiler = FrameProfiler(str(tmp_path))
+    profiler.start(10)
+    run_frames(profiler, 4)
+
+    profiler.stop()
+
+    assert profiler.last_profile.endswith("-3frames.prof")
+    assert not profiler.status()["running"]
+
+def test_old_profiles_are_pruned(tmp_path):
+    for second in range(6):
+        for extension in (".prof", ".txt"):
+            (tmp_path / f"profile-20000101-00000{second}-1frames{extension}").write_text("")
+    (tmp_path / "other.txt").write_text("")
+    profiler = FrameProfiler(str(tmp_path))
+    profiler.start(1)
+
+    run_frames(profiler, 2)
+
+    profiles = sorted(name for name in os.listdir(tmp_path) if name.endswith(".prof"))
+    assert len(profiles) == 5
+    assert profiles[:4] == [f"profile-20000101-00000{second}-1frames.prof" for second in range(2, 6)]
+    assert profiles[-1] == os.path.basename(profiler.last_profile)
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".txt")]) == 6
+
+def test_profiler_rejects_no_frames():
+    with pytest.raises(ValueError):
+        FrameProfiler().start(0)
+
+@pytest.fixture
+def plugin(tmp_path):
+    plugin = PinozcamPlugin()
+    plugin._logger = logging.getLogger("test")
+    plugin.profiler = FrameProfiler(str(tmp_path))
+    return plugin
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+def test_profile_routes(plugin, app):
+    plugin.last_frame_timings = {"snapshot": 12.5, "total": 80.0}
+
+    with app.test_request_context("/profile/download"):
+        assert plugin.download_profile().status_code == 404
+    with app.test_request_context("/profile", method="POST", json={"frames": 2}):
+        response = plugin.start_profile()
+        assert response.status_code == 200
+        assert json.loads(response.get_data())["pending"]
+    with app.test_request_context("/profile", method="POST", json={"frames": 2}):
+        assert plugin.start_profile().status_code == 409
+
+    run_frames(plugin.profiler, 3)
+
+    with app.test_request_context("/profile"):
+        data = json.loads(plugin.profile_status().get_data())
+    assert data["frameTimings"] == {"snapshot": 12.5, "total": 80.0}
+    assert data["lastProfile"].endswith("-2frames.prof")
+    with app.test_request_context("/profile/download"):
+        response = plugin.download_profile()
+        response.direct_passthrough = False
+        assert response.status_code == 200
+        with open(plugin.profiler.last_profile, "rb") as profile_file:
+            assert response.get_data() == profile_file.read()
+        response.close()
+    with app.test_request_context("/profile/download?format=txt"):
+        response = plugin.download_profile()
+        response.direct_passthrough = False
+        assert b"cumulative" in response.get_data()
+        response.close()
+
+@pytest.mark.parametrize("body", [{"frames": 0}, {"frames": 1001}, {"frames": "many"}])
+def test_profile_route_rejects_invalid_frames(plugin, app, body):
+    with app.test_request_context("/profile", method="POST", json=body):
+        assert plugin.start_profile().status_code == 400
+    assert not plugin.profiler.status()["pending"]
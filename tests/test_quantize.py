@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from octoprint_pinozcam.benchmark import synthetic_model
+from octoprint_pinozcam.quantize import _iou, compare_models, quantize_model
+
+def test_iou_counts_the_edge_pixels():
+    box = np.array([0, 0, 9, 9], dtype=np.float64)
+    boxes = np.array([[0, 0, 9, 9], [5, 0, 14, 9], [10, 0, 19, 9]], dtype=np.float64)
+    # 50 of the 100 pixels are shared with the second box, none with the third
+    assert _iou(box, boxes).tolist() == pytest.approx([1.0, 50 / 150, 0.0])
+
+@pytest.fixture
+def models(tmp_path):
+    float_model = tmp_path / "float.onnx"
+    float_model.write_bytes(synthetic_model())
+    int8_model = tmp_path / "int8_dynamic.onnx"
+    quantize_model(str(float_model), str(int8_model), mode="dynamic")
+    return str(float_model), str(int8_model)
+
+@pytest.fixture
+def frames_dir(tmp_path):
+    rng = np.random.default_rng(0)
+    frames = tmp_path / "frames"
+    frames.mkdir()
+    for index in range(3):
+        pixels = rng.integers(0, 256, (384, 640, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(frames / f"frame{index}.png")
+    return str(frames)
+
+def test_compare_float_and_dynamic_int8(models, frames_dir):
+    report = compare_models(*models, frames_dir, scores_threshold=0.5)
+    summary = report["summary"]
+
+    assert summary["frames"] == len(report["frames"]) == 3
+    assert [record["frame"] for record in report["frames"]] == ["frame0.png", "frame1.png", "frame2.png"]
+    assert summary["float_latency_ms"] > 0 and summary["int8_latency_ms"] > 0
+    assert 0.0 <= summary["mean_overlap"] <= 1.0
+    assert summary["max_abs_severity_diff"] >= summary["mean_abs_severity_diff"] >= 0.0
+
+def test_compare_a_model_with_itself_agrees(models, frames_dir):
+    float_model, _ = models
+    report = compare_models(float_model, float_model, frames_dir, scores_threshold=0.5)
+
+    assert any(record["float_boxes"] for record in report["frames"])
+    assert report["summary"]["mean_overlap"] == 1.0
+    assert report["summary"]["max_abs_severity_diff"] == 0.0
+    assert report["summary"]["failure_disagreements"] == 0
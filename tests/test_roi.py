@@ -0,0 +1,36 @@
+import numpy as np
+
+from octoprint_pinozcam.mask import encode_mask
+from octoprint_pinozcam.roi import fit_roi, unmasked_region
+
+PROC_SIZE = (640, 384)
+
+def quarter_mask():
+    """
+    A mask leaving only the top left quarter of the 64x64 grid unmasked.
+    """
+    grid = np.ones((64, 64), dtype=bool)
+    grid[:32, :32] = False
+    return encode_mask(grid)
+
+def test_unmasked_region_follows_the_mask_cells():
+    assert unmasked_region(quarter_mask(), PROC_SIZE) == (0, 0, 320, 192)
+    assert unmasked_region("1" * 64 * 64, PROC_SIZE) is None
+
+def test_dynamic_input_runs_the_crop_at_its_own_scale():
+    crop, run_size = fit_roi(unmasked_region(quarter_mask(), PROC_SIZE), PROC_SIZE, PROC_SIZE, True)
+    assert run_size == (384, 256)
+    assert crop == (0, 0, 384, 256)
+
+def test_crop_keeps_the_scale_of_the_processed_image():
+    image_size = (1280, 768)
+    crop, run_size = fit_roi(unmasked_region(quarter_mask(), image_size), image_size, PROC_SIZE, True)
+    assert run_size == (384, 256)
+    assert crop == (0, 0, 768, 512)
+
+def test_fixed_input_has_no_crop():
+    # Resized to the fixed input, the crop would run as many pixels as the whole frame
+    assert fit_roi(unmasked_region(quarter_mask(), PROC_SIZE), PROC_SIZE, PROC_SIZE, False) == (None, None)
+
+def test_no_crop_without_a_mask():
+    assert fit_roi(unmasked_region("0" * 64 * 64, PROC_SIZE), PROC_SIZE, PROC_SIZE, True) == (None, None)
@@ -0,0 +1,25 @@
+import pytest
+
+from octoprint_pinozcam.scheduler import FrameScheduler
+
+def started_scheduler(temperature, **settings):
+    scheduler = FrameScheduler(temperature=lambda: temperature, **settings)
+    scheduler.wait(lambda: True)
+    return scheduler
+
+def test_defaults_check_frames_back_to_back():
+    scheduler = started_scheduler(40.0)
+
+    assert scheduler.next_delay(now=scheduler._frame_start + 2.0) == 0.0
+
+def test_thermal_steps_slow_down_a_full_duty_cycle():
+    scheduler = started_scheduler(76.0)
+
+    # 2 s busy at a slowdown of 4 makes an 8 s period, so 6 s of rest
+    assert scheduler.next_delay(now=scheduler._frame_start + 2.0) == pytest.approx(6.0)
+
+def test_duty_cycle_and_rate_limit_the_next_frame():
+    scheduler = started_scheduler(40.0, frames_per_minute=30, max_duty_cycle=0.5)
+
+    assert scheduler.next_delay(now=scheduler._frame_start + 0.5) == pytest.approx(1.5)
+    assert scheduler.next_delay(now=scheduler._frame_start + 3.0) == pytest.approx(3.0)
@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+import onnx
+from onnx import TensorProto, helper
+
+from octoprint_pinozcam.session import SessionManager
+
+def write_model(path, scale, shape=(1, 4)):
+    """
+    Writes a small model computing y = x * scale + scale, which the optimizer can fold.
+    """
+    scale_tensor = helper.make_tensor("scale", TensorProto.FLOAT, [1], [scale])
+    graph = helper.make_graph(
+        [helper.make_node("Mul", ["x", "scale"], ["scaled"]),
+         helper.make_node("Add", ["scaled", "scale"], ["y"])],
+        "model",
+        [helper.make_tensor_value_info("x", TensorProto.FLOAT, list(shape))],
+        [helper.make_tensor_value_info("y", TensorProto.FLOAT, list(shape))],
+        [scale_tensor])
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, str(path))
+
+def cache_entries(cache_dir):
+    return sorted(name for name in os.listdir(cache_dir) if not name.endswith(".tmp"))
+
+def test_models_sharing_a_cache_keep_their_own_entries(tmp_path, caplog):
+    cache_dir = tmp_path / "model_cache"
+    model_path = tmp_path / "nozcam.bin"
+    screen_path = tmp_path / "nozcam_screen.onnx"
+    write_model(model_path, 2.0)
+    write_model(screen_path, 3.0)
+
+    for path in (model_path, screen_path):
+        SessionManager(str(path), cache_dir=str(cache_dir)).load()
+    entries = cache_entries(cache_dir)
+    assert len(entries) == 2
+
+    caplog.set_level("INFO")
+    sessions = [SessionManager(str(path), cache_dir=str(cache_dir)).load() for path in (model_path, screen_path)]
+
+    assert cache_entries(cache_dir) == entries
+    assert sum("loaded from optimized model cache" in message for message in caplog.messages) == 2
+    x = np.ones((1, 4), dtype=np.float32)
+    assert sessions[0].run(None, {"x": x})[0].tolist() == [[4.0] * 4]
+    assert sessions[1].run(None, {"x": x})[0].tolist() == [[6.0] * 4]
+
+def test_prune_removes_stale_entries_of_the_same_model_only(tmp_path):
+    cache_dir = tmp_path / "model_cache"
+    cache_dir.mkdir()
+    model_path = tmp_path / "nozcam.bin"
+    write_model(model_path, 2.0)
+    stale = ["nozcam-nozcam-0000000000000000-all-ort1.0-x86_64.onnx"]
+    kept = ["nozcam-nozcam_screen-0000000000000000-all-ort1.0-x86_64.onnx", "unrelated.onnx"]
+    for name in stale + kept:
+        (cache_dir / name).write_bytes(b"")
+
+    manager = SessionManager(str(model_path), cache_dir=str(cache_dir)).load()
+
+    entries = cache_entries(cache_dir)
+    assert entries == sorted(kept + [manager._cache_name(model_path.read_bytes())])
+
+class CountingSession:
+    """
+    Wraps an InferenceSession and counts its plain runs.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.plain_runs = 0
+
+    def run(self, *args):
+        self.plain_runs += 1
+        return self.session.run(*args)
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+def test_alternating_input_shapes_keep_their_bindings(tmp_path):
+    model_path = tmp_path / "nozcam.bin"
+    write_model(model_path, 2.0, shape=(1, "width"))
+    manager = SessionManager(str(model_path)).load()
+    manager._session = CountingSession(manager._session)
+
+    # Like the screening and full-size frames of the cascade on a dynamic-input model
+    for _ in range(3):
+        for width in (2, 4):
+            x = np.full((1, width), width, dtype=np.float32)
+            assert manager.run(None, {"x": x})[0].tolist() == [[width * 2.0 + 2.0] * width]
+
+    assert manager._session.plain_runs == 2
@@ -0,0 +1,57 @@
+import logging
+import threading
+import time
+
+from octoprint_pinozcam import PinozcamPlugin
+
+class SlowPluginManager:
+    def __init__(self, delay):
+        self.delay = delay
+        self.messages = []
+
+    def send_plugin_message(self, identifier, data):
+        time.sleep(self.delay)
+        self.messages.append((identifier, data))
+
+def make_plugin(delay):
+    plugin = PinozcamPlugin()
+    plugin._logger = logging.getLogger("test")
+    plugin._identifier = "pinozcam"
+    plugin._plugin_manager = SlowPluginManager(delay)
+    plugin.status_push_thread = threading.Thread(target=plugin._status_push_loop, daemon=True)
+    plugin.status_push_thread.start()
+    return plugin
+
+def test_push_returns_while_the_socket_is_slow():
+    plugin = make_plugin(delay=0.5)
+
+    start = time.monotonic()
+    for _ in range(10):
+        plugin._push_status(new_frame=True)
+    assert time.monotonic() - start < 0.1
+
+    time.sleep(1.5)
+    messages = plugin._plugin_manager.messages
+    # Pushes scheduled while one was being sent are merged, the last one has the latest status
+    assert 1 <= len(messages) <= 3
+    assert messages[-1] == ("pinozcam", plugin._status_data())
+    assert messages[-1][1]["frameSequence"] == 10
+
+def test_new_frames_expire_the_preview():
+    plugin = make_plugin(delay=0.0)
+    frame = plugin.frame_cache.get(lambda: b"before")
+
+    plugin._push_status(new_frame=True)
+
+    assert plugin.frame_cache.get(lambda: b"after").jpeg == b"after"
+    assert frame.jpeg == b"before"
+
+def test_shutdown_stops_the_push_thread():
+    plugin = make_plugin(delay=0.0)
+
+    plugin.on_shutdown()
+
+    assert not plugin.status_push_thread.is_alive()
+    plugin._push_status()
+    time.sleep(0.1)
+    assert plugin._plugin_manager.messages == []
@@ -0,0 +1,141 @@
+import os
+import signal
+import threading
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from octoprint_pinozcam import worker as worker_module
+from octoprint_pinozcam.benchmark import synthetic_model
+from octoprint_pinozcam.session import SessionManager
+from octoprint_pinozcam.worker import InferenceWorker, WorkerError, run_inference
+
+OPTIONS = dict(scores_threshold=0.3, img_sensitivity=0.04, _proc_img_width=256, _proc_img_height=128)
+
+def random_image(width, height, seed=0):
+    return Image.fromarray(np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8))
+
+@pytest.fixture
+def config(tmp_path):
+    model_path = tmp_path / "nozcam.onnx"
+    model_path.write_bytes(synthetic_model())
+    return {"session": {"model_path": str(model_path)}}
+
+@pytest.fixture
+def make_worker():
+    workers = []
+
+    def make(config, **settings):
+        settings.setdefault("memory_limit_mb", 0)
+        worker = InferenceWorker(config, **settings)
+        workers.append(worker)
+        return worker
+
+    yield make
+    for worker in workers:
+        worker.stop()
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+@pytest.mark.parametrize("frame_ring_slots", [0, 3])
+def test_started_worker_answers_like_the_plugin(config, make_worker, frame_ring_slots):
+    worker = make_worker(config, frame_ring_slots=frame_ring_slots)
+    worker.start()
+
+    assert worker.is_alive()
+    assert worker.dynamic_input
+    assert not worker.cascade
+    image = random_image(320, 240)
+    result, confirmed = worker.infer(image, OPTIONS)
+    expected, _ = run_inference(image, SessionManager(**config["session"]).load(), None, OPTIONS)
+    assert confirmed is None
+    assert np.allclose(result[0], expected[0])
+    assert result[3] == expected[3]
+    if frame_ring_slots:
+        assert not worker._ring._pinned
+
+def test_unanswered_request_kills_the_worker(config, make_worker):
+    worker = make_worker(config, timeout=0.5)
+    worker.start()
+    os.kill(worker._process.pid, signal.SIGSTOP)
+
+    with pytest.raises(WorkerError, match="timed out"):
+        worker.infer(random_image(320, 240), OPTIONS)
+
+    assert not worker.is_alive()
+    assert not worker._ring._pinned
+
+def test_crash_mid_request_restarts_after_the_delay(config, make_worker):
+    worker = make_worker(config, restart_delay=0.5)
+    worker.start()
+    pid = worker._process.pid
+    # Stopped, the worker takes the request but never answers it
+    os.kill(pid, signal.SIGSTOP)
+    errors = []
+
+    def infer():
+        try:
+            worker.infer(random_image(320, 240), OPTIONS)
+        except WorkerError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=infer)
+    thread.start()
+    # The slot of the frame stays pinned while the request is in flight
+    assert wait_until(lambda: worker._ring is not None and worker._ring._pinned)
+    os.kill(pid, signal.SIGKILL)
+    thread.join(5.0)
+
+    assert "crashed" in str(errors[0])
+    assert not worker._ring._pinned
+    with pytest.raises(WorkerError, match="restarts in"):
+        worker.infer(random_image(320, 240), OPTIONS)
+    time.sleep(0.6)
+    result, _ = worker.infer(random_image(320, 240), OPTIONS)
+    assert worker.restarts == 1
+    assert worker._process.pid != pid
+    assert result[3] >= 0
+
+def test_failed_starts_back_off_exponentially(tmp_path, make_worker):
+    worker = make_worker({"session": {"model_path": str(tmp_path / "missing.onnx")}}, restart_delay=0.5)
+    delays = []
+    for _ in range(3):
+        with pytest.raises(WorkerError, match="Failed to load model"):
+            worker.start()
+        delays.append(worker._next_start - time.monotonic())
+
+    assert delays == pytest.approx([0.5, 1.0, 2.0], abs=0.1)
+    with pytest.raises(WorkerError, match="restarts in"):
+        worker.infer(random_image(32, 24), OPTIONS)
+
+def test_memory_limit_fails_a_runaway_request(config, make_worker):
+    worker = make_worker(config, memory_limit_mb=400)
+    worker.start()
+
+    # An 8192x8192 input alone needs 768 MB of float32
+    with pytest.raises(RuntimeError, match="MemoryError"):
+        worker.infer(random_image(320, 240), dict(OPTIONS, _proc_img_width=8192, _proc_img_height=8192))
+
+    assert worker.is_alive()
+    result, _ = worker.infer(random_image(320, 240), OPTIONS)
+    assert result[3] >= 0
+
+def test_worker_above_the_memory_limit_is_restarted(config, make_worker, monkeypatch):
+    worker = make_worker(config, memory_limit_mb=400)
+    worker.start()
+    monkeypatch.setattr(worker_module, "_resident_memory_mb", lambda pid: 1000.0)
+
+    worker.infer(random_image(320, 240), OPTIONS)
+
+    assert not worker.is_alive()
+    monkeypatch.undo()
+    worker.infer(random_image(320, 240), OPTIONS)
+    assert worker.restarts == 1